@@ -716,6 +716,7 @@ struct ContentView: View {
     @StateObject private var localizationManager = LocalizationManager.shared
     @State private var showingDevicePicker = false
     @State private var pythonProcess: Process? = nil
+    @State private var pythonInput: Pipe? = nil
     @State private var isConnectedToCube = false
     @State private var moveOutput = ""
     @State private var isCubeConfirmed = false
@@ -929,6 +930,9 @@ struct ContentView: View {
                 currentScramble: currentScramble
             )
         }
+        .onChange(of: currentScramble) { _, _ in
+            sendScrambleToPython()
+        }
     }
 
     // MARK: - Python Connection
@@ -948,8 +952,10 @@ struct ContentView: View {
         task.executableURL = URL(fileURLWithPath: pythonPath)
         task.arguments = [scriptPath, uuidAddress, macAddress]  // 传递两个参数
 
+        let stdinPipe = Pipe()
         let stdoutPipe = Pipe()
         let stderrPipe = Pipe()
+        task.standardInput = stdinPipe
         task.standardOutput = stdoutPipe
         task.standardError = stderrPipe
 
@@ -958,25 +964,32 @@ struct ContentView: View {
             if !data.isEmpty, let chunk = String(data: data, encoding: .utf8) {
                 DispatchQueue.main.async { 
                     self.moveOutput.append(chunk)
-                    // 检查是否是连接确认消息
-                    if chunk.contains("CUBE_CONNECTED_CONFIRMATION") {
-                        self.handleCubeConnectedConfirmation()
-                    }
-                    // 检查是否是魔方解的消息
-                    if chunk.contains("CUBE_SOLUTION:") {
-                        self.handleCubeSolution(chunk)
-                    }
-                    // 检查是否是魔方状态的消息
-                    if chunk.contains("State:") {
-                        self.handleCubeState(chunk)
-                    }
-                    // 检查是否是电量信息
-                    if chunk.contains("Battery:") {
-                        self.handleCubeBattery(chunk)
-                    }
-                    // 检查是否是魔方移动信息
-                    if chunk.contains("Move:") {
-                        self.handleCubeMove(chunk)
+                    // Python端会把同一轮事件循环的多行合并写出，逐行处理
+                    for line in chunk.split(separator: "\n").map(String.init) {
+                        // 检查是否是连接确认消息
+                        if line.contains("CUBE_CONNECTED_CONFIRMATION") {
+                            self.handleCubeConnectedConfirmation()
+                        }
+                        // 检查是否是魔方解的消息
+                        if line.contains("CUBE_SOLUTION:") {
+                            self.handleCubeSolution(line)
+                        }
+                        // 检查是否是魔方状态的消息
+                        if line.contains("State:") {
+                            self.handleCubeState(line)
+                        }
+                        // Python端检测到魔方已按当前打乱公式打乱
+                        if line.contains("SCRAMBLE_COMPLETE") {
+                            self.handleScrambleComplete()
+                        }
+                        // 检查是否是电量信息
+                        if line.contains("Battery:") {
+                            self.handleCubeBattery(line)
+                        }
+                        // 检查是否是魔方移动信息
+                        if line.contains("Move:") {
+                            self.handleCubeMove(line)
+                        }
                     }
                 }
             }
@@ -993,12 +1006,14 @@ struct ContentView: View {
             DispatchQueue.main.async {
                 self.isConnectedToCube = false
                 self.pythonProcess = nil
+                self.pythonInput = nil
             }
         }
 
         do {
             try task.run()
             pythonProcess = task
+            pythonInput = stdinPipe
             isConnectedToCube = true
             cubeName = device.name ?? "Unknown Device"
             moveOutput = "Connecting to \(cubeName)...\n"
@@ -1010,6 +1025,7 @@ struct ContentView: View {
     private func disconnectFromCube() {
         pythonProcess?.terminate()
         pythonProcess = nil
+        pythonInput = nil
         isConnectedToCube = false
         moveOutput = ""
         isCubeConfirmed = false
@@ -1022,6 +1038,21 @@ struct ContentView: View {
     
     private func handleCubeConnectedConfirmation() {
         isCubeConfirmed = true
+        sendScrambleToPython()
+    }
+    
+    private func sendScrambleToPython() {
+        // 把当前打乱公式发给Python端，由它根据转动判断打乱是否完成
+        guard let input = pythonInput, !currentScramble.isEmpty,
+              let data = "SCRAMBLE: \(currentScramble)\n".data(using: .utf8) else { return }
+        try? input.fileHandleForWriting.write(contentsOf: data)
+    }
+    
+    private func handleScrambleComplete() {
+        // 打乱完成，设置自动开始倒计时的标志
+        if isCubeConfirmed && timerState == .idle {
+            shouldAutoStartInspection = true
+        }
     }
     
     private func handleCubeSolution(_ chunk: String) {
@@ -1038,8 +1069,8 @@ struct ContentView: View {
             let state = String(chunk[stateStart.upperBound...]).trimmingCharacters(in: .whitespacesAndNewlines)
             cubeState = state
             
-            // 检查魔方状态是否与打乱状态匹配
-            checkAndStartInspectionIfMatched(cubeState: state)
+            // 检查魔方是否已复原
+            checkAndStopTimerIfSolved(cubeState: state)
         }
     }
     
@@ -1066,22 +1097,8 @@ struct ContentView: View {
         }
     }
     
-    private func checkAndStartInspectionIfMatched(cubeState: String) {
-        // 检查是否应该开始倒计时（空闲状态）
-        if isCubeConfirmed && timerState == .idle {
-            // 获取当前打乱公式的展开状态
-            let cubeNetView = CubeNetView(scramble: currentScramble)
-            let expectedScrambledState = cubeNetView.getCubeStateString()
-            
-            // 比较魔方状态和打乱状态
-            if cubeState == expectedScrambledState {
-                // 状态匹配，设置自动开始倒计时的标志
-                DispatchQueue.main.async {
-                    self.shouldAutoStartInspection = true
-                }
-            }
-        }
-        
+    private func checkAndStopTimerIfSolved(cubeState: String) {
+        // 打乱是否完成由Python端的SCRAMBLE_COMPLETE通知（见handleScrambleComplete）
         // 检查是否应该结束计时（正在计时中）
         if isCubeConfirmed && timerState == .running && hasStartedSolving {
             // 检查魔方是否已复原（所有面都是相同颜色）
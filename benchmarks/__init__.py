@@ -0,0 +1,8 @@
+"""gan_cube_python 基准测试套件
+
+使用合成或录制的数据包驱动加密器、协议解析器、面块转换、求解器和完整的连接管线，
+不需要真实的魔方。运行方式：
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare baseline.json results.json
+"""
@@ -0,0 +1,170 @@
+"""基准测试计时、内存分配统计和结果比较"""
+
+import gc
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+@dataclass
+class BenchResult:
+    """单个基准测试的结果"""
+    name: str
+    iterations: int
+    total_seconds: float
+    ops_per_sec: float
+    p50_us: float
+    p99_us: float
+    alloc_peak_kib: float  # tracemalloc测得的峰值内存
+    alloc_blocks_per_op: float  # 每次操作净增加的内存块数
+    skipped: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class FakeBleakClient:
+    """只提供连接管线需要的属性，用于在没有蓝牙设备时驱动GanCubeConnection"""
+    services = []
+    is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+
+def make_connection(encrypter, driver):
+    """创建绑定到FakeBleakClient的连接对象"""
+    from gan_cube_python.connection import GanCubeConnection
+    device = type('Device', (), {'address': 'bench', 'name': 'GAN-bench'})()
+    return GanCubeConnection(device, FakeBleakClient(), encrypter, driver)
+
+
+def run_sync(coro):
+    """直接驱动不会挂起的协程，避免事件循环调度开销干扰计时"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("coroutine suspended unexpectedly")
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """最近秩法计算百分位数（输入必须已排序）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def skipped(name: str, reason: str) -> BenchResult:
+    """依赖缺失时记录跳过的基准测试"""
+    return BenchResult(name, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, skipped=reason)
+
+
+def bench(name: str, func: Callable[[Any], Any], items: Sequence[Any],
+          warmup: int = 100, alloc_sample: int = 1000) -> BenchResult:
+    """对items中的每个输入调用func，统计吞吐量、延迟分位数和内存分配"""
+    for item in items[:warmup]:
+        func(item)
+
+    latencies: List[int] = []
+    append = latencies.append
+    clock = time.perf_counter_ns
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = clock()
+        for item in items:
+            t0 = clock()
+            func(item)
+            append(clock() - t0)
+        total_ns = clock() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # 内存分配单独测量，避免tracemalloc拖慢计时
+    sample = items[:alloc_sample]
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    for item in sample:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks_after = sys.getallocatedblocks()
+
+    latencies.sort()
+    total = total_ns / 1e9
+    return BenchResult(
+        name=name,
+        iterations=len(items),
+        total_seconds=total,
+        ops_per_sec=len(items) / total if total else 0.0,
+        p50_us=percentile(latencies, 0.50) / 1000,
+        p99_us=percentile(latencies, 0.99) / 1000,
+        alloc_peak_kib=peak / 1024,
+        alloc_blocks_per_op=(blocks_after - blocks_before) / max(1, len(sample)),
+    )
+
+
+def environment() -> Dict[str, Any]:
+    """记录运行环境，便于跨版本比较"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def save_results(path: str, results: List[BenchResult]):
+    """保存JSON结果"""
+    payload = {"environment": environment(), "results": {r.name: asdict(r) for r in results}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare_results(baseline: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]],
+                    threshold: float = 0.10) -> List[str]:
+    """比较两次结果，返回超过阈值的回归描述"""
+    regressions = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or base.get("skipped") or cur.get("skipped"):
+            continue
+        if base["ops_per_sec"] and cur["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: ops/sec {base['ops_per_sec']:.0f} -> {cur['ops_per_sec']:.0f}")
+        if base["p99_us"] and cur["p99_us"] > base["p99_us"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {base['p99_us']:.1f}us -> {cur['p99_us']:.1f}us")
+    return regressions
+
+
+def format_table(results: List[BenchResult]) -> str:
+    """格式化为终端表格"""
+    lines = [f"{'benchmark':<34}{'ops/sec':>12}{'p50 us':>10}{'p99 us':>10}{'peak KiB':>10}{'blk/op':>8}"]
+    for r in results:
+        if r.skipped:
+            lines.append(f"{r.name:<34}  skipped: {r.skipped}")
+            continue
+        lines.append(f"{r.name:<34}{r.ops_per_sec:>12.0f}{r.p50_us:>10.1f}{r.p99_us:>10.1f}"
+                     f"{r.alloc_peak_kib:>10.1f}{r.alloc_blocks_per_op:>8.2f}")
+    return "\n".join(lines)
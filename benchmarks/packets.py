@@ -0,0 +1,304 @@
+"""合成与录制的GAN数据包
+
+合成数据包按照Gen2/Gen3/Gen4协议的位布局构造（与TypeScript版本一致），
+再用与真实魔方相同的密钥和盐值加密，因此可以直接喂给解析管线。
+"""
+
+import random
+from typing import Dict, List, Optional, Tuple
+
+from gan_cube_python.cube import random_state
+from gan_cube_python.definitions import GAN_ENCRYPTION_KEYS
+from gan_cube_python.encrypter import GanGen2CubeEncrypter, GanGen3CubeEncrypter, GanGen4CubeEncrypter
+
+# 基准测试使用的固定盐值（对应MAC地址 AB:12:34:56:78:9A）
+BENCH_SALT = bytes([0x9A, 0x78, 0x56, 0x34, 0x12, 0xAB])
+
+# 事件类型权重：移动为主，穿插陀螺仪、状态和电量
+DEFAULT_MIX = {"MOVE": 0.6, "GYRO": 0.3, "FACELETS": 0.08, "BATTERY": 0.02}
+
+
+# Gen3/Gen4移动事件中面的位掩码编码
+FACE_MASKS = [2, 32, 8, 1, 16, 4]
+
+_ENCRYPTERS = {2: GanGen2CubeEncrypter, 3: GanGen3CubeEncrypter, 4: GanGen4CubeEncrypter}
+
+
+def make_encrypter(salt: bytes = BENCH_SALT, generation: int = 2):
+    """创建与合成数据包匹配的加密器"""
+    key_data = GAN_ENCRYPTION_KEYS[0]
+    return _ENCRYPTERS[generation](bytes(key_data["key"]), bytes(key_data["iv"]), salt)
+
+
+class BitWriter:
+    """按位写入消息，位序与GanProtocolMessageView一致（每字节高位在前）"""
+
+    def __init__(self, length: int = 20):
+        self.buf = bytearray(length)
+
+    def put(self, start_bit: int, bit_length: int, value: int):
+        """从start_bit开始写入bit_length位（高位在前）"""
+        for i in range(bit_length):
+            bit = (value >> (bit_length - 1 - i)) & 1
+            pos = start_bit + i
+            if bit:
+                self.buf[pos >> 3] |= 0x80 >> (pos & 7)
+            else:
+                self.buf[pos >> 3] &= ~(0x80 >> (pos & 7)) & 0xFF
+
+    def put_le(self, start_bit: int, bit_length: int, value: int):
+        """按小端字节序写入多字节字段"""
+        for i in range(bit_length // 8):
+            self.put(start_bit + 8 * i, 8, (value >> (8 * i)) & 0xFF)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.buf)
+
+
+def random_cubie_state(rng: random.Random) -> Tuple[List[int], List[int], List[int], List[int]]:
+    """生成一个可解的随机角块/边块状态 (cp, co, ep, eo)"""
+    return tuple(list(part) for part in random_state(rng))
+
+
+class Gen2PacketFactory:
+    """Gen2明文数据包工厂，维护序列号和最近7步的移动历史"""
+
+    generation = 2
+    serial_mask = 0xFF
+
+    def __init__(self, seed: int = 0, start_serial: int = 0):
+        self.rng = random.Random(seed)
+        self.serial = start_serial & self.serial_mask
+        self.history: List[Tuple[int, int, int]] = []  # (face, direction, elapsed)
+
+    def move(self, face: Optional[int] = None, direction: Optional[int] = None,
+             elapsed: Optional[int] = None, skip: int = 0) -> bytes:
+        """生成移动数据包；skip模拟丢失的数据包数量"""
+        for _ in range(skip + 1):
+            f = self.rng.randrange(6) if face is None else face
+            d = self.rng.randrange(2) if direction is None else direction
+            e = self.rng.randrange(40, 400) if elapsed is None else elapsed
+            self.serial = (self.serial + 1) & 0xFF
+            self.history.insert(0, (f, d, e))
+            del self.history[7:]
+
+        w = BitWriter()
+        w.put(0, 4, 0x02)
+        w.put(4, 8, self.serial)
+        for i, (f, d, e) in enumerate(self.history):
+            w.put(12 + 5 * i, 4, f)
+            w.put(16 + 5 * i, 1, d)
+            w.put(47 + 16 * i, 16, e)
+        return w.to_bytes()
+
+    def facelets(self, state=None) -> bytes:
+        """生成面块状态数据包"""
+        cp, co, ep, eo = state or random_cubie_state(self.rng)
+        w = BitWriter()
+        w.put(0, 4, 0x04)
+        w.put(4, 8, self.serial)
+        for i in range(7):
+            w.put(12 + i * 3, 3, cp[i])
+            w.put(33 + i * 2, 2, co[i])
+        for i in range(11):
+            w.put(47 + i * 4, 4, ep[i])
+            w.put(91 + i, 1, eo[i])
+        return w.to_bytes()
+
+    def gyro(self) -> bytes:
+        """生成陀螺仪数据包（符号+15位幅值编码的四元数）"""
+        w = BitWriter()
+        w.put(0, 4, 0x01)
+        for i, start in enumerate((4, 20, 36, 52)):
+            value = self.rng.uniform(-1.0, 1.0)
+            w.put(start, 16, (0x8000 if value < 0 else 0) | int(abs(value) * 0x7FFF))
+        for start in (68, 72, 76):
+            w.put(start, 4, self.rng.randrange(16))
+        return w.to_bytes()
+
+    def battery(self, level: Optional[int] = None) -> bytes:
+        """生成电量数据包"""
+        w = BitWriter()
+        w.put(0, 4, 0x09)
+        w.put(8, 8, self.rng.randrange(101) if level is None else level)
+        return w.to_bytes()
+
+    def mixed(self, count: int, mix: Optional[dict] = None) -> List[bytes]:
+        """按权重生成混合事件的明文数据包"""
+        return [packet for _, packet in self.events(count, mix)]
+
+    def events(self, count: int, mix: Optional[dict] = None) -> List[Tuple[str, bytes]]:
+        """按权重生成 (事件类型, 明文数据包) 列表"""
+        mix = mix or DEFAULT_MIX
+        kinds = list(mix)
+        weights = [mix[k] for k in kinds]
+        builders = {"MOVE": self.move, "GYRO": self.gyro,
+                    "FACELETS": self.facelets, "BATTERY": self.battery}
+        return [(kind, builders[kind]()) for kind in self.rng.choices(kinds, weights, k=count)]
+
+
+class Gen3PacketFactory(Gen2PacketFactory):
+    """Gen3明文数据包工厂（0x55魔数 + 事件类型 + 数据长度，16位小端序列号）"""
+
+    generation = 3
+    serial_mask = 0xFFFF
+
+    def __init__(self, seed: int = 0, start_serial: int = 0):
+        super().__init__(seed, start_serial)
+        self.cube_timestamp = 0
+
+    def _header(self, event_type: int, data_length: int) -> BitWriter:
+        w = BitWriter()
+        w.put(0, 8, 0x55)
+        w.put(8, 8, event_type)
+        w.put(16, 8, data_length)
+        return w
+
+    def move(self, face: Optional[int] = None, direction: Optional[int] = None,
+             elapsed: Optional[int] = None, skip: int = 0) -> bytes:
+        for _ in range(skip + 1):
+            self.serial = (self.serial + 1) & self.serial_mask
+            self.cube_timestamp += self.rng.randrange(40, 400) if elapsed is None else elapsed
+        f = self.rng.randrange(6) if face is None else face
+        d = self.rng.randrange(2) if direction is None else direction
+        w = self._header(0x01, 7)
+        w.put_le(24, 32, self.cube_timestamp & 0xFFFFFFFF)
+        w.put_le(56, 16, self.serial)
+        w.put(72, 2, d)
+        w.put(74, 6, FACE_MASKS[f])
+        return w.to_bytes()
+
+    def facelets(self, state=None) -> bytes:
+        cp, co, ep, eo = state or random_cubie_state(self.rng)
+        w = self._header(0x02, 14)
+        w.put_le(24, 16, self.serial)
+        for i in range(7):
+            w.put(40 + i * 3, 3, cp[i])
+            w.put(61 + i * 2, 2, co[i])
+        for i in range(11):
+            w.put(77 + i * 4, 4, ep[i])
+            w.put(121 + i, 1, eo[i])
+        return w.to_bytes()
+
+    def gyro(self) -> bytes:
+        # Gen3没有陀螺仪，用移动历史事件代替以保持数据包混合比例
+        w = self._header(0x06, 4)
+        w.put(24, 8, self.serial & 0xFF)
+        return w.to_bytes()
+
+    def battery(self, level: Optional[int] = None) -> bytes:
+        w = self._header(0x10, 1)
+        w.put(24, 8, self.rng.randrange(101) if level is None else level)
+        return w.to_bytes()
+
+
+class Gen4PacketFactory(Gen3PacketFactory):
+    """Gen4明文数据包工厂（事件类型 + 数据长度，16位小端序列号）"""
+
+    generation = 4
+
+    def move(self, face: Optional[int] = None, direction: Optional[int] = None,
+             elapsed: Optional[int] = None, skip: int = 0) -> bytes:
+        for _ in range(skip + 1):
+            self.serial = (self.serial + 1) & self.serial_mask
+            self.cube_timestamp += self.rng.randrange(40, 400) if elapsed is None else elapsed
+        f = self.rng.randrange(6) if face is None else face
+        d = self.rng.randrange(2) if direction is None else direction
+        w = BitWriter()
+        w.put(0, 8, 0x01)
+        w.put(8, 8, 7)
+        w.put_le(16, 32, self.cube_timestamp & 0xFFFFFFFF)
+        w.put_le(48, 16, self.serial)
+        w.put(64, 2, d)
+        w.put(66, 6, FACE_MASKS[f])
+        return w.to_bytes()
+
+    def facelets(self, state=None) -> bytes:
+        cp, co, ep, eo = state or random_cubie_state(self.rng)
+        w = BitWriter()
+        w.put(0, 8, 0xED)
+        w.put(8, 8, 14)
+        w.put_le(16, 16, self.serial)
+        for i in range(7):
+            w.put(32 + i * 3, 3, cp[i])
+            w.put(53 + i * 2, 2, co[i])
+        for i in range(11):
+            w.put(69 + i * 4, 4, ep[i])
+            w.put(113 + i, 1, eo[i])
+        return w.to_bytes()
+
+    def gyro(self) -> bytes:
+        w = BitWriter()
+        w.put(0, 8, 0xEC)
+        w.put(8, 8, 8)
+        for start in (16, 32, 48, 64):
+            value = self.rng.uniform(-1.0, 1.0)
+            w.put(start, 16, (0x8000 if value < 0 else 0) | int(abs(value) * 0x7FFF))
+        return w.to_bytes()
+
+    def battery(self, level: Optional[int] = None) -> bytes:
+        w = BitWriter()
+        w.put(0, 8, 0xEF)
+        w.put(8, 8, 1)
+        w.put(16, 8, self.rng.randrange(101) if level is None else level)
+        return w.to_bytes()
+
+
+PACKET_FACTORIES = {2: Gen2PacketFactory, 3: Gen3PacketFactory, 4: Gen4PacketFactory}
+
+
+def synthetic_packets(count: int, seed: int = 0, mix: Optional[dict] = None,
+                      encrypter=None, generation: int = 2) -> Tuple[List[bytes], List[bytes]]:
+    """生成 (明文列表, 密文列表)"""
+    encrypter = encrypter or make_encrypter(generation=generation)
+    plain = PACKET_FACTORIES[generation](seed).mixed(count, mix)
+    return plain, [encrypter.encrypt(p) for p in plain]
+
+
+def packet_stream(count: int, generation: int = 2, seed: int = 0, mix: Optional[dict] = None,
+                  drop_rate: float = 0.0, corrupt_rate: float = 0.0, start_serial: int = 0,
+                  encrypter=None) -> Tuple[List[bytes], Dict[str, int]]:
+    """生成模拟真实无线环境的加密数据包流
+
+    drop_rate比例的数据包被丢弃（移动事件表现为序列号跳变），corrupt_rate比例的数据包
+    在加密后被翻转若干字节或截断。start_serial可设置在回绕点附近以覆盖序列号回绕。
+    返回 (密文列表, 统计)。
+    """
+    rng = random.Random(seed ^ 0x5EED)
+    encrypter = encrypter or make_encrypter(generation=generation)
+    factory = PACKET_FACTORIES[generation](seed, start_serial)
+    stats = {"generated": 0, "dropped": 0, "corrupted": 0, "truncated": 0}
+    packets = []
+    while len(packets) < count:
+        for kind, plain in factory.events(count - len(packets), mix):
+            stats["generated"] += 1
+            if rng.random() < drop_rate:
+                stats["dropped"] += 1
+                continue
+            packet = bytearray(encrypter.encrypt(plain))
+            if rng.random() < corrupt_rate:
+                if rng.random() < 0.25:
+                    del packet[rng.randrange(1, 16):]
+                    stats["truncated"] += 1
+                else:
+                    for _ in range(rng.randrange(1, 4)):
+                        packet[rng.randrange(len(packet))] ^= 1 << rng.randrange(8)
+                    stats["corrupted"] += 1
+            packets.append(bytes(packet))
+    return packets, stats
+
+
+def load_recorded_packets(path: str) -> List[bytes]:
+    """读取录制的原始（加密）数据包
+
+    每行一个数据包，格式为 "<时间戳> <十六进制>" 或仅 "<十六进制>"，
+    与 gan_cube_python.profiling.PacketRecorder 的输出格式一致。
+    """
+    packets = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            packets.append(bytes.fromhex(line.split()[-1]))
+    return packets
@@ -0,0 +1,202 @@
+"""运行gan_cube_python基准测试
+
+    python -m benchmarks.run                          # 运行全部并打印表格
+    python -m benchmarks.run --output results.json    # 保存JSON结果
+    python -m benchmarks.run --compare base.json      # 与基线比较，回归时返回非零退出码
+    python -m benchmarks.run --packets capture.txt    # 使用录制的数据包
+"""
+
+import argparse
+import math
+import random
+import sys
+from typing import Callable, Dict, List
+
+from gan_cube_python import cube, solver
+from gan_cube_python.moves import MovePrefixMatcher, MoveSequence
+from gan_cube_python.orientation import OrientationTracker
+from gan_cube_python.protocol import GanGen2ProtocolDriver, GanProtocolMessageView
+
+from .harness import (BenchResult, bench, compare_results, format_table, load_results,
+                      make_connection, run_sync, save_results, skipped)
+from .packets import (BENCH_SALT, load_recorded_packets, make_encrypter, random_cubie_state,
+                      synthetic_packets)
+
+SOLVED_STATE = "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"
+
+
+def bench_encrypter(plain: List[bytes], cipher: List[bytes]) -> List[BenchResult]:
+    encrypter = make_encrypter()
+    return [
+        bench("encrypter.encrypt", encrypter.encrypt, plain),
+        bench("encrypter.decrypt", encrypter.decrypt, cipher),
+    ]
+
+
+def bench_message_view(plain: List[bytes]) -> List[BenchResult]:
+    def parse(message):
+        view = GanProtocolMessageView(message)
+        view.get_bit_word(0, 4)
+        view.get_bit_word(4, 8)
+        view.get_bit_word(47, 16)
+    return [bench("message_view.parse", parse, plain)]
+
+
+def bench_driver(plain: List[bytes]) -> List[BenchResult]:
+    driver = GanGen2ProtocolDriver()
+    return [bench("gen2_driver.handle_state_event",
+                  lambda message: driver.handle_state_event(message, 0.0), plain)]
+
+
+def bench_facelets(count: int, seed: int) -> List[BenchResult]:
+    rng = random.Random(seed)
+    driver = GanGen2ProtocolDriver()
+    states = [random_cubie_state(rng) for _ in range(count)]
+    return [bench("facelets.to_kociemba", lambda s: driver._to_kociemba_facelets(*s), states)]
+
+
+def bench_cube(count: int, seed: int) -> List[BenchResult]:
+    rng = random.Random(seed)
+    states = [cube.random_state(rng) for _ in range(count)]
+    moves = [rng.choice(cube.MOVE_NAMES) for _ in range(count)]
+    return [
+        bench("cube.random_state", lambda _: cube.random_state(rng), range(count)),
+        bench("cube.apply_move", lambda i: cube.apply_move(states[i], moves[i]), range(count)),
+        bench("cube.state_key", cube.state_key, states),
+        bench("cube.state_index", cube.state_index, states),
+    ]
+
+
+def bench_solver(count: int, scramble_count: int, seed: int) -> List[BenchResult]:
+    rng = random.Random(seed)
+    solver.get_tables()  # 首次运行时生成并缓存表，不计入计时
+    states = [cube.random_state(rng) for _ in range(count)]
+    return [
+        bench("solver.solve", solver.solve, states, warmup=1, alloc_sample=5),
+        bench("solver.solve_budget_50ms", lambda s: solver.solve(s, time_budget=0.05), states,
+              warmup=1, alloc_sample=5),
+        bench("solver.random_scramble", lambda _: solver.random_scramble(rng), range(scramble_count),
+              warmup=1, alloc_sample=2),
+    ]
+
+
+def bench_moves(count: int, seed: int) -> List[BenchResult]:
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choice(cube.MOVE_NAMES) for _ in range(20)) for _ in range(count)]
+    sequences = [MoveSequence.parse(text) for text in texts]
+    matcher = MovePrefixMatcher(sequences[0].expand())
+    stream = [code for seq in sequences for code in seq.expand()]
+
+    def feed(code):
+        if matcher.feed(code).complete:
+            matcher.reset()
+    return [
+        bench("moves.parse_uncached", lambda t: MoveSequence(map(cube.MOVE_NAMES.index, t.split())), texts),
+        bench("moves.parse_interned", MoveSequence.parse, texts),
+        bench("moves.simplify", MoveSequence.simplify, sequences),
+        bench("moves.inverse", MoveSequence.inverse, sequences),
+        bench("moves.expand", MoveSequence.expand, sequences),
+        bench("moves.prefix_feed", feed, stream),
+    ]
+
+
+def bench_orientation(count: int, seed: int) -> List[BenchResult]:
+    """模拟手持抖动加偶尔整体转动的四元数流"""
+    rng = random.Random(seed)
+    samples = []
+    angle = 0.0
+    for i in range(count):
+        if i % 500 == 0:
+            angle += rng.choice((-1, 1)) * 3.14159 / 2
+        jitter = rng.gauss(0.0, 0.03)
+        half = (angle + jitter) / 2
+        samples.append((i * 0.02, (math.cos(half), 0.0, 0.0, math.sin(half))))
+    tracker = OrientationTracker()
+    return [bench("orientation.update", lambda s: tracker.update_quaternion(s[1], s[0]), samples)]
+
+
+def bench_kociemba(count: int, seed: int) -> List[BenchResult]:
+    """kociemba已不是依赖，安装时作为内置求解器的对照"""
+    try:
+        import kociemba
+    except ImportError:
+        return [skipped("kociemba.solve", "kociemba not installed")]
+    rng = random.Random(seed)
+    driver = GanGen2ProtocolDriver()
+    targets = [driver._to_kociemba_facelets(*random_cubie_state(rng)) for _ in range(count)]
+    return [bench("kociemba.solve", lambda t: kociemba.solve(SOLVED_STATE, t), targets,
+                  warmup=1, alloc_sample=5)]
+
+
+def bench_connection(cipher: List[bytes]) -> List[BenchResult]:
+    try:
+        connection = make_connection(make_encrypter(BENCH_SALT), GanGen2ProtocolDriver())
+    except ImportError as e:
+        return [skipped("connection.pipeline", f"import failed: {e}")]
+    sink = []
+    connection.on_move(sink.append)
+    connection.on_state(sink.append)
+    connection.on_gyro(sink.append)
+    connection.on_battery(sink.append)
+
+    def feed(packet):
+        run_sync(connection._notification_handler(None, packet))
+        sink.clear()
+    return [bench("connection.pipeline", feed, cipher)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="gan_cube_python benchmarks")
+    parser.add_argument("--count", type=int, default=20000, help="合成数据包数量")
+    parser.add_argument("--seed", type=int, default=1215, help="随机种子")
+    parser.add_argument("--packets", help="录制的数据包文件（替代合成数据包）")
+    parser.add_argument("--solve-count", type=int, default=20, help="求解基准的状态数量")
+    parser.add_argument("--scramble-count", type=int, default=10, help="随机状态打乱基准的数量")
+    parser.add_argument("--only", action="append", help="只运行指定的基准组，可重复")
+    parser.add_argument("--output", help="保存JSON结果的路径")
+    parser.add_argument("--compare", help="作为基线的JSON结果")
+    parser.add_argument("--threshold", type=float, default=0.10, help="回归判定阈值（比例）")
+    args = parser.parse_args(argv)
+
+    encrypter = make_encrypter()
+    if args.packets:
+        cipher = load_recorded_packets(args.packets)
+        plain = [encrypter.decrypt(p) for p in cipher]
+    else:
+        plain, cipher = synthetic_packets(args.count, args.seed, encrypter=encrypter)
+
+    groups: Dict[str, Callable[[], List[BenchResult]]] = {
+        "encrypter": lambda: bench_encrypter(plain, cipher),
+        "message_view": lambda: bench_message_view(plain),
+        "driver": lambda: bench_driver(plain),
+        "facelets": lambda: bench_facelets(min(args.count, 5000), args.seed),
+        "cube": lambda: bench_cube(min(args.count, 5000), args.seed),
+        "solver": lambda: bench_solver(args.solve_count, args.scramble_count, args.seed),
+        "moves": lambda: bench_moves(min(args.count, 1000), args.seed),
+        "orientation": lambda: bench_orientation(min(args.count, 20000), args.seed),
+        "kociemba": lambda: bench_kociemba(args.solve_count, args.seed),
+        "connection": lambda: bench_connection(cipher),
+    }
+    results: List[BenchResult] = []
+    for name, run in groups.items():
+        if args.only and name not in args.only:
+            continue
+        results.extend(run())
+
+    print(format_table(results))
+    if args.output:
+        save_results(args.output, results)
+        print(f"Results saved to {args.output}")
+
+    if args.compare:
+        current = {r.name: r.__dict__ for r in results}
+        regressions = compare_results(load_results(args.compare), current, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""启动时间基准
+
+    python -m benchmarks.startup                        # 打印导入耗时和首个事件延迟
+    python -m benchmarks.startup --output startup.json  # 保存JSON结果（格式同 benchmarks.run）
+
+包含两部分：
+- `-X importtime` 导入耗时分解（每个目标模块在全新解释器中导入）
+- 首个事件延迟：从启动解释器到第一个解码后的事件回调被调用的时间
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from .harness import BenchResult, format_table, percentile, save_results
+from .packets import Gen2PacketFactory, make_encrypter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TARGETS = ["gan_cube_python", "gan_cube_python.connection", "test_raw_data"]
+
+# 子进程中执行：导入库、构造连接、解码一个面块数据包，输出事件回调时的时间
+FIRST_EVENT_SCRIPT = """
+import sys, time
+from gan_cube_python.connection import GanCubeConnection
+from gan_cube_python.definitions import GAN_ENCRYPTION_KEYS
+from gan_cube_python.encrypter import GanGen2CubeEncrypter
+from gan_cube_python.protocol import GanGen2ProtocolDriver
+
+class Client:
+    services = []
+    is_connected = True
+
+key = GAN_ENCRYPTION_KEYS[0]
+encrypter = GanGen2CubeEncrypter(bytes(key["key"]), bytes(key["iv"]), bytes.fromhex(sys.argv[1]))
+device = type('Device', (), {'address': 'bench', 'name': 'GAN-bench'})()
+connection = GanCubeConnection(device, Client(), encrypter, GanGen2ProtocolDriver())
+connection.on_state(lambda state: print(time.time(), flush=True))
+coro = connection._notification_handler(None, bytes.fromhex(sys.argv[2]))
+try:
+    coro.send(None)
+except StopIteration:
+    pass
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    return env
+
+
+def import_breakdown(module: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """返回 (总耗时微秒, [(模块, 自身微秒, 累计微秒)])"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=ROOT, env=_env())
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    total = next((cum for name, _, cum in rows if name == module), 0)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return total, rows
+
+
+def bench_imports(module: str, runs: int, top: int) -> BenchResult:
+    try:
+        totals = []
+        rows = []
+        for _ in range(runs):
+            total, rows = import_breakdown(module)
+            totals.append(total)
+    except RuntimeError as e:
+        return BenchResult(f"import.{module}", 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, skipped=str(e))
+    totals.sort()
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+    mean = sum(totals) / len(totals) / 1e6
+    return BenchResult(
+        name=f"import.{module}", iterations=runs, total_seconds=sum(totals) / 1e6,
+        ops_per_sec=1 / mean if mean else 0.0,
+        p50_us=percentile(totals, 0.5), p99_us=percentile(totals, 0.99),
+        alloc_peak_kib=0.0, alloc_blocks_per_op=0.0,
+        extra={"slowest_self_us": {name: self_us for name, self_us, _ in slowest}},
+    )
+
+
+def bench_first_event(runs: int) -> BenchResult:
+    salt = bytes(6)
+    packet = make_encrypter(salt).encrypt(Gen2PacketFactory().facelets())
+    latencies = []
+    for _ in range(runs):
+        start = time.time()
+        proc = subprocess.run([sys.executable, "-c", FIRST_EVENT_SCRIPT, salt.hex(), packet.hex()],
+                              capture_output=True, text=True, cwd=ROOT, env=_env())
+        if proc.returncode != 0 or not proc.stdout.strip():
+            reason = (proc.stderr.strip().splitlines() or ["no event"])[-1]
+            return BenchResult("startup.first_event", 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, skipped=reason)
+        latencies.append((float(proc.stdout.split()[0]) - start) * 1e6)
+    latencies.sort()
+    mean = sum(latencies) / len(latencies) / 1e6
+    return BenchResult(
+        name="startup.first_event", iterations=runs, total_seconds=sum(latencies) / 1e6,
+        ops_per_sec=1 / mean, p50_us=percentile(latencies, 0.5), p99_us=percentile(latencies, 0.99),
+        alloc_peak_kib=0.0, alloc_blocks_per_op=0.0,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="gan_cube_python startup benchmarks")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的重复次数")
+    parser.add_argument("--top", type=int, default=10, help="列出自身耗时最长的导入数量")
+    parser.add_argument("--output", help="保存JSON结果的路径")
+    args = parser.parse_args(argv)
+
+    results = [bench_imports(module, args.runs, args.top) for module in IMPORT_TARGETS]
+    results.append(bench_first_event(args.runs))
+
+    print(format_table(results))
+    for result in results:
+        for name, self_us in result.extra.get("slowest_self_us", {}).items():
+            print(f"  {result.name}: {name} {self_us}us")
+    if args.output:
+        save_results(args.output, results)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""协议驱动吞吐量压力测试
+
+把合成的加密数据包推过完整的解码路径（GanCubeConnection._notification_handler：
+解密、协议解析、事件分发），测量单核可持续的通知速率和尾延迟：
+
+    python -m benchmarks.stress --generation 2 --count 50000
+    python -m benchmarks.stress --generation all --drop-rate 0.02 --corrupt-rate 0.01
+    python -m benchmarks.stress --processes 4        # 另外以4个进程并行测量总吞吐量
+    python -m benchmarks.stress --mix MOVE=0.5,GYRO=0.5 --output stress.json
+    python -m benchmarks.stress --fleet 4 --cubes 16  # 16个魔方共享4个解码进程（FleetDecoder）
+
+注意：Gen3/Gen4驱动目前尚未实现事件解析，对应结果只反映解密和分发的开销。
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from gan_cube_python.connection import EVENT_TYPES
+from gan_cube_python.fleet import FleetDecoder
+from gan_cube_python.protocol import GanGen2ProtocolDriver, GanGen3ProtocolDriver, GanGen4ProtocolDriver
+
+from .harness import BenchResult, format_table, make_connection, percentile, run_sync, save_results
+from .packets import BENCH_SALT, make_encrypter, packet_stream
+
+DRIVERS = {2: GanGen2ProtocolDriver, 3: GanGen3ProtocolDriver, 4: GanGen4ProtocolDriver}
+
+
+def parse_mix(text: Optional[str]) -> Optional[Dict[str, float]]:
+    """解析 "MOVE=0.6,GYRO=0.3" 形式的事件权重"""
+    if not text:
+        return None
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip().upper()] = float(weight)
+    return mix
+
+
+def run_stream(generation: int, count: int, seed: int, mix: Optional[Dict[str, float]],
+               drop_rate: float, corrupt_rate: float, start_serial: int) -> Tuple[float, List[int], Dict[str, int]]:
+    """在当前进程中生成数据包并逐个解码，返回 (耗时秒, 每包延迟纳秒, 统计)"""
+    packets, stats = packet_stream(count, generation, seed, mix, drop_rate, corrupt_rate, start_serial,
+                                   encrypter=make_encrypter(BENCH_SALT, generation))
+    connection = make_connection(make_encrypter(BENCH_SALT, generation), DRIVERS[generation]())
+    events = [0]
+
+    def sink(_):
+        events[0] += 1
+    connection.on_move(sink)
+    connection.on_state(sink)
+    connection.on_gyro(sink)
+    connection.on_battery(sink)
+
+    handler = connection._notification_handler
+    clock = time.perf_counter_ns
+    latencies = []
+    append = latencies.append
+    start = clock()
+    for packet in packets:
+        t0 = clock()
+        run_sync(handler(None, packet))
+        append(clock() - t0)
+    elapsed = (clock() - start) / 1e9
+    stats["events"] = events[0]
+    stats["lost_moves"] = connection.metrics.lost_moves
+    return elapsed, latencies, stats
+
+
+def _worker(args) -> Tuple[float, List[int], Dict[str, int]]:
+    logging.getLogger("gan_cube_python").setLevel(logging.CRITICAL)
+    return run_stream(*args)
+
+
+def _result(name: str, packets: int, elapsed: float, latencies: List[int], extra: Dict) -> BenchResult:
+    latencies.sort()
+    extra = dict(extra)
+    extra["p999_us"] = percentile(latencies, 0.999) / 1000
+    extra["max_us"] = (latencies[-1] if latencies else 0) / 1000
+    return BenchResult(
+        name=name, iterations=packets, total_seconds=elapsed,
+        ops_per_sec=packets / elapsed if elapsed else 0.0,
+        p50_us=percentile(latencies, 0.50) / 1000, p99_us=percentile(latencies, 0.99) / 1000,
+        alloc_peak_kib=0.0, alloc_blocks_per_op=0.0, extra=extra,
+    )
+
+
+def stress_single(generation: int, args, mix) -> BenchResult:
+    elapsed, latencies, stats = run_stream(generation, args.count, args.seed, mix, args.drop_rate,
+                                           args.corrupt_rate, args.start_serial)
+    return _result(f"stress.gen{generation}.single", len(latencies), elapsed, latencies, stats)
+
+
+def stress_multi(generation: int, args, mix) -> BenchResult:
+    """每个进程独立生成并解码自己的数据流，总吞吐量为并行运行时的合计"""
+    jobs = [(generation, args.count, args.seed + i, mix, args.drop_rate, args.corrupt_rate, args.start_serial)
+            for i in range(args.processes)]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        outputs = pool.map(_worker, jobs)
+    latencies: List[int] = []
+    stats: Dict[str, int] = {}
+    for _, worker_latencies, worker_stats in outputs:
+        latencies.extend(worker_latencies)
+        for key, value in worker_stats.items():
+            stats[key] = stats.get(key, 0) + value
+    # 各进程并行运行，合计吞吐量 = 各进程速率之和
+    rate = sum(len(lat) / elapsed for elapsed, lat, _ in outputs if elapsed)
+    elapsed = len(latencies) / rate if rate else 0.0
+    stats["processes"] = args.processes
+    return _result(f"stress.gen{generation}.x{args.processes}", len(latencies), elapsed, latencies, stats)
+
+
+def _timed_dispatch(connection, latencies: List[int]):
+    """包装连接的事件分发，记录每个解码记录从提交（通知时间戳）到分发的延迟"""
+    dispatch = connection._dispatch_event
+    append = latencies.append
+    clock = time.time_ns
+
+    def wrapper(event):
+        if event.event_type in EVENT_TYPES:
+            append(clock() - int(event.timestamp * 1e9))
+        dispatch(event)
+    connection._dispatch_event = wrapper
+
+
+async def _warm_up(decoder: FleetDecoder, warmups, packet: bytes):
+    """每个工作进程处理一个数据包并确认移除之后才开始计时（spawn启动和导入不计入）"""
+    # 先全部注册：连续分配的连接号覆盖每个工作进程
+    for connection in warmups:
+        connection.use_decoder(decoder)
+    for connection in warmups:
+        await connection._notification_handler(None, packet)
+        await connection.disconnect()
+    await asyncio.gather(*(connection.wait_closed() for connection in warmups))
+
+
+async def _run_fleet(decoder: FleetDecoder, connections, streams, warmups) -> Tuple[float, int, List[int]]:
+    """按轮询顺序交错提交各魔方的数据包，直到所有记录都被分发
+
+    返回 (耗时秒, 事件数, 每个解码记录从提交到分发的延迟纳秒)
+    """
+    await _warm_up(decoder, warmups, next(packet for stream in streams for packet in stream))
+    events = [0]
+    latencies: List[int] = []
+
+    def sink(_):
+        events[0] += 1
+    for connection in connections:
+        connection.use_decoder(decoder)
+        connection.on_move(sink)
+        connection.on_state(sink)
+        connection.on_gyro(sink)
+        connection.on_battery(sink)
+        _timed_dispatch(connection, latencies)
+
+    start = time.perf_counter()
+    longest = max(len(stream) for stream in streams)
+    for index in range(longest):
+        for connection, stream in zip(connections, streams):
+            if index < len(stream):
+                # 输入环满时等待而不是丢弃，测量的是可持续吞吐量
+                while decoder.backlog(connection._decoder_id) >= decoder.ring_capacity:
+                    await asyncio.sleep(0)
+                run_sync(connection._notification_handler(None, stream[index]))
+        if index % 64 == 0:
+            await asyncio.sleep(0)
+    # 工作进程处理完已提交的数据包、回传最终统计并确认移除之后，所有记录都已分发
+    for connection in connections:
+        await connection.disconnect()
+    await asyncio.gather(*(connection.wait_closed() for connection in connections))
+    return time.perf_counter() - start, events[0], latencies
+
+
+def stress_fleet(generation: int, args, mix) -> BenchResult:
+    """多个魔方共享一个FleetDecoder，测量事件循环端到端的总吞吐量和提交到分发的延迟"""
+    per_cube = max(args.count // args.cubes, 1)
+    streams = []
+    stats = {"events": 0, "cubes": args.cubes, "workers": args.fleet, "dropped": 0, "corrupted": 0, "truncated": 0}
+    for i in range(args.cubes):
+        packets, stream_stats = packet_stream(per_cube, generation, args.seed + i, mix, args.drop_rate,
+                                              args.corrupt_rate, args.start_serial,
+                                              encrypter=make_encrypter(BENCH_SALT, generation))
+        streams.append(packets)
+        for key in ("dropped", "corrupted", "truncated"):
+            stats[key] += stream_stats[key]
+    connections, warmups = [
+        [make_connection(make_encrypter(BENCH_SALT, generation), DRIVERS[generation]()) for _ in range(count)]
+        for count in (args.cubes, args.fleet)]
+    with FleetDecoder(workers=args.fleet) as decoder:
+        elapsed, events, latencies = asyncio.run(_run_fleet(decoder, connections, streams, warmups))
+    packets = sum(len(stream) for stream in streams)
+    stats["events"] = events
+    # 解码端统计由工作进程回传
+    stats["lost_moves"] = sum(connection.metrics.lost_moves for connection in connections)
+    return _result(f"stress.gen{generation}.fleet{args.fleet}", packets, elapsed, latencies, stats)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="GAN protocol driver stress test")
+    parser.add_argument("--generation", default="2", help="协议版本：2、3、4 或 all")
+    parser.add_argument("--count", type=int, default=50000, help="每个进程的数据包数量")
+    parser.add_argument("--seed", type=int, default=1215, help="随机种子")
+    parser.add_argument("--mix", help="事件权重，例如 MOVE=0.6,GYRO=0.3,FACELETS=0.08,BATTERY=0.02")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="丢包比例")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0, help="损坏/截断数据包比例")
+    parser.add_argument("--start-serial", type=int, default=0xF0, help="起始序列号（靠近回绕点）")
+    parser.add_argument("--processes", type=int, default=0, help="并行进程数（0表示只测单进程）")
+    parser.add_argument("--fleet", type=int, default=0, help="FleetDecoder工作进程数（0表示不测）")
+    parser.add_argument("--cubes", type=int, default=8, help="fleet模式下模拟的魔方数量")
+    parser.add_argument("--output", help="保存JSON结果的路径")
+    args = parser.parse_args(argv)
+
+    # 损坏的数据包会产生大量解码警告，压力测试中只保留严重错误
+    logging.getLogger("gan_cube_python").setLevel(logging.CRITICAL)
+
+    generations = [2, 3, 4] if args.generation == "all" else [int(args.generation)]
+    mix = parse_mix(args.mix)
+    results = []
+    for generation in generations:
+        results.append(stress_single(generation, args, mix))
+        if args.processes > 0:
+            results.append(stress_multi(generation, args, mix))
+        if args.fleet > 0:
+            results.append(stress_fleet(generation, args, mix))
+
+    print(format_table(results))
+    for result in results:
+        extra = result.extra
+        print(f"  {result.name}: p99.9 {extra['p999_us']:.1f}us, max {extra['max_us']:.1f}us, "
+              f"events {extra['events']}, dropped {extra['dropped']}, "
+              f"corrupted {extra['corrupted'] + extra['truncated']}, lost moves {extra['lost_moves']}")
+    if args.output:
+        save_results(args.output, results)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
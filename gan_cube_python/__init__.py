@@ -0,0 +1,31 @@
+"""GAN智能魔方Python库
+
+公共类按需导入：`from gan_cube_python import GanCubeManager` 只有在第一次访问时
+才会加载连接模块，蓝牙和加密依赖也推迟到真正连接或创建加密器时才导入。
+"""
+
+import importlib
+
+_EXPORTS = {
+    "GanCubeManager": ".connection",
+    "GanCubeConnection": ".connection",
+    "GanCubeEvent": ".protocol",
+    "GanCubeMove": ".protocol",
+    "GanCubeState": ".protocol",
+    "EventType": ".protocol",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -2,137 +2,366 @@
 """GAN魔方连接管理器 - 简化版"""
 
 import asyncio
+import collections
+import contextlib
+import logging
 import time
-import sys
-from typing import Optional, Callable
-from bleak import BleakClient, BleakScanner
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, List, Optional, Callable, Union
 from .definitions import *
 from .encrypter import GanGen2CubeEncrypter, GanGen3CubeEncrypter, GanGen4CubeEncrypter
-from .protocol import GanGen2ProtocolDriver, GanGen3ProtocolDriver, GanGen4ProtocolDriver, GanCubeEvent
+from .protocol import GanGen2ProtocolDriver, GanGen3ProtocolDriver, GanGen4ProtocolDriver, GanCubeEvent, EventType
+
+if TYPE_CHECKING:
+    from bleak import BleakClient
+
+logger = logging.getLogger(__name__)
+
+COMMAND_CHARACTERISTICS = (GAN_GEN2_COMMAND_CHARACTERISTIC, GAN_GEN3_COMMAND_CHARACTERISTIC, GAN_GEN4_COMMAND_CHARACTERISTIC)
+
+
+@dataclass
+class CommandStats:
+    """命令写入统计"""
+    writes: int = 0  # 实际写入次数
+    coalesced: int = 0  # 与排队中的相同命令合并的请求数
+    failures: int = 0
+    max_queue_depth: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: collections.deque(maxlen=256))  # 最近的写入耗时（秒）
+
+    def as_dict(self, queue_depth: int = 0) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "write_latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "write_latency_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+EVENT_TYPES = ("MOVE", "FACELETS", "GYRO", "BATTERY")
+
+
+def _event_type_name(event_type: Union[str, EventType]) -> str:
+    name = event_type.name if isinstance(event_type, EventType) else str(event_type).upper()
+    if name not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type: {event_type}")
+    return name
+
+
+class EventSubscription:
+    """事件订阅：有界队列支撑的异步迭代器
+
+    每个订阅者有自己的队列，处理慢的订阅者不会拖慢连接或其他订阅者；
+    队列满时丢弃最旧的事件并计入dropped。连接断开或调用close()后迭代结束。
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, connection: "GanCubeConnection", event_types, maxsize: int):
+        self._connection = connection
+        self.event_types = frozenset(event_types)
+        self.dropped = 0
+        self.closed = False
+        self.maxsize = maxsize
+        self._queue: asyncio.Queue = asyncio.Queue()  # 容量由_put控制，结束标记总能放入
+
+    def _put(self, item):
+        if item is not self._CLOSED and self._queue.qsize() >= self.maxsize:
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def close(self):
+        """结束订阅，已在队列中的事件仍可被读取"""
+        if self.closed:
+            return
+        self.closed = True
+        # 连接已断开时创建的订阅从未登记，直接结束
+        subscriptions = self._connection._subscriptions
+        if self in subscriptions:
+            subscriptions.remove(self)
+        self._put(self._CLOSED)
+
+    def __aiter__(self) -> "EventSubscription":
+        return self
+
+    async def __anext__(self) -> GanCubeEvent:
+        item = await self._queue.get()
+        if item is self._CLOSED:
+            # 让后续的迭代也立即结束
+            self._queue.put_nowait(item)
+            raise StopAsyncIteration
+        return item
+
+    async def __aenter__(self) -> "EventSubscription":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+        return False
 
-# 设置输出编码
-if sys.stdout.encoding != 'utf-8':
-    sys.stdout.reconfigure(encoding='utf-8')
 
 class GanCubeConnection:
     """GAN魔方连接类 - 简化版"""
     
-    def __init__(self, device, client: BleakClient, encrypter, driver):
+    def __init__(self, device, client: "BleakClient", encrypter, driver):
         self.device = device
         self.client = client
         self.encrypter = encrypter
         self.driver = driver
-        self.move_handler = None
-        self.state_handler = None
-        self.gyro_handler = None
-        self.battery_handler = None
+        self.metrics = driver.metrics  # 数据包质量统计，驱动记录序列号间隔和越界字段
+        self.handlers: Dict[str, List[Callable]] = {event_type: [] for event_type in EVENT_TYPES}
+        self._subscriptions: List[EventSubscription] = []
+        self._disconnected = asyncio.Event()
+        self._closed = asyncio.Event()  # 已断开，且解码端的最终统计已经回传
+        self.raw_handler = None
+        self.decoder = None  # 可选的FleetDecoder，设置后解密解析在工作进程中完成
+        self._decoder_id = None
         self.is_connected = True
+        self.command_stats = CommandStats()
+        self._command_char = None  # 命令特征，连接时查找一次后缓存
+        self._command_queue: Deque[str] = collections.deque()
+        self._pending_commands: Dict[str, asyncio.Future] = {}  # 尚未写入的命令 -> 共享的结果
+        self._writer_task: Optional[asyncio.Task] = None
     
     @property
     def device_name(self) -> str:
         return self.device.name or "GAN-XXXX"
     
-    def on_move(self, handler: Callable):
+    def on(self, event_type: Union[str, EventType], handler: Callable) -> Callable:
+        """注册事件处理器，同一事件可以注册多个，返回handler以便用作装饰器"""
+        self.handlers[_event_type_name(event_type)].append(handler)
+        return handler
+    
+    def off(self, event_type: Union[str, EventType], handler: Callable):
+        """移除事件处理器"""
+        handlers = self.handlers[_event_type_name(event_type)]
+        if handler in handlers:
+            handlers.remove(handler)
+    
+    def on_move(self, handler: Callable) -> Callable:
         """注册移动事件处理器"""
-        self.move_handler = handler
+        return self.on("MOVE", handler)
     
-    def on_state(self, handler: Callable):
+    def on_state(self, handler: Callable) -> Callable:
         """注册状态事件处理器"""
-        self.state_handler = handler
+        return self.on("FACELETS", handler)
     
-    def on_gyro(self, handler: Callable):
+    def on_gyro(self, handler: Callable) -> Callable:
         """注册陀螺仪事件处理器"""
-        self.gyro_handler = handler
+        return self.on("GYRO", handler)
     
-    def on_battery(self, handler: Callable):
+    def on_battery(self, handler: Callable) -> Callable:
         """注册电量事件处理器"""
-        self.battery_handler = handler
+        return self.on("BATTERY", handler)
     
-    def _emit_move(self, move_data):
-        """触发移动事件"""
-        if self.move_handler:
-            try:
-                self.move_handler(move_data)
-            except Exception as e:
-                print(f"Move handler error: {e}")
+    def events(self, *event_types: Union[str, EventType], maxsize: int = 256) -> EventSubscription:
+        """订阅事件流，不指定类型时订阅全部事件
+        
+            async for event in cube.events("MOVE", "FACELETS"):
+                ...
+        """
+        names = [_event_type_name(t) for t in event_types] or EVENT_TYPES
+        subscription = EventSubscription(self, names, maxsize)
+        if self._disconnected.is_set():
+            subscription.close()
+        else:
+            self._subscriptions.append(subscription)
+        return subscription
     
-    def _emit_state(self, state_data):
-        """触发状态事件"""
-        if self.state_handler:
-            try:
-                self.state_handler(state_data)
-            except Exception as e:
-                print(f"State handler error: {e}")
+    async def wait_disconnected(self):
+        """等待连接断开（主动断开或设备断开）"""
+        await self._disconnected.wait()
     
-    def _emit_gyro(self, gyro_data):
-        """触发陀螺仪事件"""
-        if self.gyro_handler:
-            try:
-                self.gyro_handler(gyro_data)
-            except Exception as e:
-                print(f"Gyro handler error: {e}")
+    async def wait_closed(self):
+        """等待连接断开且统计不再变化：使用FleetDecoder时还要等工作进程回传最终统计"""
+        await self._closed.wait()
     
-    def _emit_battery(self, battery_data):
-        """触发电量事件"""
-        if self.battery_handler:
-            try:
-                self.battery_handler(battery_data)
-            except Exception as e:
-                print(f"Battery handler error: {e}")
+    def on_raw(self, handler: Callable):
+        """注册原始数据包处理器（解密前调用，参数为数据和时间戳）"""
+        self.raw_handler = handler
+    
+    def use_decoder(self, decoder):
+        """把解密和解析交给FleetDecoder（多魔方场景下减轻事件循环的负担）"""
+        self._decoder_id = decoder.register(self)
+        self.decoder = decoder
     
     async def _notification_handler(self, sender, data: bytes):
         """处理通知数据"""
-        if len(data) >= 16:
+        timestamp = time.time()
+        if self.raw_handler:
             try:
-                decrypted_data = self.encrypter.decrypt(data)
-                # 输出解密后的十六进制数据，方便调试
+                self.raw_handler(bytes(data), timestamp)
+            except Exception as e:
+                logger.error("Raw handler error: %s", e)
+        metrics = self.metrics
+        metrics.packets += 1
+        if len(data) < 16:
+            metrics.short_packets += 1
+            return
+        if self.decoder is not None:
+            if not self.decoder.submit(self._decoder_id, bytes(data), timestamp):
+                metrics.dropped_packets += 1
+            return
+        # 完整的堆栈只在DEBUG级别输出，且同类消息会被限流
+        try:
+            decrypted_data = self.encrypter.decrypt(data)
+        except Exception as e:
+            metrics.decrypt_errors += 1
+            logger.warning("Decrypt error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return
+        try:
+            events = self.driver.handle_state_event(decrypted_data, timestamp)
+        except Exception as e:
+            metrics.decode_errors += 1
+            logger.warning("Data processing error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return
+        metrics.events += len(events)
+        for event in events:
+            self._dispatch_event(event)
     
-                events = self.driver.handle_state_event(decrypted_data, time.time())
-                for event in events:
-                    if event.event_type == "MOVE":
-                        self._emit_move(event.data)
-                    elif event.event_type == "FACELETS":
-                        self._emit_state(event.data)
-                    elif event.event_type == "GYRO":
-                        self._emit_gyro(event.data)
-                    elif event.event_type == "BATTERY":
-                        self._emit_battery(event.data)
+    def _dispatch_event(self, event: GanCubeEvent):
+        """把解析出的事件分发给处理器和订阅者"""
+        if event.event_type == "METRICS":
+            # fleet工作进程回传的解码端统计
+            self.metrics.load_decoder_values(event.data)
+            return
+        if event.event_type == "ERROR":
+            logger.warning("Data processing error in decoder worker (reason %s)", event.data["reason"])
+            return
+        handlers = self.handlers.get(event.event_type)
+        if handlers is None:
+            return
+        for handler in handlers:
+            try:
+                handler(event.data)
             except Exception as e:
-                print(f"Data processing error: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.error("%s handler error: %s", event.event_type, e)
+        for subscription in self._subscriptions:
+            if event.event_type in subscription.event_types:
+                subscription._put(event)
+    
+    def _on_client_disconnected(self, client=None):
+        """蓝牙连接断开（设备主动断开或超出范围）"""
+        if self.is_connected:
+            logger.info("Cube disconnected")
+        self._close()
+    
+    def _close(self):
+        self.is_connected = False
+        if self.decoder is not None:
+            decoder, self.decoder = self.decoder, None
+            # 工作进程回传最终统计后会调用 _decoder_closed()
+            decoder.unregister(self._decoder_id)
+        elif self._decoder_id is None:
+            self._closed.set()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        self._command_queue.clear()
+        for future in self._pending_commands.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Cube disconnected"))
+                future.exception()
+        self._pending_commands.clear()
+        for subscription in list(self._subscriptions):
+            subscription.close()
+        self._disconnected.set()
+    
+    def _decoder_closed(self):
+        """FleetDecoder已移除该连接，最终统计已经回传"""
+        self._decoder_id = None
+        self._closed.set()
+    
+    def _find_command_characteristic(self):
+        """查找命令特征并缓存"""
+        if self._command_char is None:
+            for service in self.client.services:
+                for char in service.characteristics:
+                    if char.uuid.lower() in COMMAND_CHARACTERISTICS:
+                        self._command_char = char
+                        return char
+            raise RuntimeError("Command characteristic not found")
+        return self._command_char
     
     async def send_command(self, command_type: str):
-        """发送命令到魔方"""
+        """发送命令到魔方
+        
+        命令进入队列，由单个写入任务按顺序写出；队列中已有相同的命令时不会重复写入，
+        而是等待同一次写入的结果。
+        """
         if not self.is_connected:
             raise RuntimeError("Cube is not connected")
         
-        command_message = self.driver.create_command_message(command_type)
-        if command_message is None:
+        if self.driver.create_command_message(command_type) is None:
             raise ValueError(f"Unknown command type: {command_type}")
         
-        # 加密命令消息
-        encrypted_message = self.encrypter.encrypt(command_message)
-        
-        # 发送到魔方
-        # 需要找到命令特征UUID
-        for service in self.client.services:
-            for char in service.characteristics:
-                if char.uuid.lower() in [GAN_GEN2_COMMAND_CHARACTERISTIC, GAN_GEN3_COMMAND_CHARACTERISTIC, GAN_GEN4_COMMAND_CHARACTERISTIC]:
-                    await self.client.write_gatt_char(char.uuid, encrypted_message)
-                    return
+        pending = self._pending_commands.get(command_type)
+        if pending is not None:
+            self.command_stats.coalesced += 1
+            return await asyncio.shield(pending)
         
-        raise RuntimeError("Command characteristic not found")
+        future = asyncio.get_running_loop().create_future()
+        self._pending_commands[command_type] = future
+        self._command_queue.append(command_type)
+        self.command_stats.max_queue_depth = max(self.command_stats.max_queue_depth, len(self._command_queue))
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._command_writer())
+        return await asyncio.shield(future)
+    
+    async def _command_writer(self):
+        """依次写出队列中的命令，队列清空后退出"""
+        while self._command_queue:
+            command_type = self._command_queue.popleft()
+            # 出队后再收到的相同命令需要重新写入（魔方状态可能已经变化）
+            future = self._pending_commands.pop(command_type)
+            try:
+                char = self._find_command_characteristic()
+                # 特征支持时使用无响应写入，不必等待一次连接间隔的确认
+                response = "write-without-response" not in getattr(char, "properties", ())
+                encrypted_message = self.encrypter.encrypt(self.driver.create_command_message(command_type))
+                start = time.perf_counter()
+                await self.client.write_gatt_char(char, encrypted_message, response=response)
+                self.command_stats.latencies.append(time.perf_counter() - start)
+                self.command_stats.writes += 1
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(RuntimeError("Cube disconnected"))
+                    future.exception()
+                raise
+            except Exception as e:
+                self.command_stats.failures += 1
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # 所有等待者都已取消时避免"exception was never retrieved"
+            else:
+                if not future.done():
+                    future.set_result(None)
+    
+    def get_command_stats(self) -> Dict[str, Any]:
+        """命令写入统计：队列深度、写入/合并/失败次数和写入耗时"""
+        return self.command_stats.as_dict(len(self._command_queue))
+    
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """数据包质量统计：序列号间隔分布、丢失的转动、解密/解析失败和越界字段"""
+        return self.metrics.snapshot()
     
     async def request_state(self):
         """请求魔方状态"""
         await self.send_command("REQUEST_FACELETS")
     
     async def disconnect(self):
-        """断开连接"""
+        """断开连接：停止命令写入、结束所有事件订阅并断开蓝牙"""
         self.is_connected = False
-        if self.client.is_connected:
-            await self.client.disconnect()
+        try:
+            if self.client.is_connected:
+                await self.client.disconnect()
+        finally:
+            self._close()
 
 class GanCubeManager:
     """GAN魔方管理器 - 简化版"""
@@ -148,58 +377,78 @@ class GanCubeManager:
                 # 取前12个字符（6个字节）
                 hex_string = uuid_parts[:12]
                 salt = bytes.fromhex(hex_string)
-                print(f"Salt from UUID {mac_address}: {salt.hex()}")
+                logger.debug("Salt from UUID %s: %s", mac_address, salt.hex())
                 return salt
             else:
                 # 如果UUID太短，使用默认盐值
-                print(f"Warning: Invalid UUID format, using default salt")
+                logger.warning("Invalid UUID format, using default salt")
                 return bytes([0x00] * 6)
         else:
             # MAC地址格式
             parts = mac_address.split(':')
             if len(parts) == 6:
                 salt = bytes(int(part, 16) for part in reversed(parts))
-                print(f"Salt from MAC {mac_address}: {salt.hex()}")
+                logger.debug("Salt from MAC %s: %s", mac_address, salt.hex())
                 return salt
             else:
                 # 如果格式不正确，使用默认盐值
-                print(f"Warning: Invalid MAC format, using default salt")
+                logger.warning("Invalid MAC format, using default salt")
                 return bytes([0x00] * 6)
     
     @staticmethod
-    async def connect(uuid_address: str, mac_address: str) -> GanCubeConnection:
-        """连接到GAN魔方"""
+    @contextlib.asynccontextmanager
+    async def open(uuid_address: str, mac_address: str, decoder=None) -> AsyncIterator[GanCubeConnection]:
+        """连接魔方，退出上下文时确定地断开连接
+        
+            async with GanCubeManager.open(uuid, mac) as cube:
+                async for event in cube.events("MOVE"):
+                    ...
+        """
+        connection = await GanCubeManager.connect(uuid_address, mac_address, decoder)
+        try:
+            yield connection
+        finally:
+            await connection.disconnect()
+    
+    @staticmethod
+    async def connect(uuid_address: str, mac_address: str, decoder=None) -> GanCubeConnection:
+        """连接到GAN魔方
+
+        decoder: 可选的FleetDecoder，连接多个魔方时把解码放到工作进程中
+        """
         
         if not uuid_address or not mac_address:
             raise ValueError("Both UUID and MAC address are required")
         
-        print(f"Connecting to device UUID: {uuid_address}")
-        print(f"Using MAC address for salt: {mac_address}")
+        logger.info("Connecting to device UUID: %s", uuid_address)
+        logger.debug("Using MAC address for salt: %s", mac_address)
         
         # 直接使用传入的UUID连接，不需要扫描
-        print("Connecting directly using provided UUID...")
         
         # 生成盐值（使用传入的MAC地址）
         salt = GanCubeManager._generate_salt_from_mac(mac_address)
         
         # 连接设备
-        print("Connecting to device...")
-        print(f"Device UUID: {uuid_address}")
+        # 直接使用传入的UUID连接（bleak在这里才导入，避免拖慢包的导入）
+        from bleak import BleakClient
+        # 连接对象在识别出魔方类型后才创建，断开回调通过列表间接引用
+        connection_ref: List[GanCubeConnection] = []
         
-        # 直接使用传入的UUID连接
+        def on_disconnected(client):
+            if connection_ref:
+                connection_ref[0]._on_client_disconnected(client)
         try:
-            client = BleakClient(uuid_address)
+            client = BleakClient(uuid_address, disconnected_callback=on_disconnected)
             await client.connect()
-            print("Connected using provided UUID")
+            logger.debug("Connected using provided UUID")
         except Exception as e:
-            print(f"Failed to connect using UUID: {e}")
+            logger.error("Failed to connect using UUID: %s", e)
             raise e
-        print("Device connected successfully")
+        logger.info("Device connected successfully")
         
         # 确定魔方类型和设置加密器
-        print("Identifying cube type...")
+        logger.debug("Identifying cube type...")
         services = client.services
-        print("Found service collection")
         
         encrypter = None
         driver = None
@@ -208,10 +457,10 @@ class GanCubeManager:
         # 遍历服务集合
         for service in services:
             service_uuid = service.uuid.lower()
-            print(f"Checking service: {service_uuid}")
+            logger.debug("Checking service: %s", service_uuid)
             
             if service_uuid == GAN_GEN2_SERVICE:
-                print("Identified as GAN Gen2 cube")
+                logger.info("Identified as GAN Gen2 cube")
                 # 查找特征
                 for char in service.characteristics:
                     if char.uuid.lower() == GAN_GEN2_STATE_CHARACTERISTIC:
@@ -229,10 +478,10 @@ class GanCubeManager:
                     driver = GanGen2ProtocolDriver()
                     break
                 else:
-                    print("Error: Required characteristics not found")
+                    logger.error("Required characteristics not found")
                     
             elif service_uuid == GAN_GEN3_SERVICE:
-                print("Identified as GAN Gen3 cube")
+                logger.info("Identified as GAN Gen3 cube")
                 # 查找特征
                 for char in service.characteristics:
                     if char.uuid.lower() == GAN_GEN3_STATE_CHARACTERISTIC:
@@ -249,10 +498,10 @@ class GanCubeManager:
                     driver = GanGen3ProtocolDriver()
                     break
                 else:
-                    print("Error: Required characteristics not found")
+                    logger.error("Required characteristics not found")
                     
             elif service_uuid == GAN_GEN4_SERVICE:
-                print("Identified as GAN Gen4 cube")
+                logger.info("Identified as GAN Gen4 cube")
                 # 查找特征
                 for char in service.characteristics:
                     if char.uuid.lower() == GAN_GEN4_STATE_CHARACTERISTIC:
@@ -269,7 +518,7 @@ class GanCubeManager:
                     driver = GanGen4ProtocolDriver()
                     break
                 else:
-                    print("Error: Required characteristics not found")
+                    logger.error("Required characteristics not found")
         
         if not encrypter or not driver:
             await client.disconnect()
@@ -283,11 +532,17 @@ class GanCubeManager:
         
         # 创建连接对象
         connection = GanCubeConnection(virtual_device, client, encrypter, driver)
+        connection_ref.append(connection)
+        if decoder is not None:
+            connection.use_decoder(decoder)
+        try:
+            connection._find_command_characteristic()
+        except RuntimeError:
+            logger.warning("Command characteristic not found, state requests will fail")
         
         # 订阅通知
-        print(f"Subscribing to state notifications: {state_char.uuid}")
+        logger.debug("Subscribing to state notifications: %s", state_char.uuid)
         await client.start_notify(state_char.uuid, connection._notification_handler)
         
-        print("Successfully connected to GAN cube")
-        print("Ready to detect moves and state changes!")
+        logger.info("Successfully connected to GAN cube")
         return connection 
\ No newline at end of file
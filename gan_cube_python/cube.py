@@ -0,0 +1,288 @@
+"""魔方角块/边块模型
+
+状态使用与协议解析相同的表示 (cp, co, ep, eo)：
+- cp[i]/ep[i] 表示位置i上的角块/边块编号
+- co[i]/eo[i] 表示位置i上的块的方向
+角块顺序为 URF, UFL, ULB, UBR, DFR, DLF, DBL, DRB，
+边块顺序为 UR, UF, UL, UB, DR, DF, DL, DB, FR, FL, BL, BR（Kociemba约定）。
+"""
+
+import random
+from math import comb
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .moves import MOVE_NAMES, MoveSequence
+
+CubieState = Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]]
+
+SOLVED_STATE: CubieState = (tuple(range(8)), (0,) * 8, tuple(range(12)), (0,) * 12)
+
+# 六个面顺时针转动90度后的块状态
+_BASIC_MOVES: Dict[str, CubieState] = {
+    "U": ((3, 0, 1, 2, 4, 5, 6, 7), (0, 0, 0, 0, 0, 0, 0, 0),
+          (3, 0, 1, 2, 4, 5, 6, 7, 8, 9, 10, 11), (0,) * 12),
+    "R": ((4, 1, 2, 0, 7, 5, 6, 3), (2, 0, 0, 1, 1, 0, 0, 2),
+          (8, 1, 2, 3, 11, 5, 6, 7, 4, 9, 10, 0), (0,) * 12),
+    "F": ((1, 5, 2, 3, 0, 4, 6, 7), (1, 2, 0, 0, 2, 1, 0, 0),
+          (0, 9, 2, 3, 4, 8, 6, 7, 1, 5, 10, 11), (0, 1, 0, 0, 0, 1, 0, 0, 1, 1, 0, 0)),
+    "D": ((0, 1, 2, 3, 5, 6, 7, 4), (0, 0, 0, 0, 0, 0, 0, 0),
+          (0, 1, 2, 3, 5, 6, 7, 4, 8, 9, 10, 11), (0,) * 12),
+    "L": ((0, 2, 6, 3, 4, 1, 5, 7), (0, 1, 2, 0, 0, 2, 1, 0),
+          (0, 1, 10, 3, 4, 5, 9, 7, 8, 2, 6, 11), (0,) * 12),
+    "B": ((0, 1, 3, 7, 4, 5, 2, 6), (0, 0, 1, 2, 0, 0, 2, 1),
+          (0, 1, 2, 11, 4, 5, 6, 10, 8, 9, 3, 7), (0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 1)),
+}
+
+
+def multiply(a: CubieState, b: CubieState) -> CubieState:
+    """状态乘法：先a后b"""
+    a_cp, a_co, a_ep, a_eo = a
+    b_cp, b_co, b_ep, b_eo = b
+    return (
+        tuple(a_cp[j] for j in b_cp),
+        tuple((a_co[j] + o) % 3 for j, o in zip(b_cp, b_co)),
+        tuple(a_ep[j] for j in b_ep),
+        tuple(a_eo[j] ^ o for j, o in zip(b_ep, b_eo)),
+    )
+
+
+def _build_moves() -> Dict[str, CubieState]:
+    moves = {}
+    for face, quarter in _BASIC_MOVES.items():
+        double = multiply(quarter, quarter)
+        moves[face] = quarter
+        moves[face + "2"] = double
+        moves[face + "'"] = multiply(double, quarter)
+    return moves
+
+
+# 18种转动（U, U2, U', R, ...）
+MOVES: Dict[str, CubieState] = _build_moves()
+
+
+def apply_move(state: CubieState, move: str) -> CubieState:
+    """对状态执行一步转动"""
+    return multiply(state, MOVES[move])
+
+
+def apply_moves(state: CubieState, moves: Iterable[str]) -> CubieState:
+    """依次执行多步转动"""
+    for move in moves:
+        state = multiply(state, MOVES[move])
+    return state
+
+
+def parse_moves(text: str) -> List[str]:
+    """把转动公式拆分为转动列表，兼容 R2' 等写法"""
+    return MoveSequence.parse(text).names()
+
+
+def state_from_lists(cp: Sequence[int], co: Sequence[int], ep: Sequence[int], eo: Sequence[int]) -> CubieState:
+    """从协议解析得到的列表构造状态"""
+    return (tuple(cp), tuple(co), tuple(ep), tuple(eo))
+
+
+def state_key(state: CubieState) -> int:
+    """把状态压缩为一个整数（100位），可直接用作字典键或比较相等"""
+    cp, co, ep, eo = state
+    key = 0
+    for p in cp:
+        key = (key << 3) | p
+    for o in co:
+        key = (key << 2) | o
+    for p in ep:
+        key = (key << 4) | p
+    for o in eo:
+        key = (key << 1) | o
+    return key
+
+
+# 每个角块/边块位置上的面块编号（Kociemba面块顺序 U1..U9, R1..R9, F, D, L, B）
+_CORNER_FACELETS = ((8, 9, 20), (6, 18, 38), (0, 36, 47), (2, 45, 11),
+                    (29, 26, 15), (27, 44, 24), (33, 53, 42), (35, 17, 51))
+_EDGE_FACELETS = ((5, 10), (7, 19), (3, 37), (1, 46), (32, 16), (28, 25),
+                  (30, 43), (34, 52), (23, 12), (21, 41), (50, 39), (48, 14))
+
+
+def to_facelets(state: CubieState) -> str:
+    """状态 -> Kociemba面块字符串（与FACELETS事件的facelets格式相同）"""
+    cp, co, ep, eo = state
+    facelets = ["URFDLB"[i // 9] for i in range(54)]
+    for i in range(8):
+        piece, twist = _CORNER_FACELETS[cp[i]], co[i]
+        for p in range(3):
+            facelets[_CORNER_FACELETS[i][(p + twist) % 3]] = "URFDLB"[piece[p] // 9]
+    for i in range(12):
+        piece, flip = _EDGE_FACELETS[ep[i]], eo[i]
+        for p in range(2):
+            facelets[_EDGE_FACELETS[i][(p + flip) % 2]] = "URFDLB"[piece[p] // 9]
+    return "".join(facelets)
+
+
+# ---------------------------------------------------------------------------
+# 坐标表示（转动表、剪枝表和两阶段搜索见 solver.py）
+# ---------------------------------------------------------------------------
+
+# 转动编号：face * 3 + (0: 90度, 1: 180度, 2: -90度)，见 moves.py
+N_MOVES = len(MOVE_NAMES)
+_MOVE_STATES = [MOVES[name] for name in MOVE_NAMES]
+
+
+def apply_move_code(state: CubieState, code: int) -> CubieState:
+    """执行一步用编码表示的转动"""
+    return multiply(state, _MOVE_STATES[code])
+
+
+def apply_move_codes(state: CubieState, codes: Iterable[int]) -> CubieState:
+    """依次执行用编码表示的转动（MoveSequence可直接传入）"""
+    for code in codes:
+        state = multiply(state, _MOVE_STATES[code])
+    return state
+
+# 第二阶段（G1 = <U, D, R2, L2, F2, B2>）可用的转动
+PHASE2_MOVES = [0, 1, 2, 4, 7, 9, 10, 11, 13, 16]
+N_PHASE2_MOVES = len(PHASE2_MOVES)
+
+N_TWIST = 2187  # 3^7
+N_FLIP = 2048  # 2^11
+N_SLICE = 495  # C(12, 4)
+N_CPERM = 40320  # 8!
+N_UDPERM = 40320  # 8!
+N_SLICEPERM = 24  # 4!
+_N_EPERM = 479001600  # 12!
+
+
+def _perm_rank(perm: Sequence[int]) -> int:
+    """排列的Lehmer编码，还原状态为0"""
+    n = len(perm)
+    rank = 0
+    for i in range(n):
+        p = perm[i]
+        smaller = 0
+        for j in range(i + 1, n):
+            if perm[j] < p:
+                smaller += 1
+        rank = rank * (n - i) + smaller
+    return rank
+
+
+def _perm_unrank(rank: int, n: int) -> List[int]:
+    digits = []
+    for base in range(1, n + 1):
+        rank, digit = divmod(rank, base)
+        digits.append(digit)
+    digits.reverse()
+    items = list(range(n))
+    return [items.pop(d) for d in digits]
+
+
+def get_twist(co: Sequence[int]) -> int:
+    """角块方向坐标 0..2186"""
+    twist = 0
+    for i in range(7):
+        twist = twist * 3 + co[i]
+    return twist
+
+
+def get_flip(eo: Sequence[int]) -> int:
+    """边块方向坐标 0..2047"""
+    flip = 0
+    for i in range(11):
+        flip = flip * 2 + eo[i]
+    return flip
+
+
+def get_slice(ep: Sequence[int]) -> int:
+    """中层四个棱块（FR, FL, BL, BR）的位置组合坐标 0..494"""
+    index = 0
+    found = 0
+    for j in range(11, -1, -1):
+        if ep[j] >= 8:
+            found += 1
+            index += comb(11 - j, found)
+    return index
+
+
+def get_cperm(cp: Sequence[int]) -> int:
+    """角块排列坐标 0..40319"""
+    return _perm_rank(cp)
+
+
+def get_udperm(ep: Sequence[int]) -> int:
+    """第二阶段中U/D层八个棱块的排列坐标"""
+    return _perm_rank(ep[:8])
+
+
+def get_sliceperm(ep: Sequence[int]) -> int:
+    """第二阶段中层四个棱块的排列坐标"""
+    return _perm_rank([p - 8 for p in ep[8:]])
+
+
+def state_index(state: CubieState) -> int:
+    """把状态编码为紧凑的整数坐标（约66位），与状态一一对应"""
+    cp, co, ep, eo = state
+    index = _perm_rank(cp) * N_TWIST + get_twist(co)
+    index = index * _N_EPERM + _perm_rank(ep)
+    return index * N_FLIP + get_flip(eo)
+
+
+def state_from_index(index: int) -> CubieState:
+    """state_index的逆运算"""
+    index, flip = divmod(index, N_FLIP)
+    index, erank = divmod(index, _N_EPERM)
+    crank, twist = divmod(index, N_TWIST)
+    co = []
+    for _ in range(7):
+        twist, o = divmod(twist, 3)
+        co.append(o)
+    co.reverse()
+    co.append((3 - sum(co) % 3) % 3)
+    eo = []
+    for _ in range(11):
+        flip, o = divmod(flip, 2)
+        eo.append(o)
+    eo.reverse()
+    eo.append(sum(eo) % 2)
+    return (tuple(_perm_unrank(crank, 8)), tuple(co), tuple(_perm_unrank(erank, 12)), tuple(eo))
+
+
+def _parity(perm: Sequence[int]) -> int:
+    parity = 0
+    for i in range(len(perm)):
+        for j in range(i + 1, len(perm)):
+            if perm[i] > perm[j]:
+                parity ^= 1
+    return parity
+
+
+def random_state(rng: Optional[random.Random] = None) -> CubieState:
+    """均匀随机地生成一个可解状态"""
+    rng = rng or random
+    cp = list(range(8))
+    ep = list(range(12))
+    rng.shuffle(cp)
+    rng.shuffle(ep)
+    # 角块和边块排列的奇偶性必须一致
+    if _parity(cp) != _parity(ep):
+        ep[0], ep[1] = ep[1], ep[0]
+    co = [rng.randrange(3) for _ in range(7)]
+    co.append((3 - sum(co) % 3) % 3)
+    eo = [rng.randrange(2) for _ in range(11)]
+    eo.append(sum(eo) % 2)
+    return (tuple(cp), tuple(co), tuple(ep), tuple(eo))
+
+
+def is_solvable(state: CubieState) -> bool:
+    """检查状态是否可以还原"""
+    cp, co, ep, eo = state
+    # 方向值越界（损坏的数据包）时坐标会超出转动表和剪枝表的范围
+    if len(co) != 8 or len(eo) != 12 or not all(0 <= o < 3 for o in co) or not all(o in (0, 1) for o in eo):
+        return False
+    return (sorted(cp) == list(range(8)) and sorted(ep) == list(range(12))
+            and sum(co) % 3 == 0 and sum(eo) % 2 == 0 and _parity(cp) == _parity(ep))
+
+
+def invert_moves(moves: Sequence[str]) -> List[str]:
+    """求转动序列的逆序列"""
+    return MoveSequence.from_names(moves).inverse().names()
+
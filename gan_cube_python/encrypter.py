@@ -1,10 +1,19 @@
 """GAN魔方加密器实现"""
 
-# 使用 pycryptodome 提供的 Crypto 命名空间
-from Crypto.Cipher import AES
 import struct
 from typing import List, Tuple
 
+_AES = None
+
+def _aes_module():
+    """延迟导入pycryptodome的AES模块，避免拖慢包的导入"""
+    global _AES
+    if _AES is None:
+        # 使用 pycryptodome 提供的 Crypto 命名空间
+        from Crypto.Cipher import AES
+        _AES = AES
+    return _AES
+
 class GanCubeEncrypter:
     """GAN魔方加密器基类"""
     
@@ -23,6 +32,10 @@ class GanCubeEncrypter:
             raise ValueError("初始化向量必须是16字节")
         if len(salt) != 6:
             raise ValueError("盐值必须是6字节")
+        
+        AES = _aes_module()
+        self._new_cipher = AES.new
+        self._mode = AES.MODE_CBC
             
         # 应用盐值到密钥和初始化向量
         self._key = bytearray(key)
@@ -42,13 +55,13 @@ class GanCubeEncrypter:
         result = bytearray(data)
         
         # 加密16字节块（对齐到消息开始）
-        cipher = AES.new(self._key, AES.MODE_CBC, self._iv)
+        cipher = self._new_cipher(self._key, self._mode, self._iv)
         chunk = cipher.encrypt(bytes(result[:16]))
         result[:16] = chunk
         
         # 加密16字节块（对齐到消息结束）
         if len(result) > 16:
-            cipher = AES.new(self._key, AES.MODE_CBC, self._iv)
+            cipher = self._new_cipher(self._key, self._mode, self._iv)
             chunk = cipher.encrypt(bytes(result[-16:]))
             result[-16:] = chunk
             
@@ -63,12 +76,12 @@ class GanCubeEncrypter:
         
         # 解密16字节块（对齐到消息结束）
         if len(result) > 16:
-            cipher = AES.new(self._key, AES.MODE_CBC, self._iv)
+            cipher = self._new_cipher(self._key, self._mode, self._iv)
             chunk = cipher.decrypt(bytes(result[-16:]))
             result[-16:] = chunk
             
         # 解密16字节块（对齐到消息开始）
-        cipher = AES.new(self._key, AES.MODE_CBC, self._iv)
+        cipher = self._new_cipher(self._key, self._mode, self._iv)
         chunk = cipher.decrypt(bytes(result[:16]))
         result[:16] = chunk
         
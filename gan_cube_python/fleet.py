@@ -0,0 +1,539 @@
+"""多核解码管线（fleet模式）
+
+一台主机连接很多魔方时，解密和位解析与蓝牙I/O、用户回调挤在同一个asyncio线程上。
+FleetDecoder把原始数据包写入 multiprocessing.shared_memory 环形缓冲区，由工作进程
+批量解密、解析，再把定长的紧凑记录写回另一个环形缓冲区；事件循环只负责搬运字节和分发事件，
+全程不需要对单个事件做pickle。
+
+每个连接固定分配给一个工作进程（保证同一魔方的序列号状态在同一进程中），
+每个工作进程有自己的一对单生产者/单消费者环形缓冲区。
+驱动的数据包质量统计（metrics.py）留在工作进程中，以记录的形式回传给对应连接：
+有数据时至多每0.5秒一次（连接上看到的统计因此最多滞后0.5秒），空闲时立即回传，
+注销连接时在确认移除之前回传最终值（见 GanCubeConnection.wait_closed）。
+
+没有数据时两端都阻塞等待，不轮询：工作进程等在输入环的唤醒管道和控制管道上，
+事件循环通过 loop.add_reader 监听输出环的唤醒管道。依赖管道文件描述符，只支持POSIX平台。
+
+    decoder = FleetDecoder(workers=4)
+    decoder.start()
+    cube = await GanCubeManager.connect(uuid, mac, decoder=decoder)
+    ...
+    decoder.close()
+"""
+
+import asyncio
+import collections
+import logging
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .definitions import FACE_NAMES
+from .metrics import DECODER_VALUE_COUNT
+from .protocol import GanCubeEvent, GanCubeMove, GanCubeState
+
+logger = logging.getLogger(__name__)
+
+_U64 = struct.Struct("<Q")
+
+# 输入槽：连接号(2) 长度(1) 保留(1) 时间戳(8) 数据(最多52)
+_IN_HEADER = struct.Struct("<HBxd")
+IN_SLOT_SIZE = 64
+MAX_PACKET_SIZE = IN_SLOT_SIZE - _IN_HEADER.size
+
+# 输出槽：连接号(2) 记录类型(1) 保留(1) 时间戳(8) 负载(最多116)
+_OUT_HEADER = struct.Struct("<HBxd")
+OUT_SLOT_SIZE = 128
+
+RECORD_ERROR = 0
+RECORD_MOVE = 1
+RECORD_FACELETS = 2
+RECORD_GYRO = 3
+RECORD_BATTERY = 4
+RECORD_METRICS = 5
+RECORD_CLOSED = 6  # 工作进程已移除连接，之后不会再有该连接号的记录
+
+_MOVE = struct.Struct("<BBBBdd")  # face, direction, serial, has_local, local_ts, cube_ts
+# cp, co, ep, eo（有符号：损坏的数据包推算出的最后一块可能为负）, facelets
+_FACELETS = struct.Struct("<8b8b12b12b54s")
+_GYRO = struct.Struct("<4d3b")  # qx, qy, qz, qw, vx, vy, vz
+_BATTERY = struct.Struct("<B")
+_ERROR = struct.Struct("<B")  # 错误原因
+_METRICS = struct.Struct(f"<{DECODER_VALUE_COUNT}I")  # ConnectionMetrics.decoder_values()
+_EMPTY = struct.Struct("<")
+
+MAX_CONNECTIONS = 0x10000  # 连接号为16位
+
+ERROR_DECODE = 1
+ERROR_DECRYPT = 2
+
+_WORKER_BATCH = 256
+_BACKPRESSURE_WAIT = 0.0005  # 输出环满时等待主进程消费的间隔（秒），只在背压时使用
+_DRAIN_BATCH = 1024  # 事件循环每次回调最多分发的记录数，剩余的留到下一轮
+_METRICS_INTERVAL = 0.5  # 工作进程回传统计的最小间隔（秒），空闲时立即回传
+
+
+class SharedRing:
+    """基于共享内存的单生产者/单消费者定长槽环形缓冲区
+
+    内存顺序：head、tail 和等待标志只在 lock（multiprocessing.Lock，底层为POSIX信号量）
+    内读写。信号量的获取和释放是完整的内存屏障，所以生产者在 publish() 之前写入的槽，
+    消费者在锁内读到新的head之后一定可见；消费者在锁内推进tail之前读完的槽，生产者在锁内
+    读到新的tail之后才会覆盖。ARM等弱内存序平台上同样成立，槽内不再需要序号校验。
+
+    生产者用 push() 写入若干个槽，再用一次 publish() 发布整批（一次加锁）。消费者没有数据
+    可读时调用 prepare_wait() 登记等待，然后阻塞在 wakeup_fd 上；发布时发现有消费者在等待，
+    生产者向唤醒管道写一个字节。登记和发布都在锁内进行，不会丢失唤醒。
+    """
+
+    HEADER_SIZE = 64
+    _TAIL_OFFSET = 32
+    _WAITING_OFFSET = 48
+
+    def __init__(self, slot_size: int, capacity: int, name: Optional[str] = None, lock=None, wakeup=None):
+        self.slot_size = slot_size
+        self.capacity = capacity
+        size = self.HEADER_SIZE + slot_size * capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:self.HEADER_SIZE] = bytes(self.HEADER_SIZE)
+            self._owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.buf = self.shm.buf
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        # (读端, 写端)，multiprocessing的Connection可以随spawn传给子进程，这里只使用其文件描述符
+        self.wakeup = wakeup if wakeup is not None else multiprocessing.Pipe(duplex=False)
+        self.wakeup_fd = self.wakeup[0].fileno()
+        self._notify_fd = self.wakeup[1].fileno()
+        os.set_blocking(self.wakeup_fd, False)
+        os.set_blocking(self._notify_fd, False)
+        self._pending = 0  # 已写入、尚未发布的槽数（生产者本地）
+        self._tail_seen = 0  # 生产者最近一次在锁内读到的tail
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def share(self) -> Dict[str, Any]:
+        """在另一个进程中打开同一个环所需的参数（只能在启动子进程时传递）"""
+        return {"slot_size": self.slot_size, "capacity": self.capacity, "name": self.name,
+                "lock": self.lock, "wakeup": self.wakeup}
+
+    def __len__(self) -> int:
+        with self.lock:
+            return _U64.unpack_from(self.buf, 0)[0] - _U64.unpack_from(self.buf, self._TAIL_OFFSET)[0]
+
+    def push(self, pack: Callable[..., None], *args) -> bool:
+        """用pack(buf, offset, *args)写入一个槽的负载（调用publish()后才对消费者可见），
+        缓冲区满时返回False"""
+        buf = self.buf
+        head = _U64.unpack_from(buf, 0)[0] + self._pending
+        if head - self._tail_seen >= self.capacity:
+            with self.lock:
+                self._tail_seen = _U64.unpack_from(buf, self._TAIL_OFFSET)[0]
+            if head - self._tail_seen >= self.capacity:
+                return False
+        pack(buf, self.HEADER_SIZE + (head % self.capacity) * self.slot_size, *args)
+        self._pending += 1
+        return True
+
+    def publish(self):
+        """发布已写入的槽，消费者在等待时唤醒它"""
+        if not self._pending:
+            return
+        buf = self.buf
+        with self.lock:
+            _U64.pack_into(buf, 0, _U64.unpack_from(buf, 0)[0] + self._pending)
+            waiting = buf[self._WAITING_OFFSET]
+            buf[self._WAITING_OFFSET] = 0
+        self._pending = 0
+        if waiting:
+            try:
+                os.write(self._notify_fd, b"\0")
+            except BlockingIOError:
+                # 管道里已经有未读的唤醒字节
+                pass
+
+    def consume(self, handler: Callable[[memoryview, int], None], limit: int) -> int:
+        """对最多limit个已发布的槽调用handler(buf, 负载偏移)，返回处理的数量"""
+        buf = self.buf
+        with self.lock:
+            tail = _U64.unpack_from(buf, self._TAIL_OFFSET)[0]
+            available = min(_U64.unpack_from(buf, 0)[0] - tail, limit)
+        for done in range(available):
+            handler(buf, self.HEADER_SIZE + ((tail + done) % self.capacity) * self.slot_size)
+        if available:
+            with self.lock:
+                _U64.pack_into(buf, self._TAIL_OFFSET, tail + available)
+        return available
+
+    def prepare_wait(self) -> bool:
+        """没有可读的槽时登记等待并返回True（之后应阻塞在wakeup_fd上），否则返回False"""
+        buf = self.buf
+        with self.lock:
+            if _U64.unpack_from(buf, 0)[0] != _U64.unpack_from(buf, self._TAIL_OFFSET)[0]:
+                return False
+            buf[self._WAITING_OFFSET] = 1
+            return True
+
+    def clear_wakeup(self):
+        """读掉唤醒管道中的字节"""
+        try:
+            while os.read(self.wakeup_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+            for connection in self.wakeup:
+                connection.close()
+
+
+def _pack_packet(buf, offset: int, conn_id: int, data: bytes, timestamp: float):
+    _IN_HEADER.pack_into(buf, offset, conn_id, len(data), timestamp)
+    start = offset + _IN_HEADER.size
+    buf[start:start + len(data)] = data
+
+
+def _pack_record(buf, offset: int, conn_id: int, kind: int, timestamp: float, body: struct.Struct, values):
+    _OUT_HEADER.pack_into(buf, offset, conn_id, kind, timestamp)
+    body.pack_into(buf, offset + _OUT_HEADER.size, *values)
+
+
+def _encode_event(event: GanCubeEvent):
+    """把驱动产生的事件转换为 (记录类型, 结构, 值)，不需要的事件返回None"""
+    data = event.data
+    if event.event_type == "MOVE":
+        has_local = data.local_timestamp is not None
+        return RECORD_MOVE, _MOVE, (data.face, data.direction, data.serial & 0xFF, has_local,
+                                    data.local_timestamp if has_local else 0.0, data.cube_timestamp or 0.0)
+    if event.event_type == "FACELETS":
+        return RECORD_FACELETS, _FACELETS, (*data.cp, *data.co, *data.ep, *data.eo, data.facelets.encode("ascii"))
+    if event.event_type == "GYRO":
+        q, v = data["quaternion"], data["velocity"]
+        return RECORD_GYRO, _GYRO, (q["x"], q["y"], q["z"], q["w"], v["x"], v["y"], v["z"])
+    if event.event_type == "BATTERY":
+        return RECORD_BATTERY, _BATTERY, (data["battery_level"],)
+    return None
+
+
+def _decode_record(buf, offset: int):
+    """把输出槽还原为 (连接号, GanCubeEvent)，RECORD_CLOSED 还原为 (连接号, None)"""
+    conn_id, kind, timestamp = _OUT_HEADER.unpack_from(buf, offset)
+    body = offset + _OUT_HEADER.size
+    if kind == RECORD_MOVE:
+        face, direction, serial, has_local, local_ts, cube_ts = _MOVE.unpack_from(buf, body)
+        data = GanCubeMove(face=face, direction=direction, move=FACE_NAMES[face] + ("'" if direction else ""),
+                           local_timestamp=local_ts if has_local else None, cube_timestamp=cube_ts, serial=serial)
+        return conn_id, GanCubeEvent("MOVE", timestamp, data)
+    if kind == RECORD_FACELETS:
+        values = _FACELETS.unpack_from(buf, body)
+        data = GanCubeState(cp=list(values[0:8]), co=list(values[8:16]), ep=list(values[16:28]),
+                            eo=list(values[28:40]), facelets=values[40].decode("ascii"))
+        return conn_id, GanCubeEvent("FACELETS", timestamp, data)
+    if kind == RECORD_GYRO:
+        qx, qy, qz, qw, vx, vy, vz = _GYRO.unpack_from(buf, body)
+        data = {"quaternion": {"x": qx, "y": qy, "z": qz, "w": qw}, "velocity": {"x": vx, "y": vy, "z": vz}}
+        return conn_id, GanCubeEvent("GYRO", timestamp, data)
+    if kind == RECORD_BATTERY:
+        return conn_id, GanCubeEvent("BATTERY", timestamp, {"battery_level": _BATTERY.unpack_from(buf, body)[0]})
+    if kind == RECORD_METRICS:
+        return conn_id, GanCubeEvent("METRICS", timestamp, _METRICS.unpack_from(buf, body))
+    if kind == RECORD_CLOSED:
+        return conn_id, None
+    return conn_id, GanCubeEvent("ERROR", timestamp, {"reason": _ERROR.unpack_from(buf, body)[0]})
+
+
+def _worker_main(in_ring_args: Dict[str, Any], out_ring_args: Dict[str, Any], control, stop):
+    """工作进程：从输入环读取数据包，解密解析后把记录写入输出环"""
+    logging.getLogger("gan_cube_python").setLevel(logging.CRITICAL)
+    in_ring = SharedRing(**in_ring_args)
+    out_ring = SharedRing(**out_ring_args)
+    connections: Dict[int, Any] = {}  # 连接号 -> (加密器, 驱动)
+    # 统计有变化、尚未回传的连接 -> 上次回传时间
+    dirty = set()
+    last_sent: Dict[int, float] = {}
+
+    def emit(conn_id: int, kind: int, timestamp: float, body: struct.Struct, values):
+        # 输出环满时先发布已写入的记录，再等待主进程消费（背压）
+        while not out_ring.push(_pack_record, conn_id, kind, timestamp, body, values):
+            out_ring.publish()
+            if stop.wait(_BACKPRESSURE_WAIT):
+                return
+
+    def process(buf, offset: int):
+        conn_id, length, timestamp = _IN_HEADER.unpack_from(buf, offset)
+        start = offset + _IN_HEADER.size
+        data = bytes(buf[start:start + length])
+        state = connections.get(conn_id)
+        if state is None:
+            return
+        encrypter, driver = state
+        if length < 16:
+            return
+        metrics = driver.metrics
+        dirty.add(conn_id)
+        try:
+            decrypted = encrypter.decrypt(data)
+        except Exception:
+            metrics.decrypt_errors += 1
+            emit(conn_id, RECORD_ERROR, timestamp, _ERROR, (ERROR_DECRYPT,))
+            return
+        try:
+            events = driver.handle_state_event(decrypted, timestamp)
+        except Exception:
+            metrics.decode_errors += 1
+            emit(conn_id, RECORD_ERROR, timestamp, _ERROR, (ERROR_DECODE,))
+            return
+        metrics.events += len(events)
+        for event in events:
+            encoded = _encode_event(event)
+            if encoded is not None:
+                kind, body, values = encoded
+                emit(conn_id, kind, timestamp, body, values)
+
+    def send_metrics(idle: bool):
+        now = time.monotonic()
+        for conn_id in list(dirty):
+            if not idle and now - last_sent.get(conn_id, 0.0) < _METRICS_INTERVAL:
+                continue
+            dirty.discard(conn_id)
+            last_sent[conn_id] = now
+            state = connections.get(conn_id)
+            if state is not None:
+                emit(conn_id, RECORD_METRICS, time.time(), _METRICS, state[1].metrics.decoder_values())
+
+    try:
+        while not stop.is_set():
+            while control.poll():
+                command = control.recv()
+                if command[0] == "add":
+                    _, conn_id, encrypter, driver = command
+                    connections[conn_id] = (encrypter, driver)
+                elif command[0] == "remove":
+                    conn_id = command[1]
+                    # 移除之前发布的数据包都已在输入环中，先全部处理，避免遗留的数据包
+                    # 在连接号被重新分配后按新连接解码
+                    while in_ring.consume(process, _WORKER_BATCH):
+                        pass
+                    state = connections.pop(conn_id, None)
+                    dirty.discard(conn_id)
+                    last_sent.pop(conn_id, None)
+                    if state is not None:
+                        # 最终统计，不受回传间隔限制
+                        emit(conn_id, RECORD_METRICS, time.time(), _METRICS, state[1].metrics.decoder_values())
+                    emit(conn_id, RECORD_CLOSED, time.time(), _EMPTY, ())
+                elif command[0] == "stop":
+                    return
+            processed = in_ring.consume(process, _WORKER_BATCH)
+            if dirty:
+                send_metrics(idle=not processed)
+            out_ring.publish()
+            if not processed and in_ring.prepare_wait():
+                # 没有数据：阻塞到主进程发布新的数据包或发送控制命令
+                wait([in_ring.wakeup_fd, control])
+                in_ring.clear_wakeup()
+    finally:
+        in_ring.close()
+        out_ring.close()
+
+
+class FleetDecoder:
+    """多进程解码器，供多个GanCubeConnection共享
+
+    解码结果在事件循环中分发：第一次在运行中的事件循环里调用 start()、register() 或 submit()
+    时，用 loop.add_reader 监听各输出环的唤醒管道，有记录时才被唤醒。
+    """
+
+    def __init__(self, workers: Optional[int] = None, ring_capacity: int = 4096):
+        self.workers = workers or os.cpu_count() or 1
+        self.ring_capacity = ring_capacity
+        self.dropped = 0  # 输入环满而丢弃的数据包
+        self._ctx = multiprocessing.get_context("spawn")
+        self._in_rings: List[SharedRing] = []
+        self._out_rings: List[SharedRing] = []
+        self._controls = []
+        self._processes = []
+        self._stop = None
+        self._connections: Dict[int, Any] = {}
+        self._next_id = 0
+        self._free_ids: Deque[int] = collections.deque()  # 工作进程已确认移除、可以重用的连接号
+        self._closing: Dict[int, Any] = {}  # 已注销、等待工作进程回传最终统计并确认的连接
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> "FleetDecoder":
+        """创建共享内存并启动工作进程"""
+        if not self._processes:
+            self._stop = self._ctx.Event()
+            for _ in range(self.workers):
+                in_ring = SharedRing(IN_SLOT_SIZE, self.ring_capacity, lock=self._ctx.Lock(),
+                                     wakeup=self._ctx.Pipe(duplex=False))
+                out_ring = SharedRing(OUT_SLOT_SIZE, self.ring_capacity, lock=self._ctx.Lock(),
+                                      wakeup=self._ctx.Pipe(duplex=False))
+                control_reader, control_writer = self._ctx.Pipe(duplex=False)
+                process = self._ctx.Process(
+                    target=_worker_main, name="gan-cube-decoder", daemon=True,
+                    args=(in_ring.share(), out_ring.share(), control_reader, self._stop))
+                process.start()
+                self._in_rings.append(in_ring)
+                self._out_rings.append(out_ring)
+                self._controls.append(control_writer)
+                self._processes.append(process)
+        self._attach_loop()
+        return self
+
+    def register(self, connection) -> int:
+        """注册连接，返回连接号；加密器和驱动只在这里发送一次给工作进程"""
+        if not self._processes:
+            raise RuntimeError("FleetDecoder is not started")
+        conn_id = self._allocate_id()
+        self._connections[conn_id] = connection
+        self._controls[conn_id % self.workers].send(("add", conn_id, connection.encrypter, type(connection.driver)()))
+        self._attach_loop()
+        return conn_id
+
+    def _allocate_id(self) -> int:
+        if self._free_ids:
+            return self._free_ids.popleft()
+        if self._next_id >= MAX_CONNECTIONS:
+            raise RuntimeError("Too many FleetDecoder connections")
+        conn_id = self._next_id
+        self._next_id += 1
+        return conn_id
+
+    def unregister(self, conn_id: int):
+        """注销连接
+
+        工作进程先处理完该连接已提交的数据包并回传最终统计，再确认移除（RECORD_CLOSED）；
+        确认之后调用 connection._decoder_closed()，连接号才会被重用。
+        """
+        connection = self._connections.pop(conn_id, None)
+        if connection is None:
+            return
+        if self._processes:
+            self._closing[conn_id] = connection
+            self._controls[conn_id % self.workers].send(("remove", conn_id))
+        else:
+            self._free_ids.append(conn_id)
+            connection._decoder_closed()
+
+    def submit(self, conn_id: int, data: bytes, timestamp: float) -> bool:
+        """把原始数据包交给对应的工作进程，输入环满时丢弃并返回False"""
+        if self._loop is None:
+            self._attach_loop()
+        if len(data) > MAX_PACKET_SIZE:
+            data = data[:MAX_PACKET_SIZE]
+        ring = self._in_rings[conn_id % self.workers]
+        if ring.push(_pack_packet, conn_id, data, timestamp):
+            ring.publish()
+            return True
+        self.dropped += 1
+        return False
+
+    def backlog(self, conn_id: int) -> int:
+        """连接所在工作进程的输入环中尚未处理的数据包数量"""
+        return len(self._in_rings[conn_id % self.workers])
+
+    def poll(self, limit: int = _DRAIN_BATCH) -> int:
+        """取出已解码的记录并分发给对应连接，返回分发的数量（没有事件循环时可手动调用）"""
+        total = 0
+        for ring in self._out_rings:
+            total += ring.consume(self._dispatch, limit)
+        return total
+
+    def _dispatch(self, buf, offset: int):
+        conn_id, event = _decode_record(buf, offset)
+        if event is None:
+            connection = self._closing.pop(conn_id, None)
+            if connection is not None:
+                self._free_ids.append(conn_id)
+                connection._decoder_closed()
+            return
+        connection = self._connections.get(conn_id)
+        if connection is None:
+            # 注销之前提交的数据包解出的事件和最终统计，与直接解码时一样送达
+            connection = self._closing.get(conn_id)
+        if connection is not None:
+            connection._dispatch_event(event)
+
+    def _attach_loop(self):
+        """在当前运行的事件循环上监听输出环（已监听或没有运行中的循环时不做任何事）"""
+        if not self._processes:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if loop is self._loop:
+            return
+        self._detach_loop()
+        self._loop = loop
+        for ring in self._out_rings:
+            loop.add_reader(ring.wakeup_fd, self._drain, ring)
+            # 监听之前可能已有记录
+            loop.call_soon(self._drain, ring)
+
+    def _detach_loop(self):
+        loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
+        for ring in self._out_rings:
+            loop.remove_reader(ring.wakeup_fd)
+
+    def _drain(self, ring: SharedRing):
+        """输出环的唤醒回调：分发一批记录，还有剩余时留到下一轮事件循环"""
+        if ring.buf is None:
+            return
+        ring.clear_wakeup()
+        ring.consume(self._dispatch, _DRAIN_BATCH)
+        if not ring.prepare_wait():
+            self._loop.call_soon(self._drain, ring)
+
+    def close(self):
+        """停止工作进程并释放共享内存"""
+        if not self._processes:
+            return
+        self._detach_loop()
+        self._stop.set()
+        for control in self._controls:
+            try:
+                control.send(("stop",))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        # 分发工作进程停止前写出的记录（包括已注销连接的最终统计和确认）
+        while self.poll():
+            pass
+        for connection in self._closing.values():
+            connection._decoder_closed()
+        for control in self._controls:
+            control.close()
+        for ring in self._in_rings + self._out_rings:
+            ring.close()
+        self._in_rings, self._out_rings, self._controls = [], [], []
+        # 工作进程已停止，所有连接号都可以重新分配
+        self._connections.clear()
+        self._closing.clear()
+        self._free_ids.clear()
+        self._next_id = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,253 @@
+"""每个连接的数据包质量统计
+
+Gen2的MOVE数据包带8位序列号，一个包最多携带最近7步转动。驱动按序列号差值补齐中间的转动，
+差值超过7时更早的转动已经无法恢复。ConnectionMetrics记录序列号间隔的分布、
+因此丢失的转动数、解密/解析失败以及超出范围的字段，用来衡量蓝牙信号质量：
+
+    snapshot = cube.metrics_snapshot()
+    snapshot["lost_moves"], snapshot["serial_gaps"]
+
+可选地定期写出Prometheus文本格式（可由node_exporter的textfile collector采集）：
+
+    GAN_CUBE_METRICS_FILE      输出路径，例如 /var/lib/node_exporter/gan_cube.prom
+    GAN_CUBE_METRICS_INTERVAL  写出间隔，单位秒（默认10）
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 一个MOVE数据包能携带的最大转动数，超过这个间隔的转动会丢失
+MAX_SERIAL_GAP = 7
+# 序列号间隔直方图的上界，更大的间隔计入 +Inf
+GAP_BUCKETS = tuple(range(1, MAX_SERIAL_GAP + 1))
+
+# 在解码端（连接本身或fleet工作进程）统计的计数器，fleet模式下由工作进程定期回传
+DECODER_COUNTERS = (
+    "events",
+    "decrypt_errors",
+    "decode_errors",
+    "invalid_face",
+    "invalid_direction",
+    "invalid_state",
+    "invalid_battery",
+    "duplicate_serials",
+    "truncated_bursts",
+    "lost_moves",
+    "gap_sum",
+)
+# 只在主进程统计的计数器
+CONNECTION_COUNTERS = ("packets", "short_packets", "dropped_packets")
+# decoder_values() 的长度：解码端计数器 + 每个直方图桶 + +Inf桶
+DECODER_VALUE_COUNT = len(DECODER_COUNTERS) + len(GAP_BUCKETS) + 1
+
+_U32_MASK = 0xFFFFFFFF
+
+
+class ConnectionMetrics:
+    """单个连接的计数器和序列号间隔直方图"""
+
+    def __init__(self):
+        for name in CONNECTION_COUNTERS + DECODER_COUNTERS:
+            setattr(self, name, 0)
+        # gap_counts[i] 为间隔 GAP_BUCKETS[i] 的次数，最后一项为超过 MAX_SERIAL_GAP 的次数
+        self.gap_counts: List[int] = [0] * (len(GAP_BUCKETS) + 1)
+
+    def record_serial_gap(self, gap: int):
+        """记录相邻两个MOVE数据包的序列号差值（已对256取模）"""
+        if gap == 0:
+            # 重复的数据包，没有新的转动
+            self.duplicate_serials += 1
+            return
+        self.gap_sum += gap
+        if gap > MAX_SERIAL_GAP:
+            self.gap_counts[-1] += 1
+            self.truncated_bursts += 1
+            self.lost_moves += gap - MAX_SERIAL_GAP
+        else:
+            self.gap_counts[gap - 1] += 1
+
+    @property
+    def move_packets(self) -> int:
+        """参与间隔统计的MOVE数据包数量"""
+        return sum(self.gap_counts)
+
+    @property
+    def invalid_fields(self) -> int:
+        return self.invalid_face + self.invalid_direction + self.invalid_state + self.invalid_battery
+
+    def decoder_values(self) -> Tuple[int, ...]:
+        """解码端计数器的定长元组（每项截断为32位），用于从工作进程回传"""
+        values = [getattr(self, name) for name in DECODER_COUNTERS] + self.gap_counts
+        return tuple(value & _U32_MASK for value in values)
+
+    def load_decoder_values(self, values):
+        """用工作进程回传的 decoder_values() 覆盖解码端计数器"""
+        count = len(DECODER_COUNTERS)
+        for name, value in zip(DECODER_COUNTERS, values[:count]):
+            setattr(self, name, value)
+        self.gap_counts = list(values[count:])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前统计的字典副本"""
+        result: Dict[str, Any] = {name: getattr(self, name) for name in CONNECTION_COUNTERS + DECODER_COUNTERS}
+        result["invalid_fields"] = self.invalid_fields
+        result["serial_gaps"] = {str(bound): count for bound, count in zip(GAP_BUCKETS, self.gap_counts)}
+        result["serial_gaps"][f">{MAX_SERIAL_GAP}"] = self.gap_counts[-1]
+        result["move_packets"] = self.move_packets
+        # gap_sum 是序列号推进的总步数，即魔方实际发出的转动数
+        result["move_loss_ratio"] = self.lost_moves / self.gap_sum if self.gap_sum else 0.0
+        return result
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# (指标名, 说明, 属性名, 附加标签)
+_COUNTER_METRICS = (
+    ("gan_cube_packets_total", "Notifications received from the cube", "packets", ""),
+    ("gan_cube_short_packets_total", "Notifications shorter than one encrypted block", "short_packets", ""),
+    ("gan_cube_dropped_packets_total", "Packets dropped because the decoder queue was full", "dropped_packets", ""),
+    ("gan_cube_events_total", "Events decoded from notifications", "events", ""),
+    ("gan_cube_decrypt_errors_total", "Packets that failed to decrypt", "decrypt_errors", ""),
+    ("gan_cube_decode_errors_total", "Packets that failed to decode", "decode_errors", ""),
+    ("gan_cube_invalid_fields_total", "Out-of-range fields in decoded packets", "invalid_face", "field=\"face\""),
+    ("gan_cube_invalid_fields_total", "", "invalid_direction", "field=\"direction\""),
+    ("gan_cube_invalid_fields_total", "", "invalid_state", "field=\"state\""),
+    ("gan_cube_invalid_fields_total", "", "invalid_battery", "field=\"battery\""),
+    ("gan_cube_duplicate_serials_total", "Move packets repeating the previous serial", "duplicate_serials", ""),
+    ("gan_cube_truncated_bursts_total", "Serial gaps larger than one packet can carry", "truncated_bursts", ""),
+    ("gan_cube_lost_moves_total", "Moves that could not be recovered from serial gaps", "lost_moves", ""),
+)
+
+
+def format_prometheus(connections: Dict[str, ConnectionMetrics]) -> str:
+    """把各连接的统计格式化为Prometheus文本格式，键为魔方名称（cube标签）"""
+    lines = []
+    described = set()
+    for metric, help_text, attribute, extra in _COUNTER_METRICS:
+        if metric not in described:
+            described.add(metric)
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+        for name, metrics in connections.items():
+            labels = f"cube=\"{_label(name)}\"" + (f",{extra}" if extra else "")
+            lines.append(f"{metric}{{{labels}}} {getattr(metrics, attribute)}")
+
+    lines.append("# HELP gan_cube_serial_gap Serial number difference between consecutive move packets")
+    lines.append("# TYPE gan_cube_serial_gap histogram")
+    for name, metrics in connections.items():
+        cube = f"cube=\"{_label(name)}\""
+        cumulative = 0
+        for bound, count in zip(GAP_BUCKETS, metrics.gap_counts):
+            cumulative += count
+            lines.append(f"gan_cube_serial_gap_bucket{{{cube},le=\"{bound}\"}} {cumulative}")
+        total = cumulative + metrics.gap_counts[-1]
+        lines.append(f"gan_cube_serial_gap_bucket{{{cube},le=\"+Inf\"}} {total}")
+        lines.append(f"gan_cube_serial_gap_sum{{{cube}}} {metrics.gap_sum}")
+        lines.append(f"gan_cube_serial_gap_count{{{cube}}} {total}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsFileWriter:
+    """定期把连接统计写成Prometheus文本文件
+
+    先写临时文件再原子替换，采集端不会读到写了一半的文件。
+    移除的连接（包括 track() 登记、已经关闭的连接）的最终值还会写出一次，之后不再出现。
+    """
+
+    def __init__(self, path: str, interval: float = 10.0):
+        self.path = path
+        self.interval = interval
+        self._connections: Dict[str, ConnectionMetrics] = {}
+        self._retired: Dict[str, ConnectionMetrics] = {}  # 已移除、还要写出一次最终值的连接
+        self._tracking: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["MetricsFileWriter"]:
+        """根据环境变量创建，未设置 GAN_CUBE_METRICS_FILE 时返回None"""
+        path = os.environ.get("GAN_CUBE_METRICS_FILE", "").strip()
+        if not path:
+            return None
+        return cls(path, interval=float(os.environ.get("GAN_CUBE_METRICS_INTERVAL", "10")))
+
+    def add(self, name: str, metrics: ConnectionMetrics):
+        """登记一个连接的统计，name作为cube标签"""
+        self._connections[name] = metrics
+
+    def remove(self, name: str):
+        """移除一个连接的统计，它的最终值还会出现在下一次写出中"""
+        metrics = self._connections.pop(name, None)
+        if metrics is not None:
+            self._retired[name] = metrics
+
+    def track(self, connection, name: Optional[str] = None):
+        """登记一个GanCubeConnection，连接关闭并回传最终统计后自动移除（需要运行中的事件循环）"""
+        name = name or connection.device_name
+        self.add(name, connection.metrics)
+        task = asyncio.get_running_loop().create_task(self._remove_when_closed(name, connection))
+        self._tracking.add(task)
+        task.add_done_callback(self._tracking.discard)
+
+    async def _remove_when_closed(self, name: str, connection):
+        await connection.wait_closed()
+        # 同名的新连接已经替换了这一项时不移除
+        if self._connections.get(name) is connection.metrics:
+            self.remove(name)
+
+    def write(self):
+        """立即写出一次"""
+        text = format_prometheus({**self._retired, **self._connections})
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".gan_cube_metrics.", dir=directory)
+        try:
+            # mkstemp创建的文件只有属主可读，采集端（如node_exporter）通常以其他用户运行
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+            self._retired.clear()
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def start(self) -> "MetricsFileWriter":
+        """在当前事件循环中启动定期写出"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning("Failed to write metrics file: %s", e)
+
+    async def aclose(self, timeout: float = 2.0):
+        """断开连接之后调用：等待 track() 登记的连接回传最终统计（最多timeout秒），再调用close()"""
+        if self._tracking:
+            await asyncio.wait(set(self._tracking), timeout=timeout)
+        self.close()
+
+    def close(self):
+        """停止定期写出，并写出最终的统计"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._tracking:
+            task.cancel()
+        try:
+            self.write()
+        except OSError as e:
+            logger.warning("Failed to write metrics file: %s", e)
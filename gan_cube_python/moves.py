@@ -0,0 +1,215 @@
+"""紧凑的转动序列
+
+每个转动用一个uint8编码：code = face * 3 + (amount - 1)，
+face按 URFDLB 顺序编号，amount为顺时针四分之一圈数（1: 90度, 2: 180度, 3: -90度）。
+编号与 cube.MOVE_NAMES 一致，可以直接索引转动表。
+
+    seq = MoveSequence.parse("R U R' U'")
+    seq.inverse()              # U R U' R'
+    MoveSequence.parse("R R U U'").simplify()   # R2
+    MoveSequence.parse("R2 U").expand()          # R R U
+"""
+
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Union
+
+FACES = "URFDLB"
+_SUFFIXES = ("", "2", "'")
+
+MOVE_NAMES = [face + suffix for face in FACES for suffix in _SUFFIXES]
+MOVE_CODES = {name: code for code, name in enumerate(MOVE_NAMES)}
+# 兼容 R2' 写法
+MOVE_CODES.update({face + "2'": MOVE_CODES[face + "2"] for face in FACES})
+
+_OPPOSITE = [3, 4, 5, 0, 1, 2]  # U-D, R-L, F-B
+
+
+def move_code(name: str) -> int:
+    """转动符号 -> 编码"""
+    try:
+        return MOVE_CODES[name]
+    except KeyError:
+        raise ValueError(f"Invalid move: {name}") from None
+
+
+def make_code(face: int, amount: int) -> Optional[int]:
+    """面和四分之一圈数 -> 编码，amount模4为0时返回None（转动抵消）"""
+    amount &= 3
+    return face * 3 + amount - 1 if amount else None
+
+
+def code_face(code: int) -> int:
+    return code // 3
+
+
+def code_amount(code: int) -> int:
+    return code % 3 + 1
+
+
+def _invert_code(code: int) -> int:
+    return code - code % 3 + 2 - code % 3
+
+
+def _push(stack: bytearray, code: int):
+    """把转动压入已化简的序列，与相同面（可隔一个对面转动）合并"""
+    face = code // 3
+    index = len(stack) - 1
+    if index >= 0 and stack[index] // 3 != face:
+        # 对面的转动可交换，R L R' 中的两个R可以合并
+        if stack[index] // 3 == _OPPOSITE[face] and index >= 1 and stack[index - 1] // 3 == face:
+            index -= 1
+        else:
+            index = -1
+    if index < 0:
+        stack.append(code)
+        return
+    merged = make_code(face, code_amount(stack[index]) + code_amount(code))
+    if merged is None:
+        del stack[index]
+    else:
+        stack[index] = merged
+
+
+class MoveSequence:
+    """不可变的转动序列，内部是一个bytes，可哈希、可比较
+
+    parse() 和 expand() 返回缓存中共享的对象，所以编码只通过只读属性暴露。
+    """
+
+    __slots__ = ("_codes",)
+
+    def __init__(self, codes: Union[bytes, bytearray, Iterable[int]] = b""):
+        self._codes = bytes(codes)
+
+    @property
+    def codes(self) -> bytes:
+        return self._codes
+
+    @staticmethod
+    def parse(text: str) -> "MoveSequence":
+        """解析转动公式，相同的公式返回同一个（缓存的）对象"""
+        return _parse_cached(text.strip())
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> "MoveSequence":
+        return cls(move_code(name) for name in names)
+
+    def names(self) -> List[str]:
+        return [MOVE_NAMES[code] for code in self.codes]
+
+    def __str__(self) -> str:
+        return " ".join(MOVE_NAMES[code] for code in self.codes)
+
+    def __repr__(self) -> str:
+        return f"MoveSequence({str(self)!r})"
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return MoveSequence(self.codes[index])
+        return self.codes[index]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, MoveSequence):
+            return NotImplemented
+        return self._codes == other._codes
+
+    def __hash__(self) -> int:
+        return hash(self.codes)
+
+    def __add__(self, other: "MoveSequence") -> "MoveSequence":
+        return MoveSequence(self.codes + other.codes)
+
+    def inverse(self) -> "MoveSequence":
+        """逆序列：倒序并反转每个转动的方向"""
+        return MoveSequence(_invert_code(code) for code in reversed(self.codes))
+
+    def simplify(self) -> "MoveSequence":
+        """合并相邻的同面转动（R R -> R2，R R' -> 空，R L R' -> L）"""
+        stack = bytearray()
+        for code in self.codes:
+            _push(stack, code)
+        return MoveSequence(stack)
+
+    def expand(self) -> "MoveSequence":
+        """把180度转动拆成两个90度转动（R2 -> R R），便于与魔方上报的单步转动逐个比较"""
+        return _expand_cached(self.codes)
+
+    def quarter_turns(self) -> int:
+        """按四分之一圈计数的步数（QTM）"""
+        return sum(2 if code % 3 == 1 else 1 for code in self.codes)
+
+
+@lru_cache(maxsize=1024)
+def _parse_cached(text: str) -> MoveSequence:
+    return MoveSequence(move_code(token) for token in text.split())
+
+
+@lru_cache(maxsize=1024)
+def _expand_cached(codes: bytes) -> MoveSequence:
+    expanded = bytearray()
+    for code in codes:
+        if code % 3 == 1:
+            quarter = code - 1
+            expanded.append(quarter)
+            expanded.append(quarter)
+        else:
+            expanded.append(code)
+    return MoveSequence(expanded)
+
+
+
+
+class PrefixMatch(NamedTuple):
+    """前缀匹配结果"""
+    position: int  # 已完成的目标转动数
+    total: int
+    on_path: bool  # 当前是否没有偏离目标序列
+    complete: bool
+
+
+class MovePrefixMatcher:
+    """把魔方上报的单步转动与目标序列逐个匹配
+
+    目标中的180度转动可以用两个同方向的90度转动完成（R2 = R R = R' R'）；
+    偏离目标的转动会被记录并化简，撤销之后（例如 U 再 U'）自动回到原来的位置。
+    """
+
+    def __init__(self, target: Union[str, MoveSequence]):
+        self.target = MoveSequence.parse(target) if isinstance(target, str) else target
+        self.reset()
+
+    def reset(self):
+        self.position = 0
+        self._partial = 0  # 当前目标转动已完成的四分之一圈数
+        self._deviation = bytearray()  # 偏离目标后的转动（已化简）
+
+    @property
+    def complete(self) -> bool:
+        return self.position == len(self.target) and not self._partial and not self._deviation
+
+    def feed(self, move: Union[int, str]) -> PrefixMatch:
+        """输入一个转动（编码或符号）"""
+        code = move if isinstance(move, int) else move_code(move)
+        codes = self.target.codes
+        face = codes[self.position] // 3 if self.position < len(codes) else -1
+        if self._deviation or code // 3 != face:
+            if not self._deviation and self._partial:
+                # 目标转动做了一半后转了别的面：把已做的部分当作偏离
+                self._deviation.append(make_code(face, self._partial))
+                self._partial = 0
+            _push(self._deviation, code)
+            if len(self._deviation) == 1 and self._deviation[0] // 3 == face:
+                # 偏离已撤销，只剩当前目标面上做了一部分的转动
+                self._partial = code_amount(self._deviation.pop())
+        else:
+            self._partial = (self._partial + code_amount(code)) & 3
+        if not self._deviation and self._partial and self._partial == code_amount(codes[self.position]):
+            self.position += 1
+            self._partial = 0
+        return PrefixMatch(self.position, len(codes), not self._deviation, self.complete)
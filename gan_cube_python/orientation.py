@@ -0,0 +1,250 @@
+"""整体转动跟踪：根据陀螺仪四元数判断魔方的朝向
+
+魔方上报的四元数描述机身相对于参考系的旋转。以调用calibrate()（或第一次收到数据）
+时的姿态为初始朝向，每个样本与24种整体朝向中最接近的一个比较；偏离当前朝向足够远、
+且新朝向稳定若干个样本后才切换（滞回），只在切换时产生离散的朝向变化事件。
+
+机身坐标轴与面的对应沿用gan-web-bluetooth示例的约定：+x 指向R，+y 指向B，+z 指向U。
+整体转动记号 x/y/z 分别与 R/U/F 同向。
+
+    tracker = OrientationTracker()
+    change = tracker.update(gyro_data, timestamp)   # GYRO事件的data
+    if change:
+        print(change.rotation, change.up, change.front)
+    tracker.remap_move("R")   # 按当前朝向把机身上的转动改写为观察者视角下的转动
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .moves import FACES, make_code, code_amount, move_code, MOVE_NAMES
+
+Quaternion = Tuple[float, float, float, float]  # (w, x, y, z)
+
+# 各面的外法线方向（机身坐标系）
+_FACE_AXES = {
+    "U": (0, 0, 1), "R": (1, 0, 0), "F": (0, -1, 0),
+    "D": (0, 0, -1), "L": (-1, 0, 0), "B": (0, 1, 0),
+}
+_AXIS_FACES = {axis: face for face, axis in _FACE_AXES.items()}
+
+
+def _q_mul(a: Quaternion, b: Quaternion) -> Quaternion:
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw)
+
+
+def _q_conj(q: Quaternion) -> Quaternion:
+    return (q[0], -q[1], -q[2], -q[3])
+
+
+def _q_normalize(q: Quaternion) -> Quaternion:
+    n = math.sqrt(q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3])
+    if n == 0.0:
+        return (1.0, 0.0, 0.0, 0.0)
+    return (q[0] / n, q[1] / n, q[2] / n, q[3] / n)
+
+
+def _q_rotate(q: Quaternion, v: Sequence[float]) -> Tuple[float, float, float]:
+    w, x, y, z = _q_mul(_q_mul(q, (0.0, v[0], v[1], v[2])), _q_conj(q))
+    return (x, y, z)
+
+
+def _axis_rotation(axis: Sequence[int], quarter_turns: int) -> Quaternion:
+    """绕面法线顺时针（从该面外侧看）转 quarter_turns 个90度"""
+    half = -quarter_turns * math.pi / 4
+    s = math.sin(half)
+    return _q_normalize((math.cos(half), axis[0] * s, axis[1] * s, axis[2] * s))
+
+
+@dataclass(frozen=True)
+class Orientation:
+    """24种整体朝向之一"""
+    index: int
+    name: str  # 从初始朝向到达该朝向的最短整体转动，如 "x y'"，初始朝向为 ""
+    quaternion: Quaternion
+    face_map: Tuple[int, ...]  # 机身上的面 -> 观察者视角下的面（按URFDLB编号）
+
+    @property
+    def up(self) -> str:
+        """当前朝上的机身面"""
+        return FACES[self.face_map.index(0)]
+
+    @property
+    def front(self) -> str:
+        """当前朝前的机身面"""
+        return FACES[self.face_map.index(2)]
+
+
+def _snap(v: Sequence[float]) -> Tuple[int, int, int]:
+    return tuple(int(round(c)) for c in v)
+
+
+def _build_orientations() -> List[Orientation]:
+    """从初始朝向出发按 x/y/z 整体转动做广度优先搜索，得到24种朝向及其最短记号"""
+    generators = []
+    for letter, face in (("x", "R"), ("y", "U"), ("z", "F")):
+        for turns, suffix in ((1, ""), (2, "2"), (3, "'")):
+            generators.append((letter + suffix, _axis_rotation(_FACE_AXES[face], turns)))
+
+    found: Dict[Tuple[Tuple[int, int, int], ...], Tuple[str, Quaternion]] = {}
+    frontier = [("", (1.0, 0.0, 0.0, 0.0))]
+    while frontier:
+        next_frontier = []
+        for name, q in frontier:
+            key = tuple(_snap(_q_rotate(q, _FACE_AXES[face])) for face in FACES)
+            if key in found:
+                continue
+            found[key] = (name, q)
+            for gen_name, gen in generators:
+                # 整体转动作用在观察者坐标系中，左乘
+                next_frontier.append(((name + " " + gen_name).strip(), _q_mul(gen, q)))
+        frontier = next_frontier
+
+    orientations = []
+    for index, (key, (name, q)) in enumerate(found.items()):
+        face_map = tuple(FACES.index(_AXIS_FACES[axis]) for axis in key)
+        orientations.append(Orientation(index, name, _q_normalize(q), face_map))
+    return orientations
+
+
+ORIENTATIONS: List[Orientation] = _build_orientations()
+IDENTITY = ORIENTATIONS[0]
+_ROTATION_NAMES: Dict[Tuple[int, ...], str] = {o.face_map: o.name for o in ORIENTATIONS}
+
+
+@dataclass
+class OrientationChange:
+    """朝向变化事件"""
+    timestamp: float
+    rotation: str  # 从上一个朝向到新朝向的整体转动，如 "y'"
+    orientation: Orientation
+
+    @property
+    def up(self) -> str:
+        return self.orientation.up
+
+    @property
+    def front(self) -> str:
+        return self.orientation.front
+
+
+class OrientationTracker:
+    """跟踪整体朝向并在离散的朝向变化时产生事件
+
+    enter_angle: 与候选朝向的夹角小于该值（度）才可能切换；候选朝向之间至少相差90度，
+                 所以在 enter_angle 与 90 - enter_angle 之间的区域保持原朝向不变
+    settle_samples: 新朝向需要连续出现的样本数
+    smoothing: 0表示不平滑，越接近1对抖动越不敏感（归一化线性插值）
+    """
+
+    def __init__(self, enter_angle: float = 30.0, settle_samples: int = 3, smoothing: float = 0.0):
+        self._enter_cos = math.cos(math.radians(enter_angle) / 2)
+        self.settle_samples = settle_samples
+        self.smoothing = smoothing
+        self.orientation = IDENTITY
+        self._home_inv: Optional[Quaternion] = None
+        self._filtered: Optional[Quaternion] = None
+        self._candidate: Optional[Orientation] = None
+        self._candidate_count = 0
+
+    def calibrate(self, quaternion: Optional[Quaternion] = None):
+        """把当前（或指定的）姿态设为初始朝向；不传参数时使用下一个样本"""
+        self._home_inv = _q_conj(_q_normalize(quaternion)) if quaternion is not None else None
+        self._filtered = None
+        self.orientation = IDENTITY
+        self._candidate = None
+        self._candidate_count = 0
+
+    def update(self, gyro_data: dict, timestamp: float = 0.0) -> Optional[OrientationChange]:
+        """处理一个GYRO事件的数据，朝向变化时返回事件"""
+        q = gyro_data["quaternion"]
+        return self.update_quaternion((q["w"], q["x"], q["y"], q["z"]), timestamp)
+
+    def update_many(self, samples: Iterable[Tuple[float, Quaternion]]) -> List[OrientationChange]:
+        """批量处理 (时间戳, 四元数) 样本，返回其中的朝向变化事件"""
+        changes = []
+        update = self.update_quaternion
+        for timestamp, q in samples:
+            change = update(q, timestamp)
+            if change is not None:
+                changes.append(change)
+        return changes
+
+    def update_quaternion(self, q: Quaternion, timestamp: float = 0.0) -> Optional[OrientationChange]:
+        w, x, y, z = q
+        n = w * w + x * x + y * y + z * z
+        if n == 0.0:
+            return None
+        n = 1.0 / math.sqrt(n)
+        w, x, y, z = w * n, x * n, y * n, z * n
+        if self._home_inv is None:
+            self._home_inv = (w, -x, -y, -z)
+
+        # 相对初始朝向的旋转
+        hw, hx, hy, hz = self._home_inv
+        rw = hw * w - hx * x - hy * y - hz * z
+        rx = hw * x + hx * w + hy * z - hz * y
+        ry = hw * y - hx * z + hy * w + hz * x
+        rz = hw * z + hx * y - hy * x + hz * w
+
+        if self.smoothing and self._filtered is not None:
+            fw, fx, fy, fz = self._filtered
+            if fw * rw + fx * rx + fy * ry + fz * rz < 0:
+                rw, rx, ry, rz = -rw, -rx, -ry, -rz
+            a = self.smoothing
+            rw, rx, ry, rz = _q_normalize((fw * a + rw * (1 - a), fx * a + rx * (1 - a),
+                                           fy * a + ry * (1 - a), fz * a + rz * (1 - a)))
+        self._filtered = (rw, rx, ry, rz)
+
+        # 常见情况：仍然接近当前朝向，只需一次点积
+        cw, cx, cy, cz = self.orientation.quaternion
+        if abs(cw * rw + cx * rx + cy * ry + cz * rz) >= self._enter_cos:
+            self._candidate = None
+            self._candidate_count = 0
+            return None
+
+        best, best_dot = None, self._enter_cos
+        for orientation in ORIENTATIONS:
+            ow, ox, oy, oz = orientation.quaternion
+            dot = abs(ow * rw + ox * rx + oy * ry + oz * rz)
+            if dot >= best_dot:
+                best, best_dot = orientation, dot
+        if best is None:
+            # 处于两个朝向之间（正在转动），保持原朝向
+            self._candidate = None
+            self._candidate_count = 0
+            return None
+        if best is not self._candidate:
+            self._candidate, self._candidate_count = best, 0
+        self._candidate_count += 1
+        if self._candidate_count < self.settle_samples:
+            return None
+
+        previous, self.orientation = self.orientation, best
+        self._candidate = None
+        self._candidate_count = 0
+        return OrientationChange(timestamp, rotation_between(previous, best), best)
+
+    def remap_move(self, move: str) -> str:
+        """把机身上的转动改写为观察者视角（求解器坐标系）下的转动"""
+        code = move_code(move)
+        return MOVE_NAMES[make_code(self.orientation.face_map[code // 3], code_amount(code))]
+
+    def remap_face(self, face: int) -> int:
+        return self.orientation.face_map[face]
+
+
+def rotation_between(a: Orientation, b: Orientation) -> str:
+    """从朝向a到朝向b的最短整体转动记号"""
+    # 相对转动的面映射：观察者视角下a的每个面转到b中的位置
+    inverse_a = [0] * 6
+    for body, world in enumerate(a.face_map):
+        inverse_a[world] = body
+    delta = tuple(b.face_map[inverse_a[world]] for world in range(6))
+    return _ROTATION_NAMES[delta]
@@ -0,0 +1,113 @@
+"""输出层：事件行的批量写出和诊断日志
+
+- BufferedLineWriter 把同一轮事件循环中产生的事件行合并成一次写入和一次flush，
+  避免快速转动时每个print都触发一次系统调用。
+- RateLimitFilter 对同一条日志模板做令牌桶限流，一串损坏的数据包不会刷满管道。
+- setup_logging 配置本库的日志器（默认输出到stderr，stdout只留给事件行）。
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, TextIO, Tuple
+
+LOGGER_NAME = "gan_cube_python"
+
+
+class BufferedLineWriter:
+    """按事件循环迭代批量写出的行缓冲
+
+    在事件循环中调用write_line时只追加到缓冲区，并安排在下一轮迭代（或max_delay秒后）
+    统一写出；缓冲超过max_lines行时立即写出。没有运行中的事件循环时直接写出。
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, max_delay: float = 0.0, max_lines: int = 256):
+        self.stream = stream or sys.stdout
+        self.max_delay = max_delay
+        self.max_lines = max_lines
+        self._lines: List[str] = []
+        self._scheduled = False
+        self.flush_count = 0  # 实际写出的次数，便于评估合并效果
+
+    def write_line(self, line: str):
+        """追加一行（不含换行符）"""
+        self._lines.append(line)
+        if len(self._lines) >= self.max_lines:
+            self.flush()
+            return
+        if self._scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._scheduled = True
+        if self.max_delay > 0:
+            loop.call_later(self.max_delay, self.flush)
+        else:
+            loop.call_soon(self.flush)
+
+    def flush(self):
+        """写出缓冲区中的所有行"""
+        self._scheduled = False
+        if not self._lines:
+            return
+        data = "\n".join(self._lines) + "\n"
+        self._lines.clear()
+        self.stream.write(data)
+        self.stream.flush()
+        self.flush_count += 1
+
+    def close(self):
+        self.flush()
+
+
+class RateLimitFilter(logging.Filter):
+    """按 (日志器, 消息模板) 限流的令牌桶过滤器
+
+    每个模板每秒最多放行rate条，允许burst条突发；被丢弃的条数会附加在
+    下一条放行的同类消息后面。
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 5):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, str], List[float]] = {}  # key -> [tokens, last_time, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.msg = f"{record.msg} [{bucket[2]} similar messages suppressed]"
+            bucket[2] = 0
+        return True
+
+
+def setup_logging(level: Optional[str] = None, stream: Optional[TextIO] = None,
+                  rate: float = 1.0, burst: int = 5) -> logging.Logger:
+    """配置本库的日志器，级别默认取环境变量GAN_CUBE_LOG_LEVEL（默认INFO）"""
+    logger = logging.getLogger(LOGGER_NAME)
+    level = (level or os.environ.get("GAN_CUBE_LOG_LEVEL") or "INFO").upper()
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(RateLimitFilter(rate, burst))
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,150 @@
+"""可选的性能分析钩子
+
+默认不启用，通过环境变量打开，可以直接套在真实的连接会话上：
+
+    GAN_CUBE_PROFILE=cprofile  使用cProfile，输出.pstats文件
+    GAN_CUBE_PROFILE=sample    采样分析，输出折叠栈（可用flamegraph.pl / speedscope查看）
+    GAN_CUBE_PROFILE_OUTPUT    输出路径（默认 gan_cube_profile.pstats / .folded）
+    GAN_CUBE_PROFILE_INTERVAL  采样间隔，单位秒（默认0.005）
+    GAN_CUBE_RECORD            录制原始数据包到文件，供 benchmarks 回放
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileSession:
+    """cProfile或采样分析会话"""
+
+    MODES = ("cprofile", "sample")
+
+    def __init__(self, mode: str = "cprofile", output: Optional[str] = None, interval: float = 0.005):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.output = output or ("gan_cube_profile.pstats" if mode == "cprofile" else "gan_cube_profile.folded")
+        self.interval = interval
+        self._profiler = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._stacks = collections.Counter()
+        self._target_thread_id = None
+
+    @classmethod
+    def from_env(cls) -> Optional["ProfileSession"]:
+        """根据环境变量创建会话，未启用时返回None"""
+        mode = os.environ.get("GAN_CUBE_PROFILE", "").strip().lower()
+        if not mode:
+            return None
+        return cls(
+            mode=mode,
+            output=os.environ.get("GAN_CUBE_PROFILE_OUTPUT") or None,
+            interval=float(os.environ.get("GAN_CUBE_PROFILE_INTERVAL", "0.005")),
+        )
+
+    def start(self):
+        """开始分析（采样模式下分析调用start的线程）"""
+        if self.mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._target_thread_id = threading.get_ident()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="gan-cube-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止分析并写出结果"""
+        if self.mode == "cprofile":
+            if self._profiler is None:
+                return
+            self._profiler.disable()
+            self._profiler.dump_stats(self.output)
+            self._profiler = None
+        else:
+            if self._thread is None:
+                return
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            with open(self.output, "w", encoding="utf-8") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        logger.info("Profile written to %s", self.output)
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(parts))] += 1
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class PacketRecorder:
+    """把原始（加密）数据包写入文件，每行 "<时间戳> <十六进制>"
+
+    每 flush_packets 个数据包或最早的未写出数据包超过 flush_interval 秒时写出一次，
+    进程崩溃时最多丢失这一段数据。在事件循环中调用时由定时回调按时写出，
+    数据流停下来后缓冲区里的数据包也不会一直留在内存中。
+    """
+
+    def __init__(self, path: str, flush_packets: int = 64, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_packets = flush_packets
+        self.flush_interval = flush_interval
+        self._file = open(path, "a", encoding="utf-8")
+        self._pending = 0
+        self._flush_handle = None
+
+    @classmethod
+    def from_env(cls) -> Optional["PacketRecorder"]:
+        path = os.environ.get("GAN_CUBE_RECORD", "").strip()
+        return cls(path) if path else None
+
+    def __call__(self, data: bytes, timestamp: float):
+        self._file.write(f"{timestamp:.6f} {data.hex()}\n")
+        self._pending += 1
+        if self._pending >= self.flush_packets:
+            self.flush()
+        elif self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # 不在事件循环中：没有定时回调，只按数据包数量写出
+                return
+            self._flush_handle = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        """把缓冲的数据包写入文件"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending and not self._file.closed:
+            self._file.flush()
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
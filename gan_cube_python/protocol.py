@@ -1,10 +1,14 @@
 """GAN魔方协议解析器"""
 
+import logging
 import struct
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 from .definitions import FACE_NAMES, DIRECTION_NAMES
+from .metrics import MAX_SERIAL_GAP, ConnectionMetrics
+
+logger = logging.getLogger(__name__)
 
 class EventType(Enum):
     """事件类型"""
@@ -41,6 +45,9 @@ class GanCubeEvent:
     timestamp: float
     data: Any
 
+_CORNER_IDS = list(range(8))
+_EDGE_IDS = list(range(12))
+
 class GanProtocolMessageView:
     """协议消息视图，用于从二进制数据中提取位字段"""
     
@@ -54,7 +61,7 @@ class GanProtocolMessageView:
         """获取指定位长度的值"""
         # 检查边界
         if start_bit < 0 or start_bit + bit_length > len(self.bits):
-            print(f"Warning: Bit access out of bounds: start_bit={start_bit}, bit_length={bit_length}, total_bits={len(self.bits)}")
+            logger.warning("Bit access out of bounds: start_bit=%d, bit_length=%d, total_bits=%d", start_bit, bit_length, len(self.bits))
             return 0
         
         if bit_length <= 8:
@@ -63,12 +70,11 @@ class GanProtocolMessageView:
             buf = bytearray(bit_length // 8)
             for i in range(len(buf)):
                 buf[i] = int(self.bits[8 * i + start_bit:8 * i + start_bit + 8], 2)
-            if little_endian:
-                buf.reverse()
+            # 与TypeScript的DataView一致：默认大端，little_endian=True时按小端读取
             if bit_length == 16:
-                return struct.unpack('<H', buf)[0]
+                return struct.unpack('<H' if little_endian else '>H', buf)[0]
             else:
-                return struct.unpack('<I', buf)[0]
+                return struct.unpack('<I' if little_endian else '>I', buf)[0]
         else:
             raise ValueError('不支持的位长度')
 
@@ -79,6 +85,7 @@ class GanGen2ProtocolDriver:
         self.last_serial = -1
         self.last_move_timestamp = 0
         self.cube_timestamp = 0
+        self.metrics = ConnectionMetrics()
     
     def create_command_message(self, command_type: str) -> Optional[bytes]:
         """创建命令消息"""
@@ -139,14 +146,20 @@ class GanGen2ProtocolDriver:
             # print("DEBUG: Processing MOVE event")
             # print(f"DEBUG: last_serial = {self.last_serial}")
             # 如果没有初始化过serial，先初始化
-            if self.last_serial == -1:
+            initializing = self.last_serial == -1
+            if initializing:
                 serial = msg.get_bit_word(4, 8)
                 self.last_serial = serial
                 # print(f"DEBUG: Initializing last_serial to {serial}")
             
             if self.last_serial != -1:
                 serial = msg.get_bit_word(4, 8)
-                diff = min((serial - self.last_serial) & 0xFF, 7)
+                gap = (serial - self.last_serial) & 0xFF
+                # 一个数据包最多携带7步转动，更大的间隔中较早的转动已经丢失，计入统计；
+                # 用于初始化序列号的第一个数据包没有可比较的前一个序列号，不计入
+                if not initializing:
+                    self.metrics.record_serial_gap(gap)
+                diff = min(gap, MAX_SERIAL_GAP)
                 self.last_serial = serial
                 
                 # print(f"DEBUG: Serial: {serial}, Diff: {diff}, Last serial: {self.last_serial}")
@@ -160,10 +173,12 @@ class GanGen2ProtocolDriver:
                         
                         # 添加边界检查
                         if face >= 6:  # 面索引范围0-5
-                            print(f"Warning: Invalid face={face}, skipping move")
+                            self.metrics.invalid_face += 1
+                            logger.debug("Invalid face=%d, skipping move", face)
                             continue
                         if direction >= 2:  # 方向索引范围0-1
-                            print(f"Warning: Invalid direction={direction}, skipping move")
+                            self.metrics.invalid_direction += 1
+                            logger.debug("Invalid direction=%d, skipping move", direction)
                             continue
                             
                         # 使用正确的字符串索引方法，与TypeScript版本一致
@@ -199,6 +214,9 @@ class GanGen2ProtocolDriver:
             
             # 解析角块和边块状态
             cp, co, ep, eo = self._parse_cube_state(msg)
+            if sorted(cp) != _CORNER_IDS or sorted(ep) != _EDGE_IDS:
+                # 排列字段越界或重复，仍按原样上报，只计数
+                self.metrics.invalid_state += 1
             # print(f"DEBUG: Parsed state - CP: {cp}, CO: {co}, EP: {ep}, EO: {eo}")
             
             facelets = self._to_kociemba_facelets(cp, co, ep, eo)
@@ -239,6 +257,8 @@ class GanGen2ProtocolDriver:
             # 处理电池事件
             # print("DEBUG: Processing BATTERY event")
             battery_level = msg.get_bit_word(8, 8)
+            if battery_level > 100:
+                self.metrics.invalid_battery += 1
             events.append(GanCubeEvent(
                 event_type="BATTERY",
                 timestamp=timestamp,
@@ -328,6 +348,7 @@ class GanGen3ProtocolDriver:
         self.last_serial = -1
         self.last_move_timestamp = 0
         self.cube_timestamp = 0
+        self.metrics = ConnectionMetrics()
     
     def create_command_message(self, command_type: str) -> Optional[bytes]:
         """创建命令消息"""
@@ -356,6 +377,7 @@ class GanGen4ProtocolDriver:
         self.last_serial = -1
         self.last_move_timestamp = 0
         self.cube_timestamp = 0
+        self.metrics = ConnectionMetrics()
     
     def create_command_message(self, command_type: str) -> Optional[bytes]:
         """创建命令消息"""
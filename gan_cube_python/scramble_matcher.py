@@ -0,0 +1,69 @@
+"""打乱匹配：根据移动事件判断魔方是否已经按打乱公式打乱
+
+预先计算打乱路径上每一步状态的压缩整数键，之后每个移动只需要
+一次块状态乘法和一次字典查找，不再依赖每步之后重新请求面块状态。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Union
+
+from .cube import SOLVED_STATE, CubieState, apply_move_code, state_from_lists, state_key
+from .moves import MoveSequence, move_code
+
+
+@dataclass
+class ScrambleProgress:
+    """打乱进度事件"""
+    step: int  # 已完成的打乱步数
+    total: int  # 打乱总步数
+    complete: bool  # 是否已到达目标状态
+
+
+class ScrambleMatcher:
+    """跟踪魔方状态并与打乱路径匹配"""
+
+    def __init__(self, scramble: Union[str, MoveSequence], start_state: CubieState = SOLVED_STATE):
+        self.moves = MoveSequence.parse(scramble) if isinstance(scramble, str) else scramble
+        self.total = len(self.moves)
+
+        # 路径上每个状态的键 -> 步数；重复出现的状态保留更靠后的步数
+        self._path: Dict[int, int] = {}
+        state = start_state
+        self._path[state_key(state)] = 0
+        for i, code in enumerate(self.moves):
+            state = apply_move_code(state, code)
+            self._path[state_key(state)] = i + 1
+        self.target_key = state_key(state)
+
+        self.state: Optional[CubieState] = None
+        self.step = -1  # -1 表示当前状态不在打乱路径上
+        self.complete = False
+
+    def sync(self, cp: Sequence[int], co: Sequence[int], ep: Sequence[int], eo: Sequence[int]) -> Optional[ScrambleProgress]:
+        """用面块状态事件同步当前状态（例如连接后或移动丢失后）"""
+        return self.sync_state(state_from_lists(cp, co, ep, eo))
+
+    def sync_state(self, state: CubieState) -> Optional[ScrambleProgress]:
+        """用已有的块状态（例如由转动推算的当前状态）同步"""
+        self.state = state
+        return self._update()
+
+    def apply_move(self, move: Union[str, int]) -> Optional[ScrambleProgress]:
+        """应用一个移动事件（符号或编码），进度变化时返回进度事件"""
+        if self.state is None:
+            return None
+        self.state = apply_move_code(self.state, move if isinstance(move, int) else move_code(move))
+        return self._update()
+
+    def _update(self) -> Optional[ScrambleProgress]:
+        if self.complete:
+            return None
+        key = state_key(self.state)
+        step = self._path.get(key, -1)
+        if step == self.step:
+            return None
+        self.step = step
+        if step < 0:
+            return None
+        self.complete = key == self.target_key
+        return ScrambleProgress(step=step, total=self.total, complete=self.complete)
@@ -0,0 +1,495 @@
+"""两阶段求解器（不依赖kociemba）
+
+直接使用协议解析得到的块状态 (cp, co, ep, eo) 求解。转动表和剪枝表第一次使用时生成
+（约半分钟）并写入 TABLE_DIR，之后以只读mmap方式打开：同一台机器上的所有进程共享同一份
+页缓存，加载几乎不花时间。
+
+    solution = solve(state_from_lists(cp, co, ep, eo))
+    print(solution)              # MoveSequence，如 "R U2 F' ..."
+
+找到第一个解通常需要几十毫秒，少数状态需要几百毫秒。传入 time_budget（秒）时整个搜索
+受这个时间限制，预算内没有找到解则返回None；50ms的预算下多数随机状态都会返回None。
+
+也可以预先生成表：
+
+    python -m gan_cube_python.solver --build
+"""
+
+import argparse
+import array
+import contextlib
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Tuple, Union
+
+from .cube import (N_CPERM, N_FLIP, N_MOVES, N_PHASE2_MOVES, N_SLICE, N_SLICEPERM, N_TWIST, N_UDPERM,
+                   PHASE2_MOVES, SOLVED_STATE, CubieState, _MOVE_STATES, get_cperm, get_flip, get_slice,
+                   get_sliceperm, get_twist, get_udperm, is_solvable, multiply, random_state)
+from .moves import MoveSequence
+
+logger = logging.getLogger(__name__)
+
+_UNVISITED = 0xFF
+
+# 表缓存目录，可通过环境变量覆盖
+TABLE_DIR = os.environ.get("GAN_CUBE_TABLE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "gan_cube_python", f"tables-v1-{sys.byteorder}")
+
+Table = Union[array.array, bytearray, memoryview]
+
+
+def _corners(a: Tuple, move: CubieState) -> Tuple:
+    cp, co = a
+    m_cp, m_co = move[0], move[1]
+    return (tuple(cp[j] for j in m_cp), tuple((co[j] + o) % 3 for j, o in zip(m_cp, m_co)))
+
+
+def _edges(a: Tuple, move: CubieState) -> Tuple:
+    ep, eo = a
+    m_ep, m_eo = move[2], move[3]
+    return (tuple(ep[j] for j in m_ep), tuple(eo[j] ^ o for j, o in zip(m_ep, m_eo)))
+
+
+def _build_move_table(size: int, start: Tuple, apply: Callable, coord: Callable, moves: List[int]) -> array.array:
+    """从还原状态出发广度优先遍历，记录每个坐标值在每种转动下的结果"""
+    width = len(moves)
+    table = array.array("H", [0]) * (size * width)
+    seen = {coord(start): start}
+    queue = deque([start])
+    while queue:
+        part = queue.popleft()
+        c = coord(part)
+        for k, m in enumerate(moves):
+            nxt = apply(part, _MOVE_STATES[m])
+            nc = coord(nxt)
+            table[c * width + k] = nc
+            if nc not in seen:
+                seen[nc] = nxt
+                queue.append(nxt)
+    if len(seen) != size:
+        raise RuntimeError(f"Move table covers {len(seen)} of {size} coordinates")
+    return table
+
+
+def _build_pruning_table(size_a: int, size_b: int, move_a: Table, move_b: Table, width: int) -> bytearray:
+    """两个坐标组合的剪枝表：到目标状态的最少步数"""
+    table = bytearray([_UNVISITED]) * (size_a * size_b)
+    table[0] = 0
+    frontier = [0]
+    depth = 0
+    while frontier:
+        depth += 1
+        nxt = []
+        for index in frontier:
+            a, b = divmod(index, size_b)
+            a_row = a * width
+            b_row = b * width
+            for k in range(width):
+                ni = move_a[a_row + k] * size_b + move_b[b_row + k]
+                if table[ni] == _UNVISITED:
+                    table[ni] = depth
+                    nxt.append(ni)
+        frontier = nxt
+    return table
+
+
+def _map_file(path: str, typecode: str, expected_size: int) -> Optional[memoryview]:
+    """以只读mmap打开表文件，大小不符（例如写了一半的旧文件）时返回None"""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size != expected_size:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    # memoryview持有mmap的引用，表的生命周期内映射一直有效
+    return memoryview(mapped).cast(typecode)
+
+
+def _cached(name: str, build: Callable[[], Table], typecode: str, length: int) -> Table:
+    """从磁盘缓存映射表，不存在时生成、写入缓存后再映射"""
+    path = os.path.join(TABLE_DIR, name + ".bin")
+    expected_size = length * array.array(typecode).itemsize
+    table = _map_file(path, typecode, expected_size)
+    if table is not None:
+        return table
+    start = time.perf_counter()
+    built = build()
+    logger.info("Built solver table %s in %.1fs", name, time.perf_counter() - start)
+    try:
+        os.makedirs(TABLE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=TABLE_DIR)
+        # mkstemp创建的文件只有属主可读；表要由其他用户的进程共享映射
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(built.tobytes() if isinstance(built, array.array) else bytes(built))
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Failed to cache table %s: %s", name, e)
+        return built
+    return _map_file(path, typecode, expected_size) or built
+
+
+class SolverTables:
+    """两阶段算法使用的转动表和剪枝表（首次使用时生成，之后从磁盘映射）"""
+
+    def __init__(self):
+        corners = (SOLVED_STATE[0], SOLVED_STATE[1])
+        edges = (SOLVED_STATE[2], SOLVED_STATE[3])
+        all_moves = list(range(N_MOVES))
+
+        # 第一阶段：角块方向、边块方向、中层棱块位置
+        self.twist_move = _cached("twist_move", lambda: _build_move_table(
+            N_TWIST, corners, _corners, lambda c: get_twist(c[1]), all_moves), "H", N_TWIST * N_MOVES)
+        self.flip_move = _cached("flip_move", lambda: _build_move_table(
+            N_FLIP, edges, _edges, lambda e: get_flip(e[1]), all_moves), "H", N_FLIP * N_MOVES)
+        self.slice_move = _cached("slice_move", lambda: _build_move_table(
+            N_SLICE, edges, _edges, lambda e: get_slice(e[0]), all_moves), "H", N_SLICE * N_MOVES)
+
+        # 第二阶段：角块排列、U/D层棱块排列、中层棱块排列（只使用第二阶段转动）
+        self.cperm_move = _cached("cperm_move", lambda: _build_move_table(
+            N_CPERM, corners, _corners, lambda c: get_cperm(c[0]), PHASE2_MOVES), "H", N_CPERM * N_PHASE2_MOVES)
+        self.udperm_move = _cached("udperm_move", lambda: _build_move_table(
+            N_UDPERM, edges, _edges, lambda e: get_udperm(e[0]), PHASE2_MOVES), "H", N_UDPERM * N_PHASE2_MOVES)
+        self.sliceperm_move = _cached("sliceperm_move", lambda: _build_move_table(
+            N_SLICEPERM, edges, _edges, lambda e: get_sliceperm(e[0]), PHASE2_MOVES), "H",
+            N_SLICEPERM * N_PHASE2_MOVES)
+
+        self.twist_slice_prune = _cached("twist_slice_prune", lambda: _build_pruning_table(
+            N_TWIST, N_SLICE, self.twist_move, self.slice_move, N_MOVES), "B", N_TWIST * N_SLICE)
+        self.flip_slice_prune = _cached("flip_slice_prune", lambda: _build_pruning_table(
+            N_FLIP, N_SLICE, self.flip_move, self.slice_move, N_MOVES), "B", N_FLIP * N_SLICE)
+        self.cperm_sliceperm_prune = _cached("cperm_sliceperm_prune", lambda: _build_pruning_table(
+            N_CPERM, N_SLICEPERM, self.cperm_move, self.sliceperm_move, N_PHASE2_MOVES), "B",
+            N_CPERM * N_SLICEPERM)
+        self.udperm_sliceperm_prune = _cached("udperm_sliceperm_prune", lambda: _build_pruning_table(
+            N_UDPERM, N_SLICEPERM, self.udperm_move, self.sliceperm_move, N_PHASE2_MOVES), "B",
+            N_UDPERM * N_SLICEPERM)
+
+
+_tables: Optional[SolverTables] = None
+_tables_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _table_file_lock():
+    """表目录上的进程间排他锁，避免多个进程同时生成同一份表（不支持flock的平台上不加锁）"""
+    try:
+        import fcntl
+        os.makedirs(TABLE_DIR, exist_ok=True)
+        lock_file = open(os.path.join(TABLE_DIR, ".lock"), "a+b")
+    except (ImportError, OSError):
+        yield
+        return
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+    finally:
+        lock_file.close()
+
+
+def get_tables() -> SolverTables:
+    """获取（必要时生成）全局共享的表
+
+    后台预热线程和事件循环可能同时第一次调用，生成只进行一次，其他调用方等待生成完成。
+    """
+    global _tables
+    tables = _tables
+    if tables is None:
+        with _tables_lock:
+            if _tables is None:
+                with _table_file_lock():
+                    _tables = SolverTables()
+            tables = _tables
+    return tables
+
+
+# ---------------------------------------------------------------------------
+# 两阶段搜索
+# ---------------------------------------------------------------------------
+
+# 同一面或对面按固定顺序时跳过，避免等价序列
+def _skip_face(face: int, last_face: int) -> bool:
+    return face == last_face or face == last_face - 3
+
+
+# 按上一步的面（-1表示没有上一步）预先筛选可用的后续转动，搜索时不再逐个判断
+_PHASE1_NEXT = [[(m, m // 3) for m in range(N_MOVES) if not _skip_face(m // 3, last)] for last in range(-1, 6)]
+_PHASE2_NEXT = [[(k, m, m // 3) for k, m in enumerate(PHASE2_MOVES) if not _skip_face(m // 3, last)]
+                for last in range(-1, 6)]
+
+# 第一轮搜索中第二阶段的最大步数：第二阶段需要很多步的第一阶段解直接跳过，
+# 通常很快就能遇到第二阶段较短的解；第一轮找不到解时再不加限制重新搜索
+PHASE2_LIMIT = 12
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class _TwoPhaseSearch:
+    """Kociemba两阶段算法
+
+    没有deadline时返回第一个不超过max_length步的解；有deadline时找到解后继续搜索更短的解，
+    到时间后返回目前最好的解（还没有找到解时返回None）。
+    """
+
+    # 每展开这么多个第一阶段节点检查一次时间
+    _CLOCK_INTERVAL = 256
+
+    def __init__(self, tables: SolverTables, state: CubieState, max_length: int, deadline: Optional[float] = None):
+        self.t = tables
+        self.state = state
+        self.max_length = max_length
+        self.deadline = deadline
+        self.best: Optional[List[int]] = None
+        self.path1: List[int] = []
+        self.path2: List[int] = []
+        self.phase2_limit: Optional[int] = None
+        self._nodes = 0
+
+    def run(self) -> Optional[List[int]]:
+        cp, co, ep, eo = self.state
+        twist, flip, slc = get_twist(co), get_flip(eo), get_slice(ep)
+        t = self.t
+        h = max(t.twist_slice_prune[twist * N_SLICE + slc], t.flip_slice_prune[flip * N_SLICE + slc])
+        try:
+            for limit in (PHASE2_LIMIT, None):
+                self.phase2_limit = limit
+                depth1 = h
+                while depth1 <= self.max_length:
+                    if self._phase1(twist, flip, slc, depth1, -1) and self.deadline is None:
+                        break
+                    depth1 += 1
+                if self.best is not None:
+                    break
+        except _SearchTimeout:
+            pass
+        return self.best
+
+    def _phase1(self, twist: int, flip: int, slc: int, depth: int, last_face: int) -> bool:
+        if len(self.path1) + depth > self.max_length:
+            # 找到解之后长度上限会下降，已不可能得到更短解的分支直接放弃
+            return False
+        if depth == 0:
+            # 最后一步是第二阶段转动的序列不是最短的，交给更短的深度处理
+            if self.path1 and self.path1[-1] in PHASE2_MOVES:
+                return False
+            return self._start_phase2()
+        if self.deadline is not None:
+            self._check_clock()
+        t = self.t
+        twist_move, flip_move, slice_move = t.twist_move, t.flip_move, t.slice_move
+        ts_prune, fs_prune = t.twist_slice_prune, t.flip_slice_prune
+        t_row, f_row, s_row = twist * N_MOVES, flip * N_MOVES, slc * N_MOVES
+        for m, face in _PHASE1_NEXT[last_face + 1]:
+            nt = twist_move[t_row + m]
+            nf = flip_move[f_row + m]
+            ns = slice_move[s_row + m]
+            if ts_prune[nt * N_SLICE + ns] >= depth or fs_prune[nf * N_SLICE + ns] >= depth:
+                continue
+            self.path1.append(m)
+            found = self._phase1(nt, nf, ns, depth - 1, face)
+            self.path1.pop()
+            if found and self.deadline is None:
+                return True
+        return False
+
+    def _check_clock(self):
+        """时间预算限制整个搜索（包括找到第一个解之前），两个阶段的节点都计数"""
+        self._nodes += 1
+        if self._nodes % self._CLOCK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+
+    def _start_phase2(self) -> bool:
+        remaining = self.max_length - len(self.path1)
+        if self.phase2_limit is not None:
+            remaining = min(remaining, self.phase2_limit)
+        state = self.state
+        for m in self.path1:
+            state = multiply(state, _MOVE_STATES[m])
+        cp, _, ep, _ = state
+        cperm, udperm, sliceperm = get_cperm(cp), get_udperm(ep), get_sliceperm(ep)
+        t = self.t
+        h = max(t.cperm_sliceperm_prune[cperm * N_SLICEPERM + sliceperm],
+                t.udperm_sliceperm_prune[udperm * N_SLICEPERM + sliceperm])
+        if h > remaining:
+            return False
+        last_face = self.path1[-1] // 3 if self.path1 else -1
+        for depth2 in range(h, remaining + 1):
+            self.path2 = []
+            if self._phase2(cperm, udperm, sliceperm, depth2, last_face):
+                self.best = self.path1 + self.path2
+                # 之后只接受更短的解
+                self.max_length = len(self.best) - 1
+                return True
+        return False
+
+    def _phase2(self, cperm: int, udperm: int, sliceperm: int, depth: int, last_face: int) -> bool:
+        if depth == 0:
+            return cperm == 0 and udperm == 0 and sliceperm == 0
+        if self.deadline is not None:
+            self._check_clock()
+        t = self.t
+        cperm_move, udperm_move, sliceperm_move = t.cperm_move, t.udperm_move, t.sliceperm_move
+        cs_prune, us_prune = t.cperm_sliceperm_prune, t.udperm_sliceperm_prune
+        c_row, u_row, s_row = cperm * N_PHASE2_MOVES, udperm * N_PHASE2_MOVES, sliceperm * N_PHASE2_MOVES
+        for k, m, face in _PHASE2_NEXT[last_face + 1]:
+            nc = cperm_move[c_row + k]
+            nu = udperm_move[u_row + k]
+            ns = sliceperm_move[s_row + k]
+            if cs_prune[nc * N_SLICEPERM + ns] >= depth or us_prune[nu * N_SLICEPERM + ns] >= depth:
+                continue
+            self.path2.append(m)
+            # 剪枝值为0只在还原状态出现，最后一步通过剪枝检查即已还原
+            if depth == 1 or self._phase2(nc, nu, ns, depth - 1, face):
+                return True
+            self.path2.pop()
+        return False
+
+
+def solve(state: CubieState, max_length: int = 24, time_budget: Optional[float] = None) -> Optional[MoveSequence]:
+    """求解状态
+
+    max_length: 解的最大步数
+    time_budget: 秒；不指定时返回第一个找到的解。指定时整个搜索在预算内结束：找到解后继续寻找
+                 更短的解，到时间返回最好的一个；预算内一个解都没找到时返回None
+    在限制内找不到解时返回None，状态不可解时抛出ValueError。
+    """
+    if not is_solvable(state):
+        raise ValueError("Unsolvable cube state")
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    solution = _TwoPhaseSearch(get_tables(), state, max_length, deadline).run()
+    return MoveSequence(solution) if solution is not None else None
+
+
+def solve_state(state: CubieState, max_length: int = 24) -> Optional[List[str]]:
+    """求解状态，返回转动列表；在max_length步内找不到解时返回None"""
+    solution = solve(state, max_length)
+    return solution.names() if solution is not None else None
+
+
+def random_scramble(rng: Optional[random.Random] = None, max_length: int = 22, min_length: int = 2) -> str:
+    """WCA风格的随机状态打乱：随机生成状态，求解后取逆序列
+
+    纯Python实现的搜索每个打乱约需0.1秒（max_length=22），即每核每秒约10个，
+    达不到每秒数千个；需要连续取用时使用 ScramblePool 在后台预先生成。
+    """
+    while True:
+        state = random_state(rng)
+        solution = solve(state, max_length)
+        # 过短的打乱（接近还原状态）按WCA规则重新生成
+        if solution is not None and len(solution) >= min_length:
+            return str(solution.inverse())
+
+
+def _init_scramble_worker():
+    logging.getLogger("gan_cube_python").setLevel(logging.WARNING)
+    # 表以mmap方式共享，各工作进程映射同一份页缓存
+    get_tables()
+
+
+def _scramble_task(seed: int, max_length: int) -> str:
+    return random_scramble(random.Random(seed), max_length)
+
+
+def random_scrambles(count: int, workers: Optional[int] = None, seed: Optional[int] = None,
+                     max_length: int = 22) -> List[str]:
+    """用多个进程批量生成打乱，吞吐量随核数线性增长（每核每秒约10个）"""
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(count)]
+    get_tables()  # 在主进程中生成（或检查）表，工作进程只需映射
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers or os.cpu_count() or 1, initializer=_init_scramble_worker) as pool:
+        return pool.starmap(_scramble_task, [(s, max_length) for s in seeds], chunksize=4)
+
+
+class ScramblePool:
+    """在后台进程中预先生成随机状态打乱
+
+    持续生成的速度受求解限制（每核每秒约10个）；池中始终保持size个打乱在生成或已就绪，
+    get() 在有就绪打乱时立即返回（微秒级），适合训练时逐个取用下一条打乱。
+
+        with ScramblePool(size=32) as pool:
+            scramble = pool.get()
+    """
+
+    def __init__(self, size: int = 32, workers: Optional[int] = None, seed: Optional[int] = None,
+                 max_length: int = 22):
+        self.size = size
+        self.workers = workers or os.cpu_count() or 1
+        self.max_length = max_length
+        self._rng = random.Random(seed)
+        self._ready: "queue.Queue[str]" = queue.Queue()
+        self._pool = None
+        self._error: Optional[BaseException] = None
+
+    def start(self) -> "ScramblePool":
+        if self._pool is None:
+            get_tables()
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ctx.Pool(self.workers, initializer=_init_scramble_worker)
+            for _ in range(self.size):
+                self._submit()
+        return self
+
+    def _submit(self):
+        self._pool.apply_async(_scramble_task, (self._rng.getrandbits(64), self.max_length),
+                               callback=self._ready.put, error_callback=self._failed)
+
+    def _failed(self, error: BaseException):
+        self._error = error
+        logger.error("Scramble worker failed: %s", error)
+
+    def ready(self) -> int:
+        """已生成、可以立即取用的打乱数量"""
+        return self._ready.qsize()
+
+    def get(self, timeout: Optional[float] = None) -> str:
+        """取一个打乱（没有就绪的打乱时等待），并补充一个新的生成任务"""
+        self.start()
+        if self._error is not None:
+            raise RuntimeError(f"Scramble worker failed: {self._error}")
+        scramble = self._ready.get(timeout=timeout)
+        self._submit()
+        return scramble
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> "ScramblePool":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Two-phase solver tables")
+    parser.add_argument("--build", action="store_true", help="生成（或检查）缓存的表")
+    args = parser.parse_args(argv)
+    if args.build:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        start = time.perf_counter()
+        get_tables()
+        logger.info("Solver tables ready in %s (%.1fs)", TABLE_DIR, time.perf_counter() - start)
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
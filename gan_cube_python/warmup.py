@@ -0,0 +1,61 @@
+"""后台预热：在蓝牙连接进行时并行加载重依赖和求解表"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWarmup:
+    """在守护线程中依次导入模块并执行预热任务
+
+    蓝牙连接大部分时间在等待I/O，此时在后台导入pycryptodome等模块
+    并加载求解表，连接完成后这些依赖已经就绪，第一个事件不再被冷启动拖慢。
+    """
+
+    def __init__(self, modules: Iterable[str] = (), tasks: Optional[Dict[str, Callable[[], object]]] = None):
+        self.modules = list(modules)
+        self.tasks = dict(tasks or {})
+        self.timings: Dict[str, float] = {}  # 每一步的耗时（秒）
+        self.errors: Dict[str, BaseException] = {}
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "BackgroundWarmup":
+        """启动后台线程，重复调用无效"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gan-cube-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待预热完成，返回是否已完成"""
+        if self._thread is None:
+            return True
+        return self._done.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _run(self):
+        try:
+            for name in self.modules:
+                self._step(name, lambda: importlib.import_module(name))
+            for name, task in self.tasks.items():
+                self._step(name, task)
+        finally:
+            self._done.set()
+
+    def _step(self, name: str, func: Callable[[], object]):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            # 预热失败不影响主流程，真正使用时会再次报错
+            self.errors[name] = e
+            logger.warning("Warmup step %s failed: %s", name, e)
+        self.timings[name] = time.perf_counter() - start
@@ -1,178 +1,276 @@
 
 
 import asyncio
+import contextlib
 import sys
 import os
+import threading
 import time
 from gan_cube_python.connection import GanCubeManager
-import kociemba
+from gan_cube_python.cube import SOLVED_STATE, apply_move_code, state_from_lists, to_facelets
+from gan_cube_python.metrics import MetricsFileWriter
+from gan_cube_python.moves import MovePrefixMatcher, move_code
+from gan_cube_python.orientation import OrientationTracker
+from gan_cube_python.output import BufferedLineWriter, setup_logging
+from gan_cube_python.profiling import PacketRecorder, ProfileSession
+from gan_cube_python.scramble_matcher import ScrambleMatcher
+from gan_cube_python.solver import solve
+from gan_cube_python.warmup import BackgroundWarmup
 
-# 重定向标准输出来过滤DEBUG信息
-class DebugFilter:
-    def __init__(self, original_stdout):
-        self.original_stdout = original_stdout
-        self.buffer = ""
-    
-    def write(self, text):
-        # 过滤掉DEBUG开头的行
-        lines = text.split('\n')
-        filtered_lines = []
-        for line in lines:
-            # 不再过滤DEBUG日志，保留所有非空行
-            if line.strip():
-                filtered_lines.append(line)
-        if filtered_lines:
-            self.original_stdout.write('\n'.join(filtered_lines) + '\n')
-        self.original_stdout.flush()
-    
-    def flush(self):
-        self.original_stdout.flush()
+def warm_solver():
+    """映射求解表并求解一次，让表在连接期间加载完成（首次运行时会生成表）"""
+    from gan_cube_python import cube, solver
+    solver.solve(cube.apply_moves(cube.SOLVED_STATE, ["R"]))
 
 async def main():
+    # 设置输出编码
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+    # stdout只输出给Swift应用解析的事件行，每轮事件循环合并写出一次；
+    # 诊断信息通过日志输出到stderr，并按级别过滤和限流
+    logger = setup_logging()
+    output = BufferedLineWriter(sys.stdout)
+    emit = output.write_line
+    # 可选的性能分析和数据包录制，由环境变量开启
+    profiler = ProfileSession.from_env()
+    recorder = PacketRecorder.from_env()
+    metrics_writer = MetricsFileWriter.from_env()
+    if profiler:
+        profiler.start()
+    # 重依赖和求解表在后台加载，与蓝牙连接并行
+    warmup = BackgroundWarmup(
+        modules=["Crypto.Cipher.AES"],
+        tasks={"solver": warm_solver},
+    ).start()
+    # 退出时（包括Ctrl+C取消）确定地断开连接
+    stack = contextlib.AsyncExitStack()
     try:
-        # 应用DEBUG过滤器
-        original_stdout = sys.stdout
-        debug_filter = DebugFilter(original_stdout)
-        sys.stdout = debug_filter
-        
         # 检查是否提供了设备地址参数
         if len(sys.argv) < 3:
-            print("Error: Both UUID and MAC address are required")
-            print("Usage: python test_raw_data.py <UUID> <MAC_ADDRESS>")
+            logger.error("Both UUID and MAC address are required")
+            logger.error("Usage: python test_raw_data.py <UUID> <MAC_ADDRESS>")
             return
         
         uuid_address = sys.argv[1]  # 用于连接
         mac_address = sys.argv[2]   # 用于生成盐值
         
-        print(f"Connecting to device UUID: {uuid_address}")
-        print(f"Using MAC address for salt: {mac_address}")
-        
         # 连接到魔方
-        cube = await GanCubeManager.connect(uuid_address, mac_address)
-        print("Connected successfully!")
+        cube = await stack.enter_async_context(GanCubeManager.open(uuid_address, mac_address))
+        if recorder:
+            cube.on_raw(recorder)
+        if metrics_writer:
+            metrics_writer.track(cube)
+            metrics_writer.start()
+        logger.info("Connected successfully!")
         # 发送连接确认消息给Swift应用
-        print("CUBE_CONNECTED_CONFIRMATION")
+        emit("CUBE_CONNECTED_CONFIRMATION")
         
         # 连接完成后主动请求一次魔方状态，避免漏掉第一步
-        print("Requesting initial cube state...")
+        logger.debug("Requesting initial cube state...")
         try:
             await cube.request_state()
-            print("Initial state requested successfully")
+            logger.debug("Initial state requested successfully")
         except Exception as e:
-            print(f"Failed to request initial state: {e}")
+            logger.error("Failed to request initial state: %s", e)
         
         # 陀螺仪数据缓存
         latest_gyro_data = None
-        # 标记是否已经执行过初始解
+        # 整体朝向跟踪，以连接后第一个陀螺仪样本的姿态为初始朝向
+        orientation = OrientationTracker()
+        # 标记是否已经执行过（或正在计算）初始解
         initial_solution_executed = False
+        # 初始解计算期间的转动和状态行先缓存，输出解之后再写出，保证Swift端先执行解再执行转动
+        held_lines = None
+        # 打乱匹配器，由标准输入的 "SCRAMBLE: <公式>" 命令设置
+        scramble_matcher = None
+        # 初始解的跟随进度，用户按解转动时输出 SOLUTION_PROGRESS；开始打乱或有转动丢失后不再跟踪
+        solution_matcher = None
+        # 求解期间的转动，输出解之后补充输入进度匹配器
+        solving_moves = bytearray()
+        # 由最近的面块状态和之后的转动推算的当前状态，每步转动后在本地输出State行，不再请求FACELETS
+        tracked_state = None
+        # 已知无法恢复的转动数（序列号间隔过大或字段越界），增加时重新请求一次面块状态
+        untracked_moves = 0
+        
+        def count_untracked_moves():
+            metrics = cube.metrics
+            return metrics.lost_moves + metrics.invalid_face + metrics.invalid_direction
+        
+        def emit_cube_line(line):
+            if held_lines is not None:
+                held_lines.append(line)
+            else:
+                emit(line)
+        
+        def report_scramble_progress(progress):
+            if progress is None:
+                return
+            if progress.complete:
+                emit("SCRAMBLE_COMPLETE")
+            else:
+                emit(f"SCRAMBLE_PROGRESS: {progress.step}/{progress.total}")
+        
+        def report_solution_progress(codes):
+            nonlocal solution_matcher
+            position = solution_matcher.position
+            for code in codes:
+                progress = solution_matcher.feed(code)
+            if progress.complete:
+                emit("SOLUTION_COMPLETE")
+                solution_matcher = None
+            elif progress.position != position:
+                emit(f"SOLUTION_PROGRESS: {progress.position}/{progress.total}")
+        
+        def set_scramble(scramble):
+            nonlocal scramble_matcher, solution_matcher
+            try:
+                scramble_matcher = ScrambleMatcher(scramble)
+            except ValueError as e:
+                logger.warning("Invalid scramble: %s", e)
+                return
+            solution_matcher = None
+            # 没有可用的当前状态时（尚未收到面块状态或正在重新同步），由下一个面块状态事件同步
+            if tracked_state is not None:
+                report_scramble_progress(scramble_matcher.sync_state(tracked_state))
+        
+        def read_commands(loop):
+            # 在后台线程读取Swift应用通过标准输入发送的命令
+            for line in sys.stdin:
+                line = line.strip()
+                if line.startswith("SCRAMBLE:"):
+                    loop.call_soon_threadsafe(set_scramble, line[len("SCRAMBLE:"):].strip())
         
         # 设置事件处理器
         def on_move(move_data):
-            print(f"Move: {move_data.move}, Serial: {move_data.serial}")
-            # 每次move后主动请求状态
-            asyncio.create_task(request_state_after_move())
-        
-        def expand_double_moves(solution):
-            """将解中的双倍移动（如R2）拆分成两个单次移动（R R）"""
-            if not solution or solution.strip() == "":
-                return ""
-            
-            moves = solution.split()
-            expanded_moves = []
-            
-            for move in moves:
-                if move.endswith("2"):
-                    # 将R2拆分成R R
-                    base_move = move[:-1]  # 去掉"2"
-                    expanded_moves.append(base_move)
-                    expanded_moves.append(base_move)
-                else:
-                    expanded_moves.append(move)
-            
-            return " ".join(expanded_moves)
+            nonlocal tracked_state, untracked_moves, solution_matcher
+            emit_cube_line(f"Move: {move_data.move}, Serial: {move_data.serial}")
+            if scramble_matcher is not None:
+                report_scramble_progress(scramble_matcher.apply_move(move_data.move))
+            untracked = count_untracked_moves()
+            if untracked != untracked_moves or not initial_solution_executed:
+                # 中间有转动丢失（推算的状态已不可靠），或还没有可用的初始状态/初始解失败：
+                # 停止输出State行，重新请求面块状态
+                untracked_moves = untracked
+                tracked_state = None
+                solution_matcher = None
+                asyncio.create_task(resync_state())
+            elif tracked_state is not None:
+                code = move_code(move_data.move)
+                tracked_state = apply_move_code(tracked_state, code)
+                emit_cube_line(f"State: {to_facelets(tracked_state)}")
+                if held_lines is not None:
+                    solving_moves.append(code)
+                elif solution_matcher is not None:
+                    report_solution_progress((code,))
         
         def on_state(state_data):
-            nonlocal initial_solution_executed
-            print(f"State: {state_data.facelets}")
+            nonlocal initial_solution_executed, held_lines, tracked_state
+            emit_cube_line(f"State: {state_data.facelets}")
+            tracked_state = state_from_lists(state_data.cp, state_data.co, state_data.ep, state_data.eo)
+            if scramble_matcher is not None:
+                report_scramble_progress(scramble_matcher.sync_state(tracked_state))
             
             # 只在初始状态时计算解，执行一次后就不再计算
             if not initial_solution_executed:
-                try:
-                    solved_state = "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"
-                    target_state = state_data.facelets
-                    
-                    # 检查魔方是否已经是还原状态
-                    if target_state == solved_state:
-                        print("Cube is already solved, no solution needed")
-                        print(f"CUBE_SOLUTION: ")
-                    else:
-                        # 使用kociemba求解
-                        solution = kociemba.solve(solved_state, target_state)
-                        # 拆分双倍移动
-                        expanded_solution = expand_double_moves(solution)
-                        print(f"CUBE_SOLUTION: {expanded_solution}")
-                    
-                    # 标记已经执行过初始解
-                    initial_solution_executed = True
-                    
-                except Exception as e:
-                    print(f"Failed to solve cube state: {e}")
+                initial_solution_executed = True
+                held_lines = []
+                solving_moves.clear()
+                asyncio.create_task(emit_initial_solution(state_data, untracked_moves))
+        
+        async def emit_initial_solution(state_data, untracked_at_state):
+            # 求解在线程池中运行，不阻塞蓝牙通知的处理。纯Python搜索找到第一个解通常需要
+            # 几十毫秒，少数状态需要几百毫秒；首次运行时还要等待后台生成求解表（约半分钟）
+            nonlocal initial_solution_executed, held_lines, solution_matcher
+            loop = asyncio.get_running_loop()
+            try:
+                state = state_from_lists(state_data.cp, state_data.co, state_data.ep, state_data.eo)
+                
+                # 检查魔方是否已经是还原状态
+                if state == SOLVED_STATE:
+                    logger.info("Cube is already solved, no solution needed")
+                    emit("CUBE_SOLUTION: ")
+                else:
+                    await loop.run_in_executor(None, warmup.wait)
+                    solution = await loop.run_in_executor(None, solve, state)
+                    if solution is None:
+                        raise ValueError("No solution found")
+                    # Swift端从还原状态执行这串转动得到当前状态，所以输出解的逆序列；
+                    # 拆分双倍移动（R2 -> R R），Swift端逐个比较单步转动
+                    emit(f"CUBE_SOLUTION: {solution.inverse().expand()}")
+                    # 求解期间有转动丢失时无法确定用户已经做到哪一步，不跟踪进度
+                    if untracked_moves == untracked_at_state:
+                        solution_matcher = MovePrefixMatcher(solution)
+            except Exception as e:
+                logger.error("Failed to solve cube state: %s", e)
+                # 下一步转动时重新请求面块状态并重试
+                initial_solution_executed = False
+            finally:
+                for line in held_lines:
+                    emit(line)
+                held_lines = None
+                if solution_matcher is not None and solving_moves:
+                    report_solution_progress(solving_moves)
         
         def on_gyro(gyro_data):
             # 陀螺仪数据处理器，缓存最新数据
             nonlocal latest_gyro_data
             latest_gyro_data = gyro_data
+            # 只在整体转动完成时输出一行，原始样本不输出
+            change = orientation.update(gyro_data, time.time())
+            if change is not None:
+                emit(f"ORIENTATION: {change.rotation} {change.up}{change.front}")
         
         def on_battery(battery_data):
             # 电量数据处理器
-            print(f"Battery: {battery_data}")
+            emit(f"Battery: {battery_data}")
         
         # 模拟电量数据用于测试
         async def simulate_battery():
             await asyncio.sleep(5)  # 等待5秒后发送模拟电量数据
-            print("Battery: 85%")
+            emit("Battery: 85%")
         
-        async def request_state_after_move():
+        async def resync_state():
+            # 连接内部的命令队列会合并连续的重复状态请求
             try:
                 await cube.request_state()
             except Exception as e:
-                print(f"Failed to request state: {e}")
-        
-    
+                logger.warning("Failed to request state: %s", e)
         
         cube.on_move(on_move)
         cube.on_state(on_state)
         cube.on_gyro(on_gyro)
         cube.on_battery(on_battery)
         
-        print("Start turning the cube to see events...")
-        print("Press Ctrl+C to stop")
-        print("Gyro data will be output every second...")
+        logger.info("Start turning the cube to see events...")
+        logger.info("Press Ctrl+C to stop")
         
         # 启动模拟电量任务
         asyncio.create_task(simulate_battery())
         
-        # 启动陀螺仪数据输出任务
-
-        
-        # 保持连接
-        while cube.is_connected:
-            await asyncio.sleep(1)
+        # 启动命令读取线程
+        threading.Thread(target=read_commands, args=(asyncio.get_running_loop(),), daemon=True).start()
         
-        # 取消陀螺仪任务
-
+        # 保持连接，直到魔方断开
+        await cube.wait_disconnected()
             
     except KeyboardInterrupt:
-        print("\nStopping...")
-        if 'cube' in locals():
-            await cube.disconnect()
+        logger.info("Stopping...")
     except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error: %s", e)
     finally:
-        # 恢复标准输出
-        sys.stdout = original_stdout
+        if 'cube' in locals():
+            logger.debug("Command stats: %s", cube.get_command_stats())
+            logger.debug("Packet metrics: %s", cube.metrics_snapshot())
+        await stack.aclose()
+        # 写出缓冲区中剩余的事件行
+        output.close()
+        if recorder:
+            recorder.close()
+        if metrics_writer:
+            # 连接已经断开，等待最终统计后写出
+            await metrics_writer.aclose()
+        if profiler:
+            profiler.stop()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
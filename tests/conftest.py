@@ -0,0 +1,47 @@
+"""测试共用的假蓝牙客户端和连接工厂"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from gan_cube_python.connection import GanCubeConnection
+from gan_cube_python.protocol import GanGen2ProtocolDriver
+
+
+class FakeBleakClient:
+    """记录写入的命令，可选地让每次写入挂起一段时间"""
+
+    def __init__(self, write_delay: float = 0.0):
+        self.is_connected = True
+        self.write_delay = write_delay
+        self.writes = []
+        char = SimpleNamespace(uuid="28be4a4a-cd67-11e9-a32f-2a2ae2dbcce4", properties=["write-without-response"])
+        self.services = [SimpleNamespace(characteristics=[char])]
+
+    async def write_gatt_char(self, char, data, response=False):
+        if self.write_delay:
+            await asyncio.sleep(self.write_delay)
+        self.writes.append((bytes(data), response))
+
+    async def disconnect(self):
+        self.is_connected = False
+
+
+class PlainEncrypter:
+    """不加密，测试只关心命令和事件的流转"""
+
+    def encrypt(self, data):
+        return bytes(data)
+
+    def decrypt(self, data):
+        return bytes(data)
+
+
+@pytest.fixture
+def make_connection():
+    def factory(client=None, driver=None):
+        device = SimpleNamespace(address="test", name="GAN-test")
+        return GanCubeConnection(device, client or FakeBleakClient(), PlainEncrypter(),
+                                 driver or GanGen2ProtocolDriver())
+    return factory
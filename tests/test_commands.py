@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from conftest import FakeBleakClient
+
+
+def test_concurrent_requests_coalesce_into_one_write(make_connection):
+    async def run():
+        client = FakeBleakClient(write_delay=0.01)
+        cube = make_connection(client)
+        await asyncio.gather(*(cube.request_state() for _ in range(10)))
+        return client, cube.get_command_stats()
+
+    client, stats = asyncio.run(run())
+    assert len(client.writes) == 1
+    assert client.writes[0] == (bytes([0x04]) + bytes(19), False)
+    assert stats["writes"] == 1
+    assert stats["coalesced"] == 9
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] == 1
+
+
+def test_request_during_write_is_written_again(make_connection):
+    async def run():
+        client = FakeBleakClient(write_delay=0.02)
+        cube = make_connection(client)
+        first = asyncio.create_task(cube.request_state())
+        await asyncio.sleep(0.005)  # 第一次写入已经出队、正在进行
+        await asyncio.gather(first, cube.request_state(), cube.request_state())
+        return client, cube.get_command_stats()
+
+    client, stats = asyncio.run(run())
+    assert len(client.writes) == 2
+    assert stats["coalesced"] == 1
+
+
+def test_distinct_commands_are_written_in_order(make_connection):
+    async def run():
+        client = FakeBleakClient()
+        cube = make_connection(client)
+        await asyncio.gather(cube.send_command("REQUEST_FACELETS"), cube.send_command("REQUEST_BATTERY"),
+                             cube.send_command("REQUEST_FACELETS"))
+        return client
+
+    client = asyncio.run(run())
+    assert [data[0] for data, _ in client.writes] == [0x04, 0x09]
+
+
+def test_write_with_response_when_characteristic_requires_it(make_connection):
+    async def run():
+        client = FakeBleakClient()
+        client.services[0].characteristics[0].properties = ["write"]
+        await make_connection(client).request_state()
+        return client
+
+    assert asyncio.run(run()).writes[0][1] is True
+
+
+def test_write_failure_reaches_every_waiter(make_connection):
+    class FailingClient(FakeBleakClient):
+        async def write_gatt_char(self, char, data, response=False):
+            await asyncio.sleep(0)
+            raise OSError("write failed")
+
+    async def run():
+        cube = make_connection(FailingClient())
+        results = await asyncio.gather(cube.request_state(), cube.request_state(), return_exceptions=True)
+        return results, cube.get_command_stats()
+
+    results, stats = asyncio.run(run())
+    assert all(isinstance(result, OSError) for result in results)
+    assert stats["failures"] == 1
+    assert stats["writes"] == 0
+
+
+def test_disconnect_fails_pending_commands(make_connection):
+    async def run():
+        cube = make_connection(FakeBleakClient(write_delay=1.0))
+        request = asyncio.create_task(cube.request_state())
+        await asyncio.sleep(0)
+        await cube.disconnect()
+        with pytest.raises(RuntimeError):
+            await request
+        with pytest.raises(RuntimeError):
+            await cube.request_state()
+
+    asyncio.run(run())
+
+
+def test_unknown_command_is_rejected(make_connection):
+    with pytest.raises(ValueError):
+        asyncio.run(make_connection().send_command("REQUEST_NOTHING"))
@@ -0,0 +1,53 @@
+import random
+
+from gan_cube_python import cube
+from gan_cube_python.protocol import GanGen2ProtocolDriver
+
+SOLVED_FACELETS = "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"
+
+
+def test_to_facelets_of_known_states():
+    assert cube.to_facelets(cube.SOLVED_STATE) == SOLVED_FACELETS
+    assert (cube.to_facelets(cube.apply_moves(cube.SOLVED_STATE, ["R"]))
+            == "UUFUUFUUFRRRRRRRRRFFDFFDFFDDDBDDBDDBLLLLLLLLLUBBUBBUBB")
+
+
+def test_to_facelets_matches_protocol_conversion():
+    driver = GanGen2ProtocolDriver()
+    rng = random.Random(3)
+    for _ in range(100):
+        state = cube.random_state(rng)
+        assert cube.to_facelets(state) == driver._to_kociemba_facelets(*map(list, state))
+
+
+def test_moves_and_inverses_return_to_solved():
+    rng = random.Random(5)
+    moves = [rng.choice(cube.MOVE_NAMES) for _ in range(40)]
+    state = cube.apply_moves(cube.SOLVED_STATE, moves)
+    assert cube.is_solvable(state)
+    assert cube.apply_moves(state, cube.invert_moves(moves)) == cube.SOLVED_STATE
+    for name in cube.MOVE_NAMES:
+        assert cube.apply_moves(cube.SOLVED_STATE, [name] * 4) == cube.SOLVED_STATE
+
+
+def test_state_index_round_trip_and_keys():
+    rng = random.Random(11)
+    states = [cube.random_state(rng) for _ in range(50)]
+    for state in states:
+        assert cube.state_from_index(cube.state_index(state)) == state
+    assert len({cube.state_key(state) for state in states}) == len(states)
+
+
+def test_unsolvable_state_is_detected():
+    cp, co, ep, eo = cube.SOLVED_STATE
+    assert not cube.is_solvable((cp, (1,) + co[1:], ep, eo))
+    assert not cube.is_solvable((cp, co, (1, 0) + ep[2:], eo))
+
+
+def test_out_of_range_orientations_are_unsolvable():
+    cp, co, ep, eo = cube.SOLVED_STATE
+    # 和仍然满足 %3 / %2 的条件
+    assert not cube.is_solvable((cp, (3,) + co[1:], ep, eo))
+    assert not cube.is_solvable((cp, (-1, 1) + co[2:], ep, eo))
+    assert not cube.is_solvable((cp, co, ep, (2,) + eo[1:]))
+    assert not cube.is_solvable((cp, co[:7], ep, eo))
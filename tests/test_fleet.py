@@ -0,0 +1,126 @@
+import asyncio
+import os
+import struct
+import threading
+
+import pytest
+
+from gan_cube_python import fleet
+from gan_cube_python.fleet import FleetDecoder, SharedRing
+from gan_cube_python.protocol import GanGen2ProtocolDriver
+
+_SLOT = struct.Struct("<I")
+
+
+def _pack(buf, offset, value):
+    _SLOT.pack_into(buf, offset, value)
+
+
+def _drain(ring, limit=100):
+    values = []
+    ring.consume(lambda buf, offset: values.append(_SLOT.unpack_from(buf, offset)[0]), limit)
+    return values
+
+
+def test_ring_wraps_around():
+    ring = SharedRing(8, 4, lock=threading.Lock())
+    try:
+        received = []
+        for start in range(0, 30, 3):
+            for value in range(start, start + 3):
+                assert ring.push(_pack, value)
+            ring.publish()
+            received.extend(_drain(ring))
+        assert received == list(range(30))
+        assert len(ring) == 0
+    finally:
+        ring.close()
+
+
+def test_ring_full_and_unpublished_slots():
+    ring = SharedRing(8, 4, lock=threading.Lock())
+    try:
+        for value in range(4):
+            assert ring.push(_pack, value)
+        assert not ring.push(_pack, 99)
+        # 未发布的槽对消费者不可见
+        assert _drain(ring) == []
+        ring.publish()
+        assert _drain(ring, limit=2) == [0, 1]
+        # 消费后腾出的槽可以再次写入
+        assert ring.push(_pack, 4) and ring.push(_pack, 5)
+        assert not ring.push(_pack, 6)
+        ring.publish()
+        assert _drain(ring) == [2, 3, 4, 5]
+    finally:
+        ring.close()
+
+
+def test_ring_wakes_waiting_consumer_once():
+    ring = SharedRing(8, 4, lock=threading.Lock())
+    try:
+        assert ring.prepare_wait()
+        ring.push(_pack, 1)
+        ring.publish()
+        assert os.read(ring.wakeup_fd, 16) == b"\0"
+        # 没有登记等待时发布不写唤醒管道
+        ring.push(_pack, 2)
+        ring.publish()
+        ring.clear_wakeup()
+        assert not ring.prepare_wait()
+        assert _drain(ring) == [1, 2]
+        assert ring.prepare_wait()
+    finally:
+        ring.close()
+
+
+def test_fleet_decodes_like_inline_path(make_connection):
+    from benchmarks.packets import BENCH_SALT, make_encrypter, packet_stream
+
+    packets, _ = packet_stream(400, 2, 3, {"MOVE": 0.7, "FACELETS": 0.3}, 0.2, 0.02, 0xF0,
+                               encrypter=make_encrypter(BENCH_SALT, 2))
+
+    def connection():
+        cube = make_connection(driver=GanGen2ProtocolDriver())
+        cube.encrypter = make_encrypter(BENCH_SALT, 2)
+        cube.received = []
+        cube.on_move(lambda move: cube.received.append(move.move))
+        return cube
+
+    async def run():
+        inline = connection()
+        for packet in packets:
+            await inline._notification_handler(None, packet)
+        fleet = connection()
+        with FleetDecoder(workers=1) as decoder:
+            fleet.use_decoder(decoder)
+            for packet in packets:
+                await fleet._notification_handler(None, packet)
+            # 断开后工作进程先处理完已提交的数据包，再回传最终统计
+            await fleet.disconnect()
+            await asyncio.wait_for(fleet.wait_closed(), 5)
+        return inline, fleet
+
+    inline, fleet = asyncio.run(run())
+    assert fleet.received == inline.received
+    assert fleet.metrics_snapshot() == inline.metrics_snapshot()
+
+
+def test_connection_ids_reused_only_after_worker_ack(make_connection):
+    async def run():
+        with FleetDecoder(workers=1) as decoder:
+            first = decoder.register(make_connection())
+            decoder.unregister(first)
+            # 工作进程确认之前不重用
+            second = decoder.register(make_connection())
+            assert second != first
+            for _ in range(200):
+                await asyncio.sleep(0.01)
+                if not decoder._closing:
+                    break
+            assert decoder.register(make_connection()) == first
+            decoder._next_id = fleet.MAX_CONNECTIONS
+            with pytest.raises(RuntimeError):
+                decoder.register(make_connection())
+
+    asyncio.run(run())
@@ -0,0 +1,93 @@
+import asyncio
+
+from gan_cube_python.metrics import ConnectionMetrics, MetricsFileWriter, format_prometheus
+
+
+def _metrics(*gaps):
+    metrics = ConnectionMetrics()
+    for gap in gaps:
+        metrics.record_serial_gap(gap)
+    return metrics
+
+
+def test_serial_gaps_fill_buckets_and_count_lost_moves():
+    metrics = _metrics(1, 1, 3, 7, 0, 10)
+
+    assert metrics.gap_counts == [2, 0, 1, 0, 0, 0, 1, 1]
+    assert metrics.duplicate_serials == 1
+    assert metrics.truncated_bursts == 1
+    assert metrics.lost_moves == 3
+    assert metrics.gap_sum == 22
+    assert metrics.move_packets == 5
+
+    snapshot = metrics.snapshot()
+    assert snapshot["serial_gaps"] == {"1": 2, "2": 0, "3": 1, "4": 0, "5": 0, "6": 0, "7": 1, ">7": 1}
+    assert snapshot["move_loss_ratio"] == 3 / 22
+
+
+def test_decoder_values_round_trip():
+    source = _metrics(2, 9)
+    source.events, source.invalid_face, source.packets = 5, 1, 8
+
+    target = ConnectionMetrics()
+    target.packets = 11
+    target.load_decoder_values(source.decoder_values())
+
+    assert target.gap_counts == source.gap_counts
+    assert (target.events, target.invalid_face, target.lost_moves) == (5, 1, 2)
+    # 主进程统计的计数器不被覆盖
+    assert target.packets == 11
+
+
+def test_format_prometheus_escapes_labels_and_accumulates_buckets():
+    metrics = _metrics(1, 2, 2, 12)
+    metrics.invalid_state = 4
+    text = format_prometheus({'GAN "a"\\b': metrics})
+    lines = text.splitlines()
+    cube = 'cube="GAN \\"a\\"\\\\b"'
+
+    assert "# TYPE gan_cube_lost_moves_total counter" in lines
+    assert f"gan_cube_lost_moves_total{{{cube}}} 5" in lines
+    assert f'gan_cube_invalid_fields_total{{{cube},field="state"}} 4' in lines
+    assert lines.count("# TYPE gan_cube_invalid_fields_total counter") == 1
+    assert f'gan_cube_serial_gap_bucket{{{cube},le="1"}} 1' in lines
+    assert f'gan_cube_serial_gap_bucket{{{cube},le="2"}} 3' in lines
+    assert f'gan_cube_serial_gap_bucket{{{cube},le="7"}} 3' in lines
+    assert f'gan_cube_serial_gap_bucket{{{cube},le="+Inf"}} 4' in lines
+    assert f"gan_cube_serial_gap_sum{{{cube}}} 17" in lines
+    assert f"gan_cube_serial_gap_count{{{cube}}} 4" in lines
+    assert text.endswith("\n")
+
+
+def test_removed_connection_is_written_once_more(tmp_path):
+    path = tmp_path / "gan_cube.prom"
+    writer = MetricsFileWriter(str(path))
+    writer.add("cube-1", _metrics(10))
+    writer.remove("cube-1")
+
+    writer.write()
+    assert 'gan_cube_lost_moves_total{cube="cube-1"} 3' in path.read_text()
+    writer.write()
+    assert "cube-1" not in path.read_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["gan_cube.prom"]
+    # 采集端通常以其他用户运行
+    assert path.stat().st_mode & 0o777 == 0o644
+
+
+def test_tracked_connection_retires_after_close(tmp_path, make_connection):
+    path = tmp_path / "gan_cube.prom"
+
+    async def run():
+        writer = MetricsFileWriter(str(path), interval=3600)
+        cube = make_connection()
+        writer.track(cube)
+        writer.start()
+        cube.metrics.record_serial_gap(9)
+        await cube.disconnect()
+        await writer.aclose()
+        return writer
+
+    writer = asyncio.run(run())
+    assert 'gan_cube_lost_moves_total{cube="GAN-test"} 2' in path.read_text()
+    writer.write()
+    assert "GAN-test" not in path.read_text()
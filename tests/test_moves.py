@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from gan_cube_python import cube
+from gan_cube_python.moves import MOVE_NAMES, MovePrefixMatcher, MoveSequence, move_code
+
+
+def _simplified(text):
+    return str(MoveSequence.parse(text).simplify())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("R R", "R2"),
+    ("R R'", ""),
+    ("R2 R2", ""),
+    ("R R2", "R'"),
+    ("R L R'", "L"),
+    ("U D U D", "U2 D2"),
+    ("R U U' R'", ""),
+    ("R L F R'", "R L F R'"),
+])
+def test_simplify_merges_same_and_opposite_faces(text, expected):
+    assert _simplified(text) == expected
+
+
+def test_simplify_preserves_cube_state():
+    rng = random.Random(7)
+    for _ in range(50):
+        seq = MoveSequence(rng.randrange(18) for _ in range(30))
+        assert len(seq.simplify()) <= len(seq)
+        assert (cube.apply_move_codes(cube.SOLVED_STATE, seq.simplify().codes)
+                == cube.apply_move_codes(cube.SOLVED_STATE, seq.codes))
+
+
+def test_inverse_round_trip():
+    seq = MoveSequence.parse("R U2 F' L D B2")
+    assert str(seq.inverse()) == "B2 D' L' F U2 R'"
+    assert seq.inverse().inverse() == seq
+    assert (seq + seq.inverse()).simplify() == MoveSequence()
+
+
+def test_expand_and_quarter_turns():
+    seq = MoveSequence.parse("R2 U' F2")
+    assert str(seq.expand()) == "R R U' F F"
+    assert seq.quarter_turns() == len(seq.expand()) == 5
+
+
+def test_parse_is_interned_and_codes_are_read_only():
+    seq = MoveSequence.parse("R U R' U'")
+    assert MoveSequence.parse(" R U R' U' ") is seq
+    assert seq.codes == bytes(move_code(name) for name in ("R", "U", "R'", "U'"))
+    with pytest.raises(AttributeError):
+        seq.codes = b""
+    with pytest.raises(AttributeError):
+        seq.extra = 1
+
+
+def test_equality_and_hash():
+    assert MoveSequence.parse("R U") == MoveSequence.from_names(["R", "U"])
+    assert hash(MoveSequence.parse("R U")) == hash(MoveSequence.from_names(["R", "U"]))
+    assert MoveSequence.parse("R U") != "R U"
+    assert MoveSequence().__eq__(b"") is NotImplemented
+
+
+def test_invalid_move_raises():
+    with pytest.raises(ValueError):
+        MoveSequence.parse("R X")
+    assert MoveSequence.parse("R2'") == MoveSequence.parse("R2")
+    assert MOVE_NAMES[move_code("B'")] == "B'"
+
+
+def _feed(matcher, text):
+    return [matcher.feed(name) for name in text.split()][-1]
+
+
+def test_prefix_matcher_accepts_quarter_turns_for_half_turns():
+    matcher = MovePrefixMatcher("R2 U F2")
+    assert _feed(matcher, "R").position == 0
+    assert _feed(matcher, "R U F' F'") == (3, 3, True, True)
+
+    matcher.reset()
+    assert _feed(matcher, "R' R' U").position == 2
+    assert not matcher.complete
+
+
+def test_prefix_matcher_returns_to_path_after_undo():
+    matcher = MovePrefixMatcher("R U")
+    assert _feed(matcher, "R L") == (1, 2, False, False)
+    assert _feed(matcher, "L'") == (1, 2, True, False)
+    # 目标转动做了一半后偏离，撤销后继续完成
+    matcher = MovePrefixMatcher("R2 U")
+    assert _feed(matcher, "R D").on_path is False
+    assert _feed(matcher, "D' R U").complete
+
+
+def test_prefix_matcher_over_turn_leaves_path():
+    matcher = MovePrefixMatcher("R U")
+    assert _feed(matcher, "R R").on_path is False
+    assert _feed(matcher, "R'") == (1, 2, True, False)
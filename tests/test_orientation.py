@@ -0,0 +1,82 @@
+import math
+
+from gan_cube_python.orientation import IDENTITY, ORIENTATIONS, OrientationTracker, rotation_between
+
+
+def _about_up(degrees):
+    """绕U面法线（+z）顺时针（从U面外侧看）转动指定角度的四元数 (w, x, y, z)"""
+    half = -math.radians(degrees) / 2
+    return (math.cos(half), 0.0, 0.0, math.sin(half))
+
+
+def _tracker(**kwargs):
+    tracker = OrientationTracker(**kwargs)
+    tracker.calibrate((1.0, 0.0, 0.0, 0.0))
+    return tracker
+
+
+def test_twenty_four_distinct_orientations():
+    assert len(ORIENTATIONS) == 24
+    assert len({o.face_map for o in ORIENTATIONS}) == 24
+    assert IDENTITY.name == ""
+    assert (IDENTITY.up, IDENTITY.front) == ("U", "F")
+
+
+def test_snaps_after_settle_samples():
+    tracker = _tracker(settle_samples=3)
+    q = _about_up(88)
+
+    assert tracker.update_quaternion(q, 1.0) is None
+    assert tracker.update_quaternion(q, 2.0) is None
+    change = tracker.update_quaternion(q, 3.0)
+
+    assert change is not None
+    assert change.rotation == "y"
+    assert change.timestamp == 3.0
+    assert tracker.orientation is change.orientation
+    # 已经在新朝向上，后续样本不再产生事件
+    assert tracker.update_quaternion(q, 4.0) is None
+
+
+def test_interrupted_candidate_does_not_switch():
+    tracker = _tracker(settle_samples=3)
+    turned, home = _about_up(90), _about_up(0)
+
+    for sample in (turned, turned, home, turned, turned):
+        assert tracker.update_quaternion(sample) is None
+    assert tracker.orientation is IDENTITY
+
+
+def test_hysteresis_keeps_orientation_between_candidates():
+    tracker = _tracker(enter_angle=30.0, settle_samples=1)
+
+    # 在当前朝向的 enter_angle 以内：不变
+    assert tracker.update_quaternion(_about_up(25)) is None
+    # 与两个朝向都相差超过 enter_angle（正在转动）：不变
+    for _ in range(5):
+        assert tracker.update_quaternion(_about_up(50)) is None
+    assert tracker.orientation is IDENTITY
+
+    assert tracker.update_quaternion(_about_up(70)).rotation == "y"
+    # 回到两者之间不会切回去
+    assert tracker.update_quaternion(_about_up(40)) is None
+    assert tracker.orientation.name == "y"
+
+
+def test_remap_move_after_y():
+    tracker = _tracker(settle_samples=1)
+    tracker.update({"quaternion": dict(zip("wxyz", _about_up(90)))}, 0.0)
+
+    # y 之后机身的R面朝前，F面朝左，U/D不变
+    assert (tracker.orientation.up, tracker.orientation.front) == ("U", "R")
+    assert tracker.remap_move("R") == "F"
+    assert tracker.remap_move("F'") == "L'"
+    assert tracker.remap_move("U2") == "U2"
+    assert tracker.remap_face(5) == 1
+
+
+def test_rotation_between_is_shortest_relative_turn():
+    by_name = {o.name: o for o in ORIENTATIONS}
+    assert rotation_between(IDENTITY, by_name["y"]) == "y"
+    assert rotation_between(by_name["y"], IDENTITY) == "y'"
+    assert rotation_between(by_name["x"], by_name["x"]) == ""
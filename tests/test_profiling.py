@@ -0,0 +1,36 @@
+import asyncio
+
+from gan_cube_python.profiling import PacketRecorder
+
+
+def _lines(path):
+    return path.read_text().splitlines()
+
+
+def test_recorder_flushes_after_packet_count(tmp_path):
+    path = tmp_path / "packets.txt"
+    recorder = PacketRecorder(str(path), flush_packets=3)
+    recorder(b"\x01", 1.0)
+    recorder(b"\x02", 2.0)
+    assert _lines(path) == []
+
+    recorder(b"\x03", 3.0)
+    # 未关闭文件也能读到，进程崩溃时不会丢失
+    assert _lines(path) == ["1.000000 01", "2.000000 02", "3.000000 03"]
+    recorder.close()
+
+
+def test_recorder_flushes_after_interval_when_stream_stops(tmp_path):
+    path = tmp_path / "packets.txt"
+
+    async def run():
+        recorder = PacketRecorder(str(path), flush_interval=0.01)
+        recorder(b"\xab", 1.5)
+        assert _lines(path) == []
+        await asyncio.sleep(0.05)
+        return recorder
+
+    recorder = asyncio.run(run())
+    assert _lines(path) == ["1.500000 ab"]
+    recorder.close()
+    assert _lines(path) == ["1.500000 ab"]
@@ -0,0 +1,62 @@
+import pytest
+
+from gan_cube_python.protocol import GanGen2ProtocolDriver, GanProtocolMessageView
+
+# 按Gen2位布局手工构造的明文数据包（与TypeScript版本解析结果对照）
+# MOVE，serial=5，没有新的转动
+MOVE_SERIAL_5 = bytes.fromhex("2050000000000000000000000000000000000000")
+# MOVE，serial=6，最近一步为 R'，elapsed 字段（第47位起16位）为 0x0102
+MOVE_SERIAL_6_R_PRIME = bytes.fromhex("2061800000000204000000000000000000000000")
+# GYRO，qw=0x4000，qx=0xA000（负号位+0x2000），qy=0，qz=0x1000，vx=0b1010
+GYRO_PACKET = bytes.fromhex("14000a00000001000a0000000000000000000000")
+
+
+def test_get_bit_word_is_big_endian_by_default():
+    msg = GanProtocolMessageView(bytes([0x12, 0x34, 0x56, 0x78]))
+    assert msg.get_bit_word(0, 16) == 0x1234
+    assert msg.get_bit_word(0, 16, little_endian=True) == 0x3412
+    assert msg.get_bit_word(0, 32) == 0x12345678
+    assert msg.get_bit_word(0, 32, little_endian=True) == 0x78563412
+    # 不按字节对齐的16位字段
+    assert msg.get_bit_word(4, 16) == 0x2345
+
+
+def test_gen2_move_elapsed_decodes_big_endian():
+    driver = GanGen2ProtocolDriver()
+    assert driver.handle_state_event(MOVE_SERIAL_5, 1000.0) == []
+    events = driver.handle_state_event(MOVE_SERIAL_6_R_PRIME, 1500.0)
+
+    assert len(events) == 1
+    move = events[0].data
+    assert move.move == "R'"
+    assert (move.face, move.direction, move.serial) == (1, 1, 6)
+    # 按小端读取会得到 0x0201 = 513
+    assert move.cube_timestamp == 0x0102
+
+
+def test_gen2_gyro_quaternion_decodes_big_endian():
+    events = GanGen2ProtocolDriver().handle_state_event(GYRO_PACKET, 0.0)
+
+    assert len(events) == 1
+    quaternion = events[0].data["quaternion"]
+    assert quaternion["w"] == pytest.approx(0x4000 / 0x7FFF)
+    assert quaternion["x"] == pytest.approx(-0x2000 / 0x7FFF)
+    assert quaternion["y"] == 0
+    assert quaternion["z"] == pytest.approx(0x1000 / 0x7FFF)
+    assert events[0].data["velocity"] == {"x": -2, "y": 0, "z": 0}
+
+
+def test_clean_move_stream_has_no_duplicates_or_gaps():
+    driver = GanGen2ProtocolDriver()
+    driver.handle_state_event(MOVE_SERIAL_5, 1000.0)
+    driver.handle_state_event(MOVE_SERIAL_6_R_PRIME, 1500.0)
+
+    metrics = driver.metrics
+    assert metrics.duplicate_serials == 0
+    assert metrics.gap_counts[0] == 1
+    assert metrics.move_packets == 1
+    assert metrics.lost_moves == 0
+
+    # 真正的重复数据包仍然计数
+    driver.handle_state_event(MOVE_SERIAL_6_R_PRIME, 1600.0)
+    assert metrics.duplicate_serials == 1
@@ -0,0 +1,62 @@
+from gan_cube_python import cube
+from gan_cube_python.moves import MoveSequence
+from gan_cube_python.scramble_matcher import ScrambleMatcher
+
+SCRAMBLE = "R U2 F' L D"
+
+
+def _solved(matcher):
+    return matcher.sync(*cube.SOLVED_STATE)
+
+
+def test_progress_along_the_scramble():
+    matcher = ScrambleMatcher(SCRAMBLE)
+    assert _solved(matcher).step == 0
+
+    progress = [matcher.apply_move(move) for move in ("R", "U", "U", "F'", "L", "D")]
+    steps = [(p.step, p.complete) if p else None for p in progress]
+    # U2 的中间一步不在打乱路径上
+    assert steps == [(1, False), None, (2, False), (3, False), (4, False), (5, True)]
+    # 完成只报告一次
+    assert matcher.apply_move("D'") is None
+
+
+def test_deviation_and_undo_return_to_path():
+    matcher = ScrambleMatcher(SCRAMBLE)
+    _solved(matcher)
+    assert matcher.apply_move("R").step == 1
+    assert matcher.apply_move("B") is None
+    assert matcher.step == -1
+    assert matcher.apply_move("B'").step == 1
+
+
+def test_sync_with_scrambled_state_completes():
+    matcher = ScrambleMatcher(SCRAMBLE)
+    state = cube.apply_moves(cube.SOLVED_STATE, cube.parse_moves(SCRAMBLE))
+    progress = matcher.sync(*state)
+    assert progress.complete and progress.step == progress.total == 5
+
+
+def test_moves_before_sync_are_ignored():
+    matcher = ScrambleMatcher(SCRAMBLE)
+    assert matcher.apply_move("R") is None
+    assert matcher.state is None
+
+
+def test_new_scramble_syncs_from_tracked_state():
+    # 连接时的面块状态是上一次的打乱状态，之后只通过转动跟踪（不再请求FACELETS）
+    facelets_state = cube.apply_moves(cube.SOLVED_STATE, cube.parse_moves(SCRAMBLE))
+    tracked = facelets_state
+    for code in MoveSequence.parse(SCRAMBLE).inverse():
+        tracked = cube.apply_move_code(tracked, code)
+    assert tracked == cube.SOLVED_STATE
+
+    matcher = ScrambleMatcher("F2 U R'")
+    assert matcher.sync_state(tracked).step == 0
+    progress = [matcher.apply_move(move) for move in ("F", "F", "U", "R'")]
+    assert progress[-1].complete
+
+    # 用连接时的旧状态同步则永远不会在打乱路径上
+    stale = ScrambleMatcher("F2 U R'")
+    assert stale.sync_state(facelets_state) is None
+    assert all(stale.apply_move(move) is None for move in ("F", "F", "U", "R'"))
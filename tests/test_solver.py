@@ -0,0 +1,106 @@
+import array
+import random
+import threading
+import time
+
+import pytest
+
+from gan_cube_python import cube, solver
+
+
+def test_get_tables_builds_once_under_concurrency(monkeypatch, tmp_path):
+    builds = []
+
+    class SlowTables:
+        def __init__(self):
+            builds.append(threading.get_ident())
+            time.sleep(0.1)
+
+    monkeypatch.setattr(solver, "TABLE_DIR", str(tmp_path))
+    monkeypatch.setattr(solver, "SolverTables", SlowTables)
+    monkeypatch.setattr(solver, "_tables", None)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(solver.get_tables())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert len(results) == 4 and all(tables is results[0] for tables in results)
+
+
+def test_cached_table_is_shared_readable(monkeypatch, tmp_path):
+    monkeypatch.setattr(solver, "TABLE_DIR", str(tmp_path))
+    table = solver._cached("test_table", lambda: array.array("H", range(16)), "H", 16)
+    assert list(table) == list(range(16))
+    # 其他用户的进程也要能映射同一份表
+    assert (tmp_path / "test_table.bin").stat().st_mode & 0o777 == 0o644
+
+
+@pytest.fixture(scope="module")
+def tables():
+    # 首次运行时生成表（约半分钟），之后从缓存目录映射
+    return solver.get_tables()
+
+
+def test_solve_random_states(tables):
+    rng = random.Random(1215)
+    for _ in range(10):
+        state = cube.random_state(rng)
+        solution = solver.solve(state)
+        assert solution is not None and len(solution) <= 24
+        assert cube.apply_move_codes(state, solution.codes) == cube.SOLVED_STATE
+
+
+def test_solve_solved_state_is_empty(tables):
+    assert len(solver.solve(cube.SOLVED_STATE)) == 0
+
+
+def test_solve_rejects_unsolvable_state(tables):
+    cp, co, ep, eo = cube.SOLVED_STATE
+    twisted = (cp, (1,) + tuple(co[1:]), ep, eo)
+    with pytest.raises(ValueError):
+        solver.solve(twisted)
+
+
+def test_time_budget_caps_whole_search(tables):
+    rng = random.Random(7)
+    for _ in range(5):
+        state = cube.random_state(rng)
+        start = time.perf_counter()
+        solution = solver.solve(state, time_budget=0.01)
+        # 时钟每256个节点检查一次，留出余量
+        assert time.perf_counter() - start < 0.1
+        if solution is not None:
+            assert cube.apply_move_codes(state, solution.codes) == cube.SOLVED_STATE
+
+
+def _check_scramble(scramble):
+    moves = scramble.split()
+    assert 2 <= len(moves) <= 22
+    assert cube.apply_moves(cube.SOLVED_STATE, moves) != cube.SOLVED_STATE
+
+
+def test_random_scramble_is_reproducible(tables):
+    first = solver.random_scramble(random.Random(5))
+    assert first == solver.random_scramble(random.Random(5))
+    _check_scramble(first)
+
+
+def test_random_scrambles_batch(tables):
+    scrambles = solver.random_scrambles(3, workers=1, seed=9)
+    assert scrambles == solver.random_scrambles(3, workers=1, seed=9)
+    for scramble in scrambles:
+        _check_scramble(scramble)
+
+
+def test_scramble_pool_serves_scrambles(tables):
+    with solver.ScramblePool(size=2, workers=1, seed=3) as pool:
+        for _ in range(3):
+            _check_scramble(pool.get(timeout=30))
+
+
+def test_out_of_range_orientation_is_rejected():
+    cp, co, ep, eo = cube.SOLVED_STATE
+    with pytest.raises(ValueError):
+        solver.solve((cp, (3,) + co[1:], ep, eo))
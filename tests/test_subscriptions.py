@@ -0,0 +1,83 @@
+import asyncio
+
+from gan_cube_python.protocol import GanCubeEvent
+
+
+def _move(serial):
+    return GanCubeEvent("MOVE", float(serial), serial)
+
+
+async def _collect(subscription):
+    return [event.data async for event in subscription]
+
+
+def test_subscription_drops_oldest_when_full(make_connection):
+    async def run():
+        cube = make_connection()
+        subscription = cube.events("MOVE", maxsize=3)
+        for serial in range(5):
+            cube._dispatch_event(_move(serial))
+        await cube.disconnect()
+        return subscription, await _collect(subscription)
+
+    subscription, received = asyncio.run(run())
+    assert received == [2, 3, 4]
+    assert subscription.dropped == 2
+
+
+def test_subscription_filters_event_types(make_connection):
+    async def run():
+        cube = make_connection()
+        subscription = cube.events("FACELETS")
+        cube._dispatch_event(_move(1))
+        cube._dispatch_event(GanCubeEvent("FACELETS", 0.0, "state"))
+        await cube.disconnect()
+        return await _collect(subscription)
+
+    assert asyncio.run(run()) == ["state"]
+
+
+def test_subscription_ends_on_disconnect(make_connection):
+    async def run():
+        cube = make_connection()
+        subscription = cube.events()
+        consumer = asyncio.create_task(_collect(subscription))
+        await asyncio.sleep(0)
+        cube._dispatch_event(_move(7))
+        cube._on_client_disconnected()
+        return await asyncio.wait_for(consumer, 1), cube
+
+    received, cube = asyncio.run(run())
+    assert received == [7]
+    assert cube._subscriptions == []
+
+
+def test_subscribe_after_disconnect_is_finished(make_connection):
+    async def run():
+        cube = make_connection()
+        await cube.disconnect()
+        subscription = cube.events("MOVE")
+        received = await asyncio.wait_for(_collect(subscription), 1)
+        # 重复关闭不应报错
+        subscription.close()
+        async with cube.events("MOVE") as late:
+            assert [event async for event in late] == []
+        return subscription, received
+
+    subscription, received = asyncio.run(run())
+    assert subscription.closed
+    assert received == []
+
+
+def test_close_is_idempotent(make_connection):
+    async def run():
+        cube = make_connection()
+        subscription = cube.events("MOVE")
+        subscription.close()
+        subscription.close()
+        cube._dispatch_event(_move(1))
+        return cube, await _collect(subscription)
+
+    cube, received = asyncio.run(run())
+    assert received == []
+    assert cube._subscriptions == []